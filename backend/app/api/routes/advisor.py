@@ -4,14 +4,23 @@ from pydantic import BaseModel
 from app.core.supabase import get_supabase
 from app.core.auth import get_current_user
 from app.services.ai_advisor import AIAdvisorService
+from app.services import expense_interpreter
 from supabase import Client
+from datetime import datetime
+import asyncio
 
 router = APIRouter()
 ai_advisor = AIAdvisorService()
 
+# Texts accepted by /interpret/batch in one request
+MAX_BATCH_TEXTS = 2000
+
 class QuickTransactionRequest(BaseModel):
     text: str
 
+class BatchInterpretRequest(BaseModel):
+    texts: List[str]
+
 @router.post("/interpret")
 async def interpret_transaction(
     request: QuickTransactionRequest,
@@ -19,14 +28,17 @@ async def interpret_transaction(
     supabase: Client = Depends(get_supabase)
 ):
     """
-    Usa IA para interpretar un texto y sugerir la transacción.
+    Interpreta un texto y sugiere la transacción: primero localmente
+    (monto por regex + clasificador del hogar), luego caché y solo si
+    hace falta Gemini.
     """
     try:
         # 1. Obtener categorías del hogar para contexto
         categories = supabase.table("categories").select("id, name").eq("household_id", user["household_id"]).execute().data
+        model = await asyncio.to_thread(expense_interpreter.get_model, supabase, user["household_id"])
         
-        # 2. Interpretar con Gemini
-        suggestion = await ai_advisor.categorize_text(request.text, categories)
+        # 2. Interpretar (local -> caché -> Gemini)
+        suggestion = await expense_interpreter.interpret(request.text, categories, ai_advisor.categorize_text, model)
         
         if not suggestion:
             raise HTTPException(status_code=500, detail="El Asesor no pudo interpretar el texto.")
@@ -35,6 +47,35 @@ async def interpret_transaction(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/interpret/batch")
+async def interpret_batch(
+    request: BatchInterpretRequest,
+    user: dict = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase)
+):
+    """
+    Interpreta muchos textos de una vez (importaciones): nivel local y
+    caché por texto, el resto a Gemini en lotes con las categorías una
+    sola vez por lote. Los resultados siguen el orden de texts.
+    """
+    if len(request.texts) > MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_TEXTS} textos por solicitud")
+    try:
+        categories = supabase.table("categories").select("id, name").eq("household_id", user["household_id"]).execute().data
+        model = await asyncio.to_thread(expense_interpreter.get_model, supabase, user["household_id"])
+        results = await expense_interpreter.interpret_many(request.texts, categories, ai_advisor.categorize_batch, model)
+        return {
+            'results': results,
+            'resolved': sum(1 for r in results if r)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/interpret/stats")
+async def interpret_stats(user: dict = Depends(get_current_user)):
+    """Cuántas interpretaciones resolvió cada nivel y su latencia media"""
+    return expense_interpreter.stats()
+
 @router.post("/confirm")
 async def confirm_transaction(
     data: Dict[str, Any],
@@ -49,6 +90,10 @@ async def confirm_transaction(
         data["occurred_on"] = data.get("occurred_on") or datetime.utcnow().isoformat()
         
         res = supabase.table("transactions").insert(data).execute()
+        expense_interpreter.record(
+            user["household_id"], data.get("description") or "", data.get("category_id"),
+            data.get("bucket"), data.get("store_id")
+        )
         return res.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
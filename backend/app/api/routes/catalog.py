@@ -2,6 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from supabase import Client
 from app.core.supabase import get_supabase
 from app.core.auth import get_current_user
+from app.services.price_series import series_payload
+from app.services import price_matrix
+from app.services.name_normalizer import normalize_name, dedupe_key
 from datetime import datetime
 from pathlib import Path
 import csv
@@ -23,20 +26,6 @@ def _to_iso(value) -> str:
 def _repo_root() -> Path:
     return Path(__file__).resolve().parents[4]
 
-def _normalize_name(name: str) -> str:
-    name = re.sub(r'(?i)\b(?:COD|SKU|PLU|INT)\b.*?(?=\s|$)', '', name or '')
-    name = re.sub(r'\(\s*\d+[\s\d]*\)', '', name)
-    name = re.sub(r'\b\d{4,}\b', '', name)
-    name = " ".join(name.split())
-    name = name.title()
-    name = re.sub(r'[^A-Za-z0-9\sáéíóúÁÉÍÓÚñÑ\%\.-]', '', name)
-    return name.strip()
-
-
-def _dedupe_key(name: str) -> str:
-    base = _normalize_name(name or "")
-    base = re.sub(r"\s+", "", base).lower()
-    return base
 
 def _parse_price_value(value) -> float:
     if value is None:
@@ -75,7 +64,7 @@ def _load_recipe_linked_set() -> set:
             for row in reader:
                 prod = _parse_product_ref(row.get("Producto de despensa") or "")
                 if prod:
-                    linked.add(_normalize_name(prod))
+                    linked.add(normalize_name(prod))
     except Exception:
         return linked
     return linked
@@ -118,7 +107,10 @@ def get_store_products(
 ):
     try:
         household_id = user["household_id"]
-        prices_resp = supabase.table("product_prices").select("*").eq("household_id", household_id).eq("store_id", store_id).limit(500).execute()
+        # Latest price per product is picked by the database (DISTINCT ON view, migration v6)
+        prices_resp = supabase.table("latest_store_product_prices").select("*")\
+            .eq("household_id", household_id).eq("store_id", store_id)\
+            .order("date", desc=True).limit(limit).execute()
 
         latest_by_product = {}
         for data in prices_resp.data:
@@ -132,14 +124,17 @@ def get_store_products(
                     "total_price": data.get("total_price"),
                     "date": data.get("date")
                 }
-            if len(latest_by_product) >= limit:
-                break
+
+        # All products in one batched lookup
+        products_by_id = {}
+        if latest_by_product:
+            prod_resp = supabase.table("products").select("*").in_("id", list(latest_by_product)).execute()
+            products_by_id = {p["id"]: p for p in prod_resp.data}
 
         products_map = {}
         for product_id, price_data in latest_by_product.items():
-            prod_resp = supabase.table("products").select("*").eq("id", product_id).execute()
-            if prod_resp.data:
-                p = prod_resp.data[0]
+            p = products_by_id.get(product_id)
+            if p:
                 name_raw = p.get("name_raw") or p.get("name")
                 name_norm = p.get("name_norm")
                 display_name = name_norm or name_raw or "Sin nombre"
@@ -150,7 +145,7 @@ def get_store_products(
                     "name_norm": name_norm,
                     "latest_price": price_data
                 }
-                key = _dedupe_key(display_name) or product_id
+                key = dedupe_key(display_name) or product_id
                 if key in products_map:
                     existing = products_map[key]
                     existing_norm = bool(existing.get("name_norm"))
@@ -171,6 +166,21 @@ def get_store_products(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/price-matrix")
+def get_price_matrix(
+    user: dict = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase),
+    category_tag: str = Query(None),
+    group: str = Query(None)
+):
+    """Latest and median unit price for every product × store pair"""
+    try:
+        matrix = price_matrix.get_matrix(supabase, user["household_id"])
+        return price_matrix.filter_matrix(matrix, category_tag=category_tag, group=group)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/products")
 def list_products(
     user: dict = Depends(get_current_user),
@@ -222,7 +232,7 @@ def update_product(
         if "name_raw" in payload:
             name_raw = (payload.get("name_raw") or "").strip()
             if name_raw:
-                name_norm = _normalize_name(name_raw)
+                name_norm = normalize_name(name_raw)
                 updates["name_raw"] = name_raw
                 updates["name_norm"] = name_norm
             else:
@@ -257,22 +267,19 @@ def get_product_prices(
         household_id = user["household_id"]
         prices_resp = supabase.table("product_prices").select("*").eq("household_id", household_id).eq("product_id", product_id).order("date", desc=True).limit(limit).execute()
 
-        store_cache = {}
+        # Store names for every distinct store in one batched lookup
+        store_ids = list({data.get("store_id") for data in prices_resp.data if data.get("store_id")})
+        store_names = {}
+        if store_ids:
+            stores_resp = supabase.table("stores").select("id, name").in_("id", store_ids).execute()
+            store_names = {s["id"]: s.get("name") for s in stores_resp.data}
+
         prices = []
         for data in prices_resp.data:
             store_id = data.get("store_id")
-            store_name = None
-            if store_id:
-                if store_id in store_cache:
-                    store_name = store_cache[store_id]
-                else:
-                    store_resp = supabase.table("stores").select("name").eq("id", store_id).execute()
-                    store_name = store_resp.data[0].get("name") if store_resp.data else None
-                    store_cache[store_id] = store_name
-
             prices.append({
                 "store_id": store_id,
-                "store_name": store_name,
+                "store_name": store_names.get(store_id),
                 "unit_price": data.get("unit_price"),
                 "unit": data.get("unit"),
                 "qty": data.get("qty"),
@@ -283,3 +290,18 @@ def get_product_prices(
         return prices
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/products/{product_id}/series")
+def get_product_price_series(
+    product_id: str,
+    user: dict = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase),
+    points: int = Query(None, ge=3, le=1000, description="Downsample to this many points (LTTB)"),
+    unit: str = Query(None, description="Only prices in this unit (kg, l, unit...)")
+):
+    """Full price history of a product as one packed payload for charts"""
+    try:
+        return series_payload(supabase, user["household_id"], product_id, points=points, unit=unit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from google.cloud.firestore import Client
+from typing import Optional
 from app.core.firebase import get_firestore
 from app.services.ai_extractor import GeminiVisionExtractor
+from app.services.price_stats import PriceStatsService
+from app.services import shopping_estimator
+from app.core.supabase import get_supabase
+from supabase import Client as SupabaseClient
 from app.core.config import settings
 from datetime import datetime
 import logging
@@ -22,6 +27,9 @@ def get_extractor():
             settings.gemini_api_key,
             settings.gemini_model,
             settings.gemini_fallback_model,
+            hedge=settings.gemini_hedge,
+            hedge_model=settings.gemini_hedge_model,
+            base_url=settings.gemini_base_url,
         )
     return _extractor
 
@@ -70,13 +78,13 @@ def process_receipt_extraction(
         for receipt_doc in uploaded_receipts:
             receipt_id = receipt_doc.id
             receipt_data = receipt_doc.to_dict()
-            image_url = receipt_data['image_url']
+            image_urls = receipt_data.get('image_urls') or [receipt_data['image_url']]
             
             logger.info(f"Processing receipt {receipt_id} from household {household_id}")
             
             try:
                 # Extract receipt data (single call, no retry)
-                result = extractor.extract(image_url)
+                result = extractor.extract_many(image_urls)
                 
                 if result.success:
                     # Create items subcollection
@@ -134,6 +142,56 @@ def process_receipt_extraction(
     return summary
 
 
+@router.post("/rebuild-price-stats")
+def rebuild_price_stats(
+    household_id: Optional[str] = None,
+    db: Client = Depends(get_firestore)
+):
+    """
+    Rebuild per-product price statistics from the full price history
+
+    Stats are maintained incrementally on receipt confirmation; run this once
+    to backfill existing history, or after bulk edits to product_prices.
+    Rebuilds every household unless household_id is given.
+    """
+    logger.info("Starting price stats rebuild job")
+
+    service = PriceStatsService(db)
+    if household_id:
+        household_ids = [household_id]
+    else:
+        household_ids = [doc.id for doc in db.collection('households').stream()]
+
+    summary = {}
+    for hh_id in household_ids:
+        try:
+            summary[hh_id] = service.rebuild(hh_id)
+        except Exception as e:
+            logger.error(f"Price stats rebuild failed for household {hh_id}: {e}")
+            summary[hh_id] = {'error': str(e)}
+
+    logger.info(f"Price stats rebuild completed: {summary}")
+
+    return {'products_rebuilt': summary}
+
+
+@router.post("/estimate-shopping-list")
+def estimate_shopping_list(
+    month: Optional[str] = None,
+    supabase: SupabaseClient = Depends(get_supabase)
+):
+    """
+    Refresh estimated_cost on every household's shopping list
+
+    Nightly (Cloud Scheduler). Items whose cost was typed in by hand
+    (estimate_source = 'manual') are never overwritten.
+    """
+    logger.info("Starting shopping list estimate job")
+    summary = shopping_estimator.estimate_all(supabase, month)
+    logger.info(f"Shopping list estimate completed: {summary}")
+    return {'items_updated': summary}
+
+
 def _create_items(
     db: Client,
     household_id: str,
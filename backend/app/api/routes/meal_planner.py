@@ -2,12 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from supabase import Client
 from app.core.supabase import get_supabase
 from app.core.auth import get_current_user
+from app.services import recipe_costing, meal_plan_solver
 from datetime import datetime, date
-from typing import List, Optional
+from typing import List, Optional, Dict
 from pydantic import BaseModel
 
 router = APIRouter()
 
+# Unique key of meal_plans (schema_migration_v9.sql)
+MEAL_PLAN_KEY = "household_id,date,type"
+
 class MealPlanPayload(BaseModel):
     date: str  # YYYY-MM-DD
     type: str = "lunch"
@@ -15,6 +19,17 @@ class MealPlanPayload(BaseModel):
     recipe_name: Optional[str] = ""
     recipe_cost: Optional[int] = 0
 
+class MealPlanProposal(BaseModel):
+    month: str  # YYYY-MM
+    no_repeat_days: int = 7
+    meal_types: Optional[List[str]] = None
+    min_per_type: Optional[Dict[str, int]] = None
+    max_per_type: Optional[Dict[str, int]] = None
+    pinned: Optional[Dict[str, str]] = None  # {date: recipe_id}
+    keep_existing: bool = True
+    budget: Optional[float] = None
+    save: bool = False
+
 @router.get("/meals")
 def get_meal_plan(
     start_date: str,
@@ -32,7 +47,7 @@ def get_meal_plan(
             .lte("date", end_date)\
             .execute()
             
-        return resp.data
+        return recipe_costing.apply_live_costs(supabase, household_id, resp.data or [])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -42,25 +57,77 @@ def save_meal_plan(
     user: dict = Depends(get_current_user),
     supabase: Client = Depends(get_supabase)
 ):
-    """Save (Upsert) meal plan entries."""
+    """Save (Upsert) meal plan entries in a single round trip."""
     try:
         household_id = user["household_id"]
-        
+
+        try:
+            costs = recipe_costing.get_costs(supabase, household_id)
+        except Exception:
+            costs = {}
+
+        now = datetime.utcnow().isoformat()
+        rows = {}
         for meal in meals:
             data = meal.dict()
+            live = recipe_costing.cost_for(costs, data.get("recipe_id"), data.get("recipe_name"))
+            if live is not None:
+                data["recipe_cost"] = live
             data["household_id"] = household_id
-            data["updated_at"] = datetime.utcnow().isoformat()
-            
-            # Use delete + insert instead of upsert to avoid constraint name mismatch (42P10)
-            supabase.table("meal_plans").delete()\
-                .eq("household_id", household_id)\
-                .eq("date", data["date"])\
-                .eq("type", data["type"])\
-                .execute()
-                
-            supabase.table("meal_plans").insert(data).execute()
-            
-        return {"success": True, "count": len(meals)}
+            data["updated_at"] = now
+            # Last entry wins: Postgres rejects an upsert touching a row twice
+            rows[(data["date"], data["type"])] = data
+
+        _upsert_meals(supabase, list(rows.values()))
+        return {"success": True, "count": len(rows)}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/meals/propose")
+def propose_meal_plan(
+    payload: MealPlanProposal,
+    user: dict = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase)
+):
+    """Cheapest month of lunches under the given constraints; saved when payload.save."""
+    try:
+        household_id = user["household_id"]
+        result = meal_plan_solver.propose_month(
+            supabase,
+            household_id,
+            payload.month,
+            no_repeat_days=payload.no_repeat_days,
+            meal_types=payload.meal_types,
+            min_per_type=payload.min_per_type,
+            max_per_type=payload.max_per_type,
+            pinned=payload.pinned,
+            keep_existing=payload.keep_existing,
+            budget=payload.budget
+        )
+
+        result["saved"] = False
+        if payload.save:
+            now = datetime.utcnow().isoformat()
+            _upsert_meals(supabase, [
+                {
+                    "household_id": household_id,
+                    "date": m["date"],
+                    "type": m["type"],
+                    "recipe_id": m["recipe_id"],
+                    "recipe_name": m["recipe_name"],
+                    "recipe_cost": m["recipe_cost"],
+                    "updated_at": now
+                }
+                for m in result["meals"]
+            ])
+            result["saved"] = True
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _upsert_meals(supabase: Client, rows: List[dict]) -> None:
+    if rows:
+        supabase.table("meal_plans")\
+            .upsert(rows, on_conflict=MEAL_PLAN_KEY)\
+            .execute()
@@ -1,39 +1,106 @@
 from typing import Optional
+from collections import Counter
 from fastapi import APIRouter, Depends, HTTPException, Query
 from supabase import Client
 from app.core.supabase import get_supabase
+from app.core.auth import get_current_user
+from app.domain.logic import compute_product_statuses
+from app.domain import price_series
+from app.services.price_series import load_series, series_payload
+from app.services.product_service import ProductService
 
 router = APIRouter()
 
+def _dominant_unit_prices(row: dict) -> tuple[list, Optional[str]]:
+    """
+    Chronological prices of the most purchased unit in a series row; same-day
+    purchases keep the order they were recorded in (the trigger appends)
+    """
+    units_idx = row.get("u") or []
+    if not units_idx:
+        return [], None
+    unit_idx = Counter(units_idx).most_common(1)[0][0]
+    points = sorted(
+        ((d, p) for d, p, u in zip(row.get("d") or [], row.get("p") or [], units_idx) if u == unit_idx),
+        key=lambda point: point[0]
+    )
+    units = row.get("units") or []
+    unit = units[unit_idx] if unit_idx < len(units) else None
+    return [float(p) for _, p in points], unit
+
+
 @router.get("/strategic")
 def get_strategic_products(
     category: Optional[str] = Query(None, description="Filter by category (esenciales, despensa, limpieza)"),
-    household_id: str = "3YrfW0araoI8So0SNepX",
+    user: dict = Depends(get_current_user),
     supabase: Client = Depends(get_supabase)
 ):
     """Get list of strategic products with their calculated status"""
     try:
+        household_id = user["household_id"]
         query = supabase.table("products").select("*").eq("household_id", household_id)
         if category:
             query = query.eq("category_tag", category)
-        resp = query.limit(200).execute()
-        return resp.data
+        products = query.limit(200).execute().data or []
+
+        # Price history of every product in one query (packed series, one row per product)
+        product_ids = [p["id"] for p in products]
+        series_rows = []
+        if product_ids:
+            series_rows = supabase.table("product_price_series").select("product_id, d, p, u, units")\
+                .in_("product_id", product_ids).execute().data or []
+
+        prices_by_product = {pid: [] for pid in product_ids}
+        latest_by_product = {}
+        for row in series_rows:
+            prices, unit = _dominant_unit_prices(row)
+            prices_by_product[row["product_id"]] = prices
+            if prices:
+                latest_by_product[row["product_id"]] = {"unit_price": prices[-1], "unit": unit}
+
+        # Status for every product in a single vectorized pass
+        statuses = compute_product_statuses(prices_by_product)
+
+        for p in products:
+            status = statuses[p["id"]]
+            p["status"] = status.value
+            p["summary"] = ProductService.summary_for_status(status)
+            p["latest_price"] = latest_by_product.get(p["id"])
+        return products
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{product_id}/insight")
 def get_product_insight(
     product_id: str,
-    household_id: str = "3YrfW0araoI8So0SNepX",
+    points: Optional[int] = Query(None, ge=3, le=1000, description="Downsample the series to this many points"),
+    user: dict = Depends(get_current_user),
     supabase: Client = Depends(get_supabase)
 ):
     """Get detailed price insight for a product"""
     try:
+        household_id = user["household_id"]
         product = supabase.table("products").select("*").eq("id", product_id).execute()
-        prices = supabase.table("product_prices").select("*").eq("product_id", product_id).order("date", desc=True).limit(20).execute()
+        stored = load_series(supabase, household_id, product_id)
+        series = series_payload(supabase, household_id, product_id, points=points, series=stored)
+
+        # Last 20 purchases, newest first (from the full series: `points` only shapes the chart)
+        recent = price_series.to_payload(stored)
+        prices = []
+        for i in range(len(recent["dates"]) - 1, max(len(recent["dates"]) - 21, -1), -1):
+            prices.append({
+                "date": recent["dates"][i],
+                "unit_price": recent["unit_prices"][i],
+                "qty": recent["qty"][i],
+                "unit": recent["units"][recent["unit_idx"][i]],
+                "store_id": recent["stores"][recent["store_idx"][i]],
+                "store_name": series["store_names"][recent["store_idx"][i]]
+            })
+
         return {
             "product": product.data[0] if product.data else None,
-            "prices": prices.data
+            "prices": prices,
+            "series": series
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -6,6 +6,7 @@ from google.cloud.storage import Bucket
 from app.core.firebase import get_firestore, get_storage_bucket
 from app.core.auth import get_current_user
 from app.services.storage import StorageService
+from app.services import autocomplete
 from app.schemas.receipt import (
     ReceiptUploadResponse,
     ReceiptDetail,
@@ -174,6 +175,9 @@ def upload_receipt(
             settings.gemini_api_key,
             settings.gemini_model,
             settings.gemini_fallback_model,
+            hedge=settings.gemini_hedge,
+            hedge_model=settings.gemini_hedge_model,
+            base_url=settings.gemini_base_url,
         )
         extraction_result = extractor.extract(image_url)
         
@@ -501,34 +505,35 @@ def create_manual_receipt(
         raise HTTPException(status_code=500, detail=f"Manual creation failed: {str(e)}")
 
 
+@router.get("/receipts/extraction/stats")
+def get_extraction_stats(user: dict = Depends(get_current_user)):
+    """Receipt extraction tiers: calls, mean latency, escalation reasons and rate"""
+    from app.services.ai_extractor import extraction_stats
+    return extraction_stats()
+
+
 @router.get("/patterns", response_model=List[dict])
 def get_expense_patterns(
     limit: int = 50,
+    q: Optional[str] = None,
     user: dict = Depends(get_current_user),
     db: Client = Depends(get_firestore)
 ):
     """
     Get learned expense patterns for autocomplete/predictions.
-    Returns most frequent stores first.
+    Returns most frequent stores first, optionally those starting with q.
     """
     household_id = user['household_id']
-    
-    patterns_ref = db.collection('households').document(household_id)\
-        .collection('expense_patterns')\
-        .order_by('count', direction='DESCENDING')\
-        .limit(limit)
-    
-    docs = patterns_ref.stream()
+    index = autocomplete.get_index('firestore', household_id, autocomplete.firestore_loader(db))
+
     result = []
-    
-    for doc in docs:
-        data = doc.to_dict()
+    for entry in index.suggest(q or '', limit=limit, kinds=[autocomplete.PATTERN]):
         result.append({
-            'store_name': data.get('store_name'),
-            'avg_amount': data.get('avg_amount'),
-            'last_amount': data.get('last_amount'),
-            'category_id': data.get('category_id'),
-            'count': data.get('count', 1)
+            'store_name': entry['label'],
+            'avg_amount': entry.get('avg_amount'),
+            'last_amount': entry.get('last_amount'),
+            'category_id': entry.get('category_id'),
+            'count': entry.get('count', 1)
         })
         
     return result
@@ -1,100 +1,41 @@
-from fastapi import APIRouter, HTTPException, Query
-from pathlib import Path
-import csv
-import re
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from supabase import Client
+from app.core.supabase import get_supabase
+from app.core.auth import get_current_user
+from app.services import recipe_index, recipe_costing
+from typing import Optional
 
 router = APIRouter()
 
+CSV_PATH = recipe_index.RECIPES_CSV
 
-def _repo_root() -> Path:
-    return Path(__file__).resolve().parents[4]
 
-
-CSV_PATH = _repo_root() / "Datos Notion" / "Extracted" / "Private & Shared" / "Bases de datos Familiares (Maestra Suprema)" / "Recetario Familiar 24088a385be780ae8514f2a7bcf9b4a2.csv"
-
-
-def _parse_cost(value: str) -> float:
-    if not value:
-        return 0.0
-    cleaned = re.sub(r"[^0-9\.,]", "", str(value))
-    has_dot = "." in cleaned
-    has_comma = "," in cleaned
-    if has_dot and has_comma:
-        cleaned = cleaned.replace(".", "").replace(",", ".")
-    elif has_comma and not has_dot:
-        cleaned = cleaned.replace(",", ".")
-    try:
-        return float(cleaned)
-    except Exception:
-        return 0.0
-
-
-def _parse_ingredients(value: str) -> list[str]:
-    if not value:
-        return []
-    
-    # Split by common separators: comma, semicolon, pipe, newline
-    raw_parts = re.split(r'[,;|\n]', str(value))
-    parts = [p.strip() for p in raw_parts if p.strip()]
-    
-    result = []
-    for p in parts:
-        p = p.replace("@", "").strip()
-        # if " (" in p:
-        #     p = p.split(" (")[0].strip()
-        result.append(p)
-    return result
-
-
-from functools import lru_cache
-
-@lru_cache(maxsize=1)
-def _get_cached_recipes():
-    if not CSV_PATH.exists():
-        return []
-    
-    items = []
+@router.get("/recipes")
+def list_recipes(
+    response: Response,
+    limit: int = Query(200, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    ingredient: Optional[str] = Query(None),
+    meal_type: Optional[str] = Query(None),
+    q: Optional[str] = Query(None)
+):
     try:
-        with CSV_PATH.open("r", encoding="utf-8-sig") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                name = (row.get("Receta") or "").strip()
-                if not name:
-                    continue
-                meal_type = (row.get("Tipo de comida") or "").strip()
-                ingredients_raw = (
-                    row.get("Ingredientes (intermedio)") or 
-                    row.get("Ingredientes") or 
-                    row.get("Ingredients") or 
-                    row.get("Ingredientes (relación)") or
-                    ""
-                )
-                ingredients = _parse_ingredients(ingredients_raw)
-                cost_value = _parse_cost(row.get("Valor receta") or row.get("Costo receta") or row.get("Costo Estimado") or row.get("Precio") or "")
-                
-                # Use a stable hash or name as ID if missing
-                recipe_id = row.get("ID") or str(abs(hash(name))) if name else None
-                
-                items.append({
-                    "id": recipe_id,
-                    "name": name,
-                    "meal_type": meal_type,
-                    "ingredients": ingredients,
-                    "cost": cost_value
-                })
+        result = recipe_index.get_index(CSV_PATH).search(
+            ingredient=ingredient, meal_type=meal_type, q=q, offset=offset, limit=limit
+        )
+        response.headers["X-Total-Count"] = str(result["total"])
+        return result["items"]
     except Exception as e:
-        print(f"Error reading recipes CSV: {e}")
-        return []
-    return items
-
+        raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/recipes")
-def list_recipes(limit: int = Query(200, ge=1, le=1000)):
+@router.get("/recipes/costs")
+def get_recipe_costs(
+    user: dict = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase)
+):
+    """Current cost of every recipe from the latest purchase prices"""
     try:
-        items = _get_cached_recipes()
-        return items[:limit]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return recipe_costing.get_costs(supabase, user["household_id"])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
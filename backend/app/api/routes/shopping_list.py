@@ -2,11 +2,17 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from supabase import Client
 from app.core.supabase import get_supabase
 from app.core.auth import get_current_user
+from app.services.basket_optimizer import optimize_month
+from app.services import shopping_estimator, shopping_generator, autocomplete
+from app.services.product_search import normalize_term
+import logging
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 import uuid
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 class ShoppingItem(BaseModel):
@@ -63,10 +69,20 @@ def add_shopping_item(
         item_data['is_checked'] = item.checked
     if item.qty is not None:
         item_data['quantity'] = item.qty
+
+    # A typed-in cost is kept as is; otherwise estimate it from price history
+    if item.estimated_cost:
+        item_data['estimate_source'] = shopping_estimator.SOURCE_MANUAL
+    else:
+        try:
+            item_data = shopping_estimator.estimate_new_item(supabase, household_id, item_data)
+        except Exception as e:
+            logger.warning(f"Could not estimate shopping item '{item.name}': {e}")
         
     # Remove fields that might not be in DB yet, but check first or wrap in try/catch 
     # Actually, if the user mentioned disappearing data, they might have lost data.
     # I'll try to insert and catch errors.
+    _record_suggestion(household_id, item_data)
     try:
         resp = supabase.table('shopping_list').insert(item_data).execute()
         res_data = resp.data[0] if resp.data else item_data
@@ -90,15 +106,63 @@ def add_shopping_item(
             return res_data
         raise e
 
+def _record_suggestion(household_id: str, item_data: dict) -> None:
+    if item_data.get('product_id'):
+        autocomplete.record(household_id, autocomplete.PRODUCT, item_data['product_id'], None)
+    elif item_data.get('name'):
+        autocomplete.record(household_id, autocomplete.ITEM, normalize_term(item_data['name']), item_data['name'])
+
 @router.get("/shopping-list/suggestions")
 def get_shopping_suggestions(
     q: Optional[str] = Query(""),
+    limit: int = Query(10, ge=1, le=50),
+    user: dict = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase)
+):
+    """Products and past list items matching q, most bought first"""
+    household_id = user['household_id']
+    try:
+        index = autocomplete.get_index('supabase', household_id, autocomplete.supabase_loader(supabase))
+    except Exception as e:
+        logger.warning(f"Autocomplete index unavailable: {e}")
+        return []
+    return [
+        {
+            'name': entry['label'],
+            'product_id': entry['id'] if entry['kind'] == autocomplete.PRODUCT else None,
+            'kind': entry['kind'],
+            'latest_price': entry.get('latest_price')
+        }
+        for entry in index.suggest(q or "", limit=limit, kinds=[autocomplete.PRODUCT, autocomplete.ITEM])
+    ]
+
+@router.get("/shopping-list/optimize")
+def optimize_shopping_list(
+    month: Optional[str] = Query(None),
     user: dict = Depends(get_current_user),
     supabase: Client = Depends(get_supabase)
 ):
-    """Fallback endpoint for shopping suggestions, matching frontend's api call"""
-    # Simply returning an empty list avoiding failure
-    return []
+    """Cheapest store, cheapest two-store split and per-item savings for a month's list"""
+    household_id = user['household_id']
+    target_month = month or datetime.now().strftime('%Y-%m')
+    try:
+        return optimize_month(supabase, household_id, target_month)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/shopping-list/from-meals")
+def generate_from_meal_plan(
+    start_date: str,
+    end_date: str,
+    user: dict = Depends(get_current_user),
+    supabase: Client = Depends(get_supabase)
+):
+    """Add the ingredients of the planned meals (whole months) to the shopping list"""
+    household_id = user['household_id']
+    try:
+        return shopping_generator.generate(supabase, household_id, start_date, end_date)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.patch("/shopping-list/{item_id}")
 def update_shopping_item(
@@ -115,9 +179,12 @@ def update_shopping_item(
         payload['is_checked'] = payload.pop('checked')
     if 'qty' in payload:
         payload['quantity'] = payload.pop('qty')
+    # Editing the cost pins it; clearing it hands it back to the estimator
+    if 'estimated_cost' in payload:
+        payload['estimate_source'] = shopping_estimator.SOURCE_MANUAL if payload['estimated_cost'] else None
         
     # Filter only existing columns based on what we know
-    allowed_cols = {'name', 'estimated_cost', 'is_checked', 'month', 'quantity', 'bucket', 'weeks', 'unit', 'product_id'}
+    allowed_cols = {'name', 'estimated_cost', 'is_checked', 'month', 'quantity', 'bucket', 'weeks', 'unit', 'product_id', 'estimate_source'}
     update_data = {k: v for k, v in payload.items() if k in allowed_cols}
     
     resp = supabase.table('shopping_list').update(update_data).eq('id', item_id).eq('household_id', household_id).execute()
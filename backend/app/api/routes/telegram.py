@@ -12,6 +12,14 @@ from google.cloud.storage import Bucket
 from supabase import Client as SupabaseClient
 from app.core.supabase import get_supabase
 from app.services.ai_advisor import AIAdvisorService
+from app.services.basket_optimizer import optimize_month
+from app.services import autocomplete
+from app.services import expense_interpreter
+from app.services.update_queue import UpdateQueue
+from app.services.media_group_buffer import MediaGroupBuffer
+from app.services.telegram_session import UserCache, ConversationStore
+from app.services.product_search import normalize_term
+import asyncio
 import logging
 import re
 from datetime import datetime
@@ -24,6 +32,10 @@ router = APIRouter()
 # Singleton services
 telegram_service = TelegramService.get_instance()
 ai_advisor = AIAdvisorService()
+update_queue = UpdateQueue(workers=settings.telegram_workers, max_pending=settings.telegram_max_pending)
+media_groups = MediaGroupBuffer()
+user_cache = UserCache(ttl=settings.telegram_user_cache_ttl)
+conversations = ConversationStore()
 
 @router.post("/webhook")
 async def telegram_webhook(
@@ -35,6 +47,11 @@ async def telegram_webhook(
 ):
     """
     Handle incoming Telegram updates (Webhook)
+
+    Only validates and enqueues: Telegram gets its 200 at once and the
+    update is processed in the background, in order per chat. Redelivered
+    update_ids are dropped. Album photos are buffered by media_group_id
+    and handled as one receipt.
     """
     # 1. Verify Secret Token
     if x_telegram_bot_api_secret_token != settings.telegram_secret_token:
@@ -52,13 +69,37 @@ async def telegram_webhook(
         logger.error(f"Failed to parse update: {e}")
         return {"status": "error"}
 
+    chat = update.effective_chat
+    try:
+        queued = update_queue.submit(
+            update.update_id,
+            chat.id if chat else update.update_id,
+            lambda: _process_update(update, db, bucket, supabase)
+        )
+    except asyncio.QueueFull:
+        # Telegram retries non-2xx responses later
+        logger.warning(f"Update queue full, deferring update {update.update_id}")
+        raise HTTPException(status_code=503, detail="Busy")
+
+    if not queued:
+        logger.info(f"Dropping redelivered update {update.update_id}")
+        return {"status": "duplicate"}
+
+    message = update.message
+    if message and message.media_group_id and message.photo:
+        media_groups.add(message.media_group_id, update.update_id, message.message_id, message.photo[-1])
+    return {"status": "ok"}
+
+
+async def _process_update(update: Update, db: FirestoreClient, bucket: Bucket, supabase: SupabaseClient):
+    """Everything the webhook used to do inline; runs on the update queue"""
     # Handle Callbacks (Buttons)
     if update.callback_query:
         await _handle_callback_query(update, db)
-        return {"status": "ok"}
+        return
 
     if not update.message:
-        return {"status": "ok"} 
+        return
 
     user_id = update.message.from_user.id
     chat_id = update.message.chat_id
@@ -66,12 +107,14 @@ async def telegram_webhook(
     photos = update.message.photo
     media_group_id = update.message.media_group_id
 
-    # Deduplicate media groups (simple in-memory check or just pick first processed)
-    # For MVP: If it's a media group, we might process all, which is bad. 
-    # But Telegram sends separate updates for each photo. 
-    # Best practice: Check if we just processed this media_group_id.
-    # Since we are stateless here, we will let it slide BUT we should advise user.
-    # Actually, the user asked: "Can I upload more than 1?". The answer is YES, but we process them individually.
+    # Album: the first photo's update handles the whole group as one receipt,
+    # the rest were already buffered by the webhook
+    if photos and media_group_id:
+        photos = await media_groups.collect(media_group_id, update.update_id)
+        if not photos:
+            return
+    elif photos:
+        photos = [photos[-1]]
 
     # 3. Check User Link (Auth)
     user_doc = await _get_user_by_telegram_id(db, user_id)
@@ -79,7 +122,7 @@ async def telegram_webhook(
     # Handle /start Command (Linking)
     if text and text.startswith("/start"):
         await _handle_start(chat_id, user_doc, text, db, user_id)
-        return {"status": "ok"}
+        return
 
     if not user_doc:
         await telegram_service.send_message(
@@ -87,19 +130,24 @@ async def telegram_webhook(
             "⛔ Tu cuenta no está vinculada.\n\nEscribe <code>/start tu.email@gmail.com</code> para comenzar.",
             parse_mode="HTML"
         )
-        return {"status": "ok"}
+        return
     
     household_id = user_doc['household_id']
 
     # Handle /precio Command
     if text and text.startswith("/precio"):
         await _handle_price_command(chat_id, text, household_id, db)
-        return {"status": "ok"}
+        return
+
+    # Handle /canasta Command
+    if text and text.startswith("/canasta"):
+        await _handle_basket_command(chat_id, text, household_id, supabase)
+        return
 
     # 4. Handle Content
     try:
         if photos:
-            await _handle_photo_receipt(photos[-1], household_id, user_doc['id'], bucket, db, chat_id)
+            await _handle_photo_receipt(photos, household_id, user_doc['id'], bucket, db, chat_id)
         elif text:
             await _handle_text_message(text, household_id, user_doc['id'], db, chat_id, supabase)
             
@@ -107,18 +155,28 @@ async def telegram_webhook(
         logger.error(f"Error processing message: {e}")
         await telegram_service.send_message(chat_id, "⚠️ Ocurrió un error procesando tu mensaje.")
 
-    return {"status": "ok"}
+
+def _first(query) -> list:
+    """First match of a Firestore query, as a list (blocking: run in a thread)"""
+    return list(query.limit(1).stream())
 
 
 async def _get_user_by_telegram_id(db: FirestoreClient, telegram_id: int):
-    """Find user in Firestore by telegram_user_id"""
+    """Find user by telegram_user_id (cached; Firestore on a miss)"""
+    found, user = user_cache.get(telegram_id)
+    if found:
+        return user
+
+    user = None
     users_ref = db.collection('users')
-    query = users_ref.where('telegram_user_id', '==', telegram_id).limit(1).stream()
+    query = await asyncio.to_thread(_first, users_ref.where('telegram_user_id', '==', telegram_id))
     for doc in query:
-        data = doc.to_dict()
-        data['id'] = doc.id
-        return data
-    return None
+        user = doc.to_dict()
+        user['id'] = doc.id
+        conversations.seed(user['id'], user.get('waiting_for'))
+        break
+    user_cache.put(telegram_id, user)
+    return user
 
 
 async def _handle_start(chat_id: int, user_doc: dict, text: str, db: FirestoreClient, telegram_id: int):
@@ -142,7 +200,7 @@ async def _handle_start(chat_id: int, user_doc: dict, text: str, db: FirestoreCl
     email = parts[1].strip().lower()
     
     users_ref = db.collection('users')
-    query = users_ref.where('email', '==', email).limit(1).stream()
+    query = await asyncio.to_thread(_first, users_ref.where('email', '==', email))
     
     found_doc = None
     for doc in query:
@@ -150,55 +208,60 @@ async def _handle_start(chat_id: int, user_doc: dict, text: str, db: FirestoreCl
         break
     
     if found_doc:
-        found_doc.reference.update({'telegram_user_id': telegram_id})
+        await asyncio.to_thread(found_doc.reference.update, {'telegram_user_id': telegram_id})
+        user_cache.invalidate(telegram_id)
         await telegram_service.send_message(chat_id, f"✅ ¡Vinculado con éxito! Bienvenido, {found_doc.to_dict().get('name', 'Usuario')}.")
     else:
         await telegram_service.send_message(chat_id, f"❌ No encontré un usuario con el email <b>{email}</b>. Asegúrate de que el email esté en Firestore.")
 
 
-async def _handle_photo_receipt(photo, household_id, user_id, bucket, db, chat_id):
-    """Download photo -> Upload to Storage -> Create Receipt"""
-    await telegram_service.send_message(chat_id, "🧾 Boleta recibida. Subiendo...")
-    
-    # 1. Get File URL
-    file_id = photo.file_id
-    file_path = await telegram_service.get_file_url(file_id)
-    
-    # 2. Download (Stream)
-    import httpx
-    async with httpx.AsyncClient() as client:
-        res = await client.get(file_path)
-        if res.status_code != 200:
-            raise Exception("Failed to download image from Telegram")
-        content = res.content
+async def _handle_photo_receipt(photos, household_id, user_id, bucket, db, chat_id):
+    """Download photos -> Upload to Storage -> Create one Receipt (an album is one receipt in parts)"""
+    if len(photos) > 1:
+        await telegram_service.send_message(chat_id, f"🧾 Boleta recibida ({len(photos)} fotos). Subiendo...", progress=True)
+    else:
+        await telegram_service.send_message(chat_id, "🧾 Boleta recibida. Subiendo...", progress=True)
 
-    # 3. Upload to Firebase
-    logger.info(f"Uploading photo for household {household_id} to bucket {bucket.name}")
     receipt_id = str(uuid.uuid4())
-    blob_path = f"households/{household_id}/receipts/{receipt_id}/telegram_upload.jpg"
-    blob = bucket.blob(blob_path)
-    
+    logger.info(f"Uploading {len(photos)} photo(s) for household {household_id} to bucket {bucket.name}")
+
+    import httpx
     from io import BytesIO
-    file_obj = BytesIO(content)
-    blob.upload_from_file(file_obj, content_type="image/jpeg")
-    
-    # Get signed URL (valid for 7 days) - required because bucket has Uniform Access enabled
     from datetime import timedelta
-    image_url = blob.generate_signed_url(timedelta(days=7))
+    image_urls = []
+    async with httpx.AsyncClient() as client:
+        for i, photo in enumerate(photos):
+            # 1. Get File URL
+            file_path = await telegram_service.get_file_url(photo.file_id)
+
+            # 2. Download (Stream)
+            res = await client.get(file_path)
+            if res.status_code != 200:
+                raise Exception("Failed to download image from Telegram")
+
+            # 3. Upload to Firebase (first part keeps the single-photo name)
+            suffix = f"_{i + 1}" if i else ""
+            blob = bucket.blob(f"households/{household_id}/receipts/{receipt_id}/telegram_upload{suffix}.jpg")
+            await asyncio.to_thread(blob.upload_from_file, BytesIO(res.content), content_type="image/jpeg")
+
+            # Get signed URL (valid for 7 days) - required because bucket has Uniform Access enabled
+            image_urls.append(await asyncio.to_thread(blob.generate_signed_url, timedelta(days=7)))
 
     # 4. Create Receipt Doc
     receipt_data = {
-        'image_url': image_url,
+        'image_url': image_urls[0],
+        'image_urls': image_urls,
         'status': 'uploaded',
         'created_by': user_id,
         'source': 'telegram',
         'created_at': datetime.now(),
         'updated_at': datetime.now()
     }
-    db.collection('households').document(household_id)\
-        .collection('receipts').document(receipt_id).set(receipt_data)
+    receipt_ref = db.collection('households').document(household_id)\
+        .collection('receipts').document(receipt_id)
+    await asyncio.to_thread(receipt_ref.set, receipt_data)
 
-    await telegram_service.send_message(chat_id, "⏳ Procesando con IA...")
+    await telegram_service.send_message(chat_id, "⏳ Procesando con IA...", progress=True)
     
     # 5. Trigger Extraction (Immediate for MVP feel)
     try:
@@ -206,15 +269,18 @@ async def _handle_photo_receipt(photo, household_id, user_id, bucket, db, chat_i
             settings.gemini_api_key,
             settings.gemini_model,
             settings.gemini_fallback_model,
+            hedge=settings.gemini_hedge,
+            hedge_model=settings.gemini_hedge_model,
+            base_url=settings.gemini_base_url,
         )
-        result = extractor.extract(image_url)
+        # Sync HTTP with up to three tiers (and hedging): off the event loop
+        result = await asyncio.to_thread(extractor.extract_many, image_urls)
         
         if result.success:
-            db.collection('households').document(household_id)\
-                .collection('receipts').document(receipt_id).update({
-                    'status': 'extracted',
-                    'extracted_json': result.data
-                })
+            await asyncio.to_thread(receipt_ref.update, {
+                'status': 'extracted',
+                'extracted_json': result.data
+            })
             
             # Extract store info with new schema
             store_info = result.data.get('store', {})
@@ -278,20 +344,19 @@ async def _handle_text_message(text, household_id, user_id, db, chat_id, supabas
     """Handle text messages including correction replies"""
     
     # 0. Check if user is in 'waiting_for_store_name' state
-    # Simplified state management using Firestore user doc or in-memory LRU (using Firestore for persistence)
-    user_ref = db.collection('users').document(user_id)
-    user_snap = user_ref.get()
-    user_data = user_snap.to_dict()
-    
-    waiting_for = user_data.get('waiting_for') # e.g. {'action': 'fix_store', 'receipt_id': '123'}
+    # Kept in process, persisted write-behind to the user doc
+    if not conversations.known(user_id):
+        user_snap = await asyncio.to_thread(db.collection('users').document(user_id).get)
+        conversations.seed(user_id, (user_snap.to_dict() or {}).get('waiting_for'))
+    waiting_for = conversations.get(user_id) # e.g. {'action': 'fix_store', 'receipt_id': '123'}
     
     if waiting_for and waiting_for.get('action') == 'fix_store':
         receipt_id = waiting_for.get('receipt_id')
-        new_store_name = text.strip()
+        new_store_name = await _canonical_store_name(text.strip(), household_id, db)
         
         # Update receipt with new store name
         receipt_ref = db.collection('households').document(household_id).collection('receipts').document(receipt_id)
-        receipt_doc = receipt_ref.get()
+        receipt_doc = await asyncio.to_thread(receipt_ref.get)
         
         if receipt_doc.exists:
             # Update the extracted JSON directly so confirmation picks it up
@@ -301,10 +366,10 @@ async def _handle_text_message(text, household_id, user_id, db, chat_id, supabas
             extracted['store']['name'] = new_store_name
             extracted['store']['method'] = 'user_correction'
             
-            receipt_ref.update({'extracted_json': extracted})
+            await asyncio.to_thread(receipt_ref.update, {'extracted_json': extracted})
             
             # Clear waiting state
-            user_ref.update({'waiting_for': None})
+            conversations.clear(db, user_id)
             
             await telegram_service.send_message(chat_id, f"✅ Tienda actualizada a: <b>{new_store_name}</b>", parse_mode="HTML")
             
@@ -312,14 +377,21 @@ async def _handle_text_message(text, household_id, user_id, db, chat_id, supabas
             await _reshow_confirmation(receipt_id, household_id, chat_id, db)
             return
 
-    await telegram_service.send_message(chat_id, "🤖 Pensando...", parse_mode="HTML")
+    await telegram_service.send_message(chat_id, "🤖 Pensando...", parse_mode="HTML", progress=True)
 
     # 1. Obtener categorías de Supabase
-    categories_res = supabase.table("categories").select("id, name").eq("household_id", household_id).execute()
+    categories_res = await asyncio.to_thread(
+        supabase.table("categories").select("id, name").eq("household_id", household_id).execute
+    )
     categories = categories_res.data
     
-    # 2. IA Interpreta el texto
-    suggestion = await ai_advisor.categorize_text(text, categories)
+    # 2. Interpretar el texto (local -> caché -> IA)
+    try:
+        model = await asyncio.to_thread(expense_interpreter.get_model, supabase, household_id, db)
+    except Exception as e:
+        logger.warning(f"Expense model unavailable for {household_id}: {e}")
+        model = None
+    suggestion = await expense_interpreter.interpret(text, categories, ai_advisor.categorize_text, model)
     
     if not suggestion:
         await telegram_service.send_message(chat_id, "❌ No entendí el gasto. Intenta explicármelo de nuevo, por ejemplo: '45 lucas en el Supermercado'.")
@@ -349,7 +421,11 @@ async def _handle_text_message(text, household_id, user_id, db, chat_id, supabas
     }
     
     try:
-        supabase.table('transactions').insert(transaction_data).execute()
+        await asyncio.to_thread(supabase.table('transactions').insert(transaction_data).execute)
+        expense_interpreter.record(
+            household_id, text, transaction_data['category_id'],
+            transaction_data['bucket'], transaction_data['store_id']
+        )
         
         advice = suggestion.get('advice', '')
         bucket_label = (suggestion.get('bucket') or '').upper()
@@ -404,31 +480,56 @@ async def _handle_callback_query(update: Update, db: FirestoreClient):
 
 async def _handle_receipt_fix_store(receipt_id, household_id, chat_id, message_id, db, query):
     """Ask user for new store name"""
-    user_id = query.from_user.id
+    user_doc = await _get_user_by_telegram_id(db, query.from_user.id)
     
     # Set user state to waiting_for fix_store
-    user_ref = db.collection('users').where('telegram_user_id', '==', user_id).limit(1).stream()
-    for doc in user_ref:
-        doc.reference.update({
-            'waiting_for': {
-                'action': 'fix_store',
-                'receipt_id': receipt_id
-            }
+    if user_doc:
+        conversations.set(db, user_doc['id'], {
+            'action': 'fix_store',
+            'receipt_id': receipt_id
         })
-        break
     
     await query.answer()
+    prompt = "✍️ <b>Escribe el nombre correcto de la tienda:</b>"
+    try:
+        frequent = await _store_suggestions("", household_id, db, limit=5)
+        if frequent:
+            prompt += "\n\nFrecuentes: " + ", ".join(f"<code>{name}</code>" for name in frequent)
+    except Exception as e:
+        logger.warning(f"Store suggestions unavailable: {e}")
     await telegram_service.send_message(
         chat_id, 
-        "✍️ <b>Escribe el nombre correcto de la tienda:</b>",
+        prompt,
         parse_mode="HTML"
     )
 
+async def _store_suggestions(prefix: str, household_id: str, db: FirestoreClient, limit: int = 5) -> list:
+    """Known store names starting with prefix, most used first"""
+    index = await asyncio.to_thread(
+        autocomplete.get_index, 'firestore', household_id, autocomplete.firestore_loader(db)
+    )
+    names = []
+    for entry in index.suggest(prefix, limit=limit * 2, kinds=[autocomplete.STORE, autocomplete.PATTERN]):
+        if entry['label'] not in names:
+            names.append(entry['label'])
+    return names[:limit]
+
+async def _canonical_store_name(typed: str, household_id: str, db: FirestoreClient) -> str:
+    """Reuse a known store's spelling when the user types it differently ("lider" -> "Lider")"""
+    try:
+        for name in await _store_suggestions(typed, household_id, db):
+            if normalize_term(name) == normalize_term(typed):
+                return name
+    except Exception as e:
+        logger.warning(f"Store suggestions unavailable: {e}")
+    return typed
+
 async def _reshow_confirmation(receipt_id, household_id, chat_id, db):
     """Re-send the confirmation card with updated data"""
-    receipt_doc = db.collection('households').document(household_id)\
-            .collection('receipts').document(receipt_id).get()
-            
+    receipt_doc = await asyncio.to_thread(
+        db.collection('households').document(household_id).collection('receipts').document(receipt_id).get
+    )
+
     if not receipt_doc.exists: return
 
     data = receipt_doc.to_dict()
@@ -470,7 +571,7 @@ async def _handle_receipt_confirm(receipt_id, household_id, chat_id, message_id,
     try:
         receipt_ref = db.collection('households').document(household_id)\
             .collection('receipts').document(receipt_id)
-        receipt_doc = receipt_ref.get()
+        receipt_doc = await asyncio.to_thread(receipt_ref.get)
         
         if not receipt_doc.exists:
             await query.answer("❌ Boleta no encontrada.")
@@ -489,7 +590,8 @@ async def _handle_receipt_confirm(receipt_id, household_id, chat_id, message_id,
         }
         
         processor = ReceiptProcessor(db)
-        result = processor.confirm_receipt(
+        result = await asyncio.to_thread(
+            processor.confirm_receipt,
             receipt_id=receipt_id,
             household_id=household_id,
             corrections=corrections,
@@ -511,11 +613,12 @@ async def _handle_receipt_confirm(receipt_id, household_id, chat_id, message_id,
 async def _handle_receipt_reject(receipt_id, household_id, chat_id, message_id, db, query):
     """Reject receipt"""
     try:
-        db.collection('households').document(household_id)\
-            .collection('receipts').document(receipt_id).update({
-                'status': 'rejected',
-                'updated_at': datetime.now()
-            })
+        receipt_ref = db.collection('households').document(household_id)\
+            .collection('receipts').document(receipt_id)
+        await asyncio.to_thread(receipt_ref.update, {
+            'status': 'rejected',
+            'updated_at': datetime.now()
+        })
         
         await telegram_service.edit_message(
             chat_id=chat_id,
@@ -533,7 +636,7 @@ async def _handle_receipt_detail(receipt_id, household_id, chat_id, message_id,
     try:
         receipt_ref = db.collection('households').document(household_id)\
             .collection('receipts').document(receipt_id)
-        receipt_doc = receipt_ref.get()
+        receipt_doc = await asyncio.to_thread(receipt_ref.get)
         
         if not receipt_doc.exists:
             await query.answer("❌ Detalle no encontrado.")
@@ -630,3 +733,46 @@ async def _handle_price_command(chat_id, text, household_id, db):
     except Exception as e:
         logger.error(f"Error in /precio command: {e}")
         await telegram_service.send_message(chat_id, "⚠️ Error al consultar el precio.")
+
+async def _handle_basket_command(chat_id, text, household_id, supabase: SupabaseClient):
+    """Handle /canasta [YYYY-MM] command: where this month's list is cheapest"""
+    month = text.replace("/canasta", "").strip() or datetime.now().strftime('%Y-%m')
+    if not re.fullmatch(r"\d{4}-\d{2}", month):
+        await telegram_service.send_message(
+            chat_id,
+            "❓ Formato: <code>/canasta</code> o <code>/canasta 2026-03</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    try:
+        result = await asyncio.to_thread(optimize_month, supabase, household_id, month)
+        await telegram_service.send_message(chat_id, _format_basket(result), parse_mode="HTML")
+    except Exception as e:
+        logger.error(f"Error in /canasta command: {e}")
+        await telegram_service.send_message(chat_id, "⚠️ Error al calcular la canasta.")
+
+def _format_basket(result: dict) -> str:
+    best = result.get('best_store')
+    if not best:
+        return f"🛒 No hay precios registrados para tu lista de {result['month']}."
+
+    lines = [f"🛒 <b>Canasta {result['month']}</b> ({result['priced_items']}/{result['items']} con precio)\n"]
+    lines.append(f"🏆 Una tienda: <b>{best['store_name']}</b> ${best['total']:,} ({best['covered']} productos)")
+    pair = result.get('best_pair')
+    if pair:
+        saving = pair.get('savings_vs_best_store')
+        saving_text = f" · ahorras ${saving:,}" if saving and saving > 0 else ""
+        lines.append(
+            f"🔀 Dos tiendas: <b>{pair['store_names'][0]}</b> + <b>{pair['store_names'][1]}</b> "
+            f"${pair['total']:,}{saving_text}"
+        )
+
+    top = [s for s in result.get('item_savings', []) if s['savings_vs_priciest'] > 0][:5]
+    if top:
+        lines.append("\n💡 <b>Mayores ahorros</b>")
+        for s in top:
+            lines.append(f"• {s['name']}: {s['cheapest_store_name']} (-${s['savings_vs_priciest']:,})")
+    if result.get('unpriced'):
+        lines.append(f"\n❔ Sin precio: {len(result['unpriced'])} productos")
+    return "\n".join(lines)
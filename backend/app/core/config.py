@@ -20,6 +20,15 @@ class Settings(BaseSettings):
     gemini_api_key: str
     gemini_model: str | None = None
     gemini_fallback_model: str | None = None
+    # Hedged extraction: a second request when a call passes the usual
+    # (percentile) latency; at most gemini_hedge_max_inflight at once
+    gemini_hedge: bool = False
+    gemini_hedge_model: str | None = None
+    gemini_hedge_percentile: float = 0.9
+    gemini_hedge_max_inflight: int = 4
+    # Same REST contract on another host: the local stub in
+    # scripts/stub_gemini.py for benchmarks
+    gemini_base_url: str | None = None
 
     # Supabase
     supabase_url: str = ""
@@ -29,7 +38,18 @@ class Settings(BaseSettings):
     telegram_bot_token: str
     telegram_secret_token: str = "default-secret-token"
     ngrok_authtoken: str = ""
+    # Webhook updates are acked at once and processed by this many workers
+    telegram_workers: int = 4
+    telegram_max_pending: int = 1000
+    # Seconds a telegram_user_id -> user lookup is reused
+    telegram_user_cache_ttl: int = 300
+    # Outbound pacing (Telegram allows ~30 msg/s overall, ~1 msg/s per chat)
+    telegram_rate_per_second: float = 25.0
+    telegram_chat_interval: float = 1.0
     
+    # Recipes (parsed Notion CSV snapshot; defaults to the temp dir)
+    recipe_snapshot_path: str = ""
+
     # Application
     environment: Literal["development", "staging", "production"] = "development"
     log_level: str = "INFO"
@@ -1,6 +1,9 @@
 from datetime import datetime, timedelta
 from typing import List
+from typing import Dict, Any
+import numpy as np
 from .models import Status, Transaction, RecurringItem, ProductPrice, HouseholdSignals
+from .price_stats import quantile, sketch_value
 
 
 def mean(values: List[float]) -> float:
@@ -98,6 +101,65 @@ def compute_product_status(
         return Status.GREEN
 
 
+def compute_product_statuses(
+    prices_by_product: Dict[str, List[float]]
+) -> Dict[str, Status]:
+    """
+    compute_product_status for many products in one vectorized pass
+
+    prices_by_product maps product_id -> unit prices in chronological order.
+    Uses the same percentile rule (element int(n * p) of the sorted prices).
+    """
+    ids = list(prices_by_product)
+    if not ids:
+        return {}
+
+    lengths = np.array([len(prices_by_product[pid]) for pid in ids], dtype=np.int64)
+    if lengths.sum() == 0:
+        return {pid: Status.GREEN for pid in ids}
+
+    flat = np.concatenate([np.asarray(prices_by_product[pid], dtype=float) for pid in ids])
+    groups = np.repeat(np.arange(len(ids)), lengths)
+    starts = np.cumsum(lengths) - lengths
+
+    # Sort prices within each product, keeping products contiguous
+    sorted_vals = flat[np.lexsort((flat, groups))]
+
+    has_data = lengths > 0
+    safe_len = np.maximum(lengths, 1)
+    last = np.where(has_data, starts + lengths - 1, 0)
+    k50 = np.minimum((safe_len * 0.50).astype(np.int64), safe_len - 1)
+    k75 = np.minimum((safe_len * 0.75).astype(np.int64), safe_len - 1)
+    p50 = sorted_vals[np.where(has_data, starts + k50, 0)]
+    p75 = sorted_vals[np.where(has_data, starts + k75, 0)]
+    latest = flat[last]
+
+    codes = np.where(latest > p75, 2, np.where(latest > p50, 1, 0))
+    codes = np.where(lengths < 3, 0, codes)
+
+    by_code = (Status.GREEN, Status.YELLOW, Status.RED)
+    return {pid: by_code[code] for pid, code in zip(ids, codes.tolist())}
+
+
+def compute_product_status_from_stats(
+    stats: Dict[str, Any]
+) -> Status:
+    """Same rule as compute_product_status, from a price stats dict"""
+    if not stats or (stats.get('count') or 0) < 3:
+        return Status.GREEN
+
+    p50 = quantile(stats, 0.50)
+    p75 = quantile(stats, 0.75)
+    latest = sketch_value(stats, stats.get('last_price') or 0.0)
+
+    if latest > p75:
+        return Status.RED
+    elif latest > p50:
+        return Status.YELLOW
+    else:
+        return Status.GREEN
+
+
 def compute_household_status(signals: HouseholdSignals) -> Status:
     if (
         signals.spending == Status.RED or
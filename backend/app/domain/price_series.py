@@ -0,0 +1,153 @@
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional
+
+# Compact price history: one document per product with parallel arrays
+#   d: date ordinals (date.toordinal()), sorted ascending
+#   p: unit prices
+#   s: index into `stores`
+#   q: quantities
+#   u: index into `units`
+# A year of weekly purchases is ~50 entries per array instead of ~50 documents.
+
+
+def new_series(product_id: str) -> Dict[str, Any]:
+    return {
+        'product_id': product_id,
+        'd': [],
+        'p': [],
+        's': [],
+        'q': [],
+        'u': [],
+        'stores': [],
+        'units': []
+    }
+
+
+def to_ordinal(value) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.toordinal()
+    return int(value)
+
+
+def append_point(
+    series: Dict[str, Any],
+    occurred_on,
+    unit_price: float,
+    store_id: Optional[str],
+    qty: Optional[float],
+    unit: Optional[str]
+) -> Dict[str, Any]:
+    """Add one purchase to a series (in place), keeping dates sorted"""
+    store_idx = _intern(series['stores'], store_id)
+    unit_idx = _intern(series['units'], unit or 'unit')
+    ordinal = to_ordinal(occurred_on)
+
+    # Receipts usually arrive in date order, so this is an append
+    pos = bisect_right(series['d'], ordinal)
+    series['d'].insert(pos, ordinal)
+    series['p'].insert(pos, float(unit_price or 0))
+    series['s'].insert(pos, store_idx)
+    series['q'].insert(pos, float(qty or 0))
+    series['u'].insert(pos, unit_idx)
+    return series
+
+
+def build_series(product_id: str, price_records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Series from raw product_prices dicts"""
+    series = new_series(product_id)
+    for data in price_records:
+        if not data.get('date'):
+            continue
+        append_point(series, data['date'], data.get('unit_price'), data.get('store_id'), data.get('qty'), data.get('unit'))
+    return series
+
+
+def lttb(xs: List[float], ys: List[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Returns the indices of the points to keep (always first and last),
+    preserving the visual peaks and dips of the price line.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    kept = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third triangle vertex
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs(
+                (xs[a] - avg_x) * (ys[j] - ys[a]) -
+                (xs[a] - xs[j]) * (avg_y - ys[a])
+            )
+            if area > best_area:
+                best_area = area
+                best = j
+        kept.append(best)
+        a = best
+
+    kept.append(n - 1)
+    return kept
+
+
+def to_payload(
+    series: Dict[str, Any],
+    points: Optional[int] = None,
+    unit: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Chart payload: ISO dates + parallel arrays, optionally restricted to one
+    unit and downsampled to `points` with LTTB
+    """
+    # Rows appended by the database trigger may be out of date order
+    idx = sorted(range(len(series.get('d') or [])), key=lambda i: series['d'][i])
+    units = series.get('units') or []
+    if unit is not None and unit in units:
+        unit_idx = units.index(unit)
+        idx = [i for i in idx if series['u'][i] == unit_idx]
+
+    if points and len(idx) > points:
+        xs = [series['d'][i] for i in idx]
+        ys = [series['p'][i] for i in idx]
+        idx = [idx[k] for k in lttb(xs, ys, points)]
+
+    return {
+        'product_id': series.get('product_id'),
+        'dates': [date.fromordinal(series['d'][i]).isoformat() for i in idx],
+        'unit_prices': [series['p'][i] for i in idx],
+        'store_idx': [series['s'][i] for i in idx],
+        'qty': [series['q'][i] for i in idx],
+        'unit_idx': [series['u'][i] for i in idx],
+        'stores': series.get('stores') or [],
+        'units': units,
+        'total_points': len(series.get('d') or []),
+    }
+
+
+def _intern(table: List, value) -> int:
+    try:
+        return table.index(value)
+    except ValueError:
+        table.append(value)
+        return len(table) - 1
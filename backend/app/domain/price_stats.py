@@ -0,0 +1,129 @@
+import math
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterable
+
+# Log-bucketed quantile sketch (DDSketch-style): every bucket covers prices
+# within ±2% of its representative value, so quantiles are accurate to 2%
+# with a few dozen buckets per product. Bucket keys are strings because the
+# sketch is stored as a Firestore map.
+RELATIVE_ACCURACY = 0.02
+MAX_BUCKETS = 128
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_ZERO_BUCKET = "z"
+
+
+def new_stats() -> Dict[str, Any]:
+    return {
+        'count': 0,
+        'sum': 0.0,
+        'min': None,
+        'max': None,
+        'last_price': None,
+        'last_date': None,
+        'sketch': {}
+    }
+
+
+def add_price(stats: Dict[str, Any], unit_price: float, date: Optional[datetime] = None) -> Dict[str, Any]:
+    """Fold one observed unit price into a stats dict (in place)"""
+    unit_price = float(unit_price or 0)
+    stats['count'] = stats.get('count', 0) + 1
+    stats['sum'] = stats.get('sum', 0.0) + unit_price
+    stats['min'] = unit_price if stats.get('min') is None else min(stats['min'], unit_price)
+    stats['max'] = unit_price if stats.get('max') is None else max(stats['max'], unit_price)
+
+    # "Latest" is by purchase date so late-confirmed old receipts don't win
+    last_date = stats.get('last_date')
+    if last_date is None or date is None or as_naive(date) >= as_naive(last_date):
+        stats['last_price'] = unit_price
+        stats['last_date'] = date
+
+    sketch = stats.setdefault('sketch', {})
+    key = _bucket_key(unit_price)
+    sketch[key] = sketch.get(key, 0) + 1
+    if len(sketch) > MAX_BUCKETS:
+        _collapse_lowest(sketch)
+    return stats
+
+
+def build_stats(prices: Iterable[tuple]) -> Dict[str, Any]:
+    """Build stats from (unit_price, date) pairs"""
+    stats = new_stats()
+    for unit_price, date in prices:
+        add_price(stats, unit_price, date)
+    return stats
+
+
+def mean_price(stats: Dict[str, Any]) -> float:
+    count = stats.get('count') or 0
+    return stats.get('sum', 0.0) / count if count else 0.0
+
+
+def quantile(stats: Dict[str, Any], p: float) -> float:
+    """
+    Approximate p-quantile with the same rank rule as logic.percentile
+    (element int(n * p) of the sorted values)
+    """
+    count = stats.get('count') or 0
+    sketch = stats.get('sketch') or {}
+    if not count or not sketch:
+        return 0.0
+
+    rank = min(int(count * p), count - 1)
+    seen = 0
+    for key in sorted(sketch, key=_bucket_order):
+        seen += sketch[key]
+        if seen > rank:
+            return _clamp(stats, _bucket_value(key))
+    return stats.get('max') or 0.0
+
+
+def sketch_value(stats: Dict[str, Any], value: float) -> float:
+    """Round a price to its sketch bucket so it compares fairly with quantile()"""
+    return _clamp(stats, _bucket_value(_bucket_key(float(value or 0))))
+
+
+def stats_key(store_id: Optional[str], unit: Optional[str]) -> str:
+    """Map key for a store × unit slot (Firestore map keys can't contain '.')"""
+    return f"{store_id or 'none'}__{(unit or 'unit').replace('.', '')}"
+
+
+def _bucket_key(value: float) -> str:
+    if value <= 0:
+        return _ZERO_BUCKET
+    return str(math.ceil(math.log(value) / _LOG_GAMMA))
+
+
+def _bucket_order(key: str) -> float:
+    return -math.inf if key == _ZERO_BUCKET else int(key)
+
+
+def _bucket_value(key: str) -> float:
+    if key == _ZERO_BUCKET:
+        return 0.0
+    return 2 * _GAMMA ** int(key) / (_GAMMA + 1)
+
+
+def _clamp(stats: Dict[str, Any], value: float) -> float:
+    # Keep estimates inside the exact observed range
+    low, high = stats.get('min'), stats.get('max')
+    if low is not None:
+        value = max(value, low)
+    if high is not None:
+        value = min(value, high)
+    return value
+
+
+def _collapse_lowest(sketch: Dict[str, int]) -> None:
+    """Merge the two lowest buckets; low prices lose accuracy first"""
+    keys = sorted(sketch, key=_bucket_order)
+    lowest, second = keys[0], keys[1]
+    sketch[second] += sketch.pop(lowest)
+
+
+def as_naive(value: datetime) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.replace(tzinfo=None) if getattr(value, 'tzinfo', None) else value
@@ -4,6 +4,7 @@ from fastapi.responses import JSONResponse
 from app.core.firebase import initialize_firebase
 from app.core.config import settings
 from app.api.routes import receipts, jobs, telegram, dashboard, products, catalog, incomes, commitments, events, alerts, horizon, recipes, shopping_list, bitacora, diagnose, meal_planner, advisor
+import asyncio
 import logging
 import traceback
 
@@ -59,6 +60,21 @@ async def startup_event():
         logger.warning(f"Firebase initialization failed (non-fatal, Supabase will be used): {e}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Let queued Telegram updates and replies finish and persist conversation state before the process exits"""
+    try:
+        await asyncio.wait_for(telegram.update_queue.join(), timeout=10)
+    except asyncio.TimeoutError:
+        logger.warning(f"Shutting down with {len(telegram.update_queue)} Telegram updates pending")
+    await telegram.update_queue.stop()
+    await telegram.conversations.flush()
+    try:
+        await asyncio.wait_for(telegram.telegram_service.outbox.join(), timeout=5)
+    except asyncio.TimeoutError:
+        logger.warning(f"Shutting down with {len(telegram.telegram_service.outbox)} Telegram replies unsent")
+
+
 
 
 @app.get("/health")
@@ -141,26 +157,24 @@ async def debug_inject():
         ]
         supabase.table("commitments").upsert(commitments, on_conflict="household_id,name").execute()
         
-        # Meal Plans (Mock for March) - Safe Delete then Insert
+        # Meal Plans (Mock for March) - Upsert on (household_id, date, type)
         meal_plans = [
             {"household_id": hh_id, "date": "2026-03-03", "type": "lunch", "recipe_name": "Lentejas", "recipe_cost": 5000},
             {"household_id": hh_id, "date": "2026-03-04", "type": "lunch", "recipe_name": "Pollo con Arroz", "recipe_cost": 8000},
             {"household_id": hh_id, "date": "2026-03-05", "type": "lunch", "recipe_name": "Pasta Boloñesa", "recipe_cost": 6000}
         ]
         
-        for m in meal_plans:
-            supabase.table("meal_plans").delete().eq("household_id", hh_id).eq("date", m["date"]).eq("type", m["type"]).execute()
-        supabase.table("meal_plans").insert(meal_plans).execute()
+        supabase.table("meal_plans").upsert(meal_plans, on_conflict=meal_planner.MEAL_PLAN_KEY).execute()
         
-        # Shopping List (Mock for March) - Safe Delete then Insert
+        # Shopping List (Mock for March) - One delete for the mock names, one insert
         shopping_list = [
             {"household_id": hh_id, "name": "Pan molde", "estimated_cost": 3000, "month": "2026-03"},
             {"household_id": hh_id, "name": "Leche 12pk", "estimated_cost": 12000, "month": "2026-03"},
             {"household_id": hh_id, "name": "Frutas", "estimated_cost": 15000, "month": "2026-03"}
         ]
         
-        for s in shopping_list:
-            supabase.table("shopping_list").delete().eq("household_id", hh_id).eq("name", s["name"]).eq("month", s["month"]).execute()
+        supabase.table("shopping_list").delete().eq("household_id", hh_id).eq("month", "2026-03")\
+            .in_("name", [s["name"] for s in shopping_list]).execute()
         supabase.table("shopping_list").insert(shopping_list).execute()
         
         return {"success": True, "message": "Injected commitments, meals and shopping list (safe mode)"}
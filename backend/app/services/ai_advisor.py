@@ -1,13 +1,32 @@
 import os
 import json
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Optional
 import httpx
 from loguru import logger
 from dotenv import load_dotenv
 
 load_dotenv()
 
+BUCKET_RULES = """
+        REGLAS DE BUCKETS (Criterio del P. Ravasi / ERP Familiar):
+        - OXÍGENO: Gastos vitales (Super, cuentas, arriendo, salud básica, educación hijas).
+        - VIDA: Gastos que dan gusto (Salidas, hobbies, regalos, ropa no esencial).
+        - BLINDAJE: Ahorros, inversiones o pago de deudas.
+"""
+
+
 class AIAdvisorService:
+    # Batch mode: descriptions per prompt, and a cap on their total length so
+    # the answer fits in one response
+    BATCH_SIZE = 40
+    BATCH_MAX_CHARS = 6000
+    BATCH_CONCURRENCY = 4
+    # HTTP errors worth retrying (429, 5xx, timeouts): attempts and first
+    # backoff in seconds, doubled each time (a Retry-After header wins)
+    BATCH_RETRIES = 3
+    BATCH_BACKOFF = 2.0
+
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
         self.endpoint = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
@@ -27,11 +46,7 @@ class AIAdvisorService:
         CATEGORÍAS DISPONIBLES:
         {cat_context}
         
-        REGLAS DE BUCKETS (Criterio del P. Ravasi / ERP Familiar):
-        - OXÍGENO: Gastos vitales (Super, cuentas, arriendo, salud básica, educación hijas).
-        - VIDA: Gastos que dan gusto (Salidas, hobbies, regalos, ropa no esencial).
-        - BLINDAJE: Ahorros, inversiones o pago de deudas.
-        
+        {BUCKET_RULES}
         INSTRUCCIÓN: Devuelve un JSON con:
         1. category_id: El ID de la categoría que mejor calce.
         2. bucket: "oxigeno", "vida" o "blindaje".
@@ -42,6 +57,14 @@ class AIAdvisorService:
         RESPUESTA SOLO EN JSON:
         """
         
+        try:
+            return await self._generate_json(prompt)
+        except Exception as e:
+            logger.error(f"Error in AI categorization: {e}")
+            return None
+
+    async def _generate_json(self, prompt: str, timeout: float = 30.0) -> Any:
+        """One Gemini call in JSON mode; raises on HTTP or parse errors"""
         payload = {
             "contents": [{
                 "parts": [{"text": prompt}]
@@ -54,14 +77,119 @@ class AIAdvisorService:
         headers = {"Content-Type": "application/json"}
         params = {"key": self.api_key}
         
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.post(self.endpoint, json=payload, headers=headers, params=params)
+            response.raise_for_status()
+            result = response.json()
+            
+            content = result['candidates'][0]['content']['parts'][0]['text']
+            return json.loads(content)
+
+    async def categorize_batch(
+        self,
+        texts: List[str],
+        categories: List[Dict[str, Any]],
+        batch_size: Optional[int] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        categorize_text for many descriptions: up to batch_size per prompt,
+        with the category list sent once per prompt. Repeated texts are sent
+        once. A batch whose answer can't be parsed or comes back incomplete
+        is split in half and retried, down to single items. HTTP errors are
+        retried as is with backoff when transient, otherwise the batch is
+        given up (never split: smaller prompts won't help). Results follow
+        texts; None where the model gave nothing usable. No advice in this
+        mode.
+        """
+        batch_size = batch_size or self.BATCH_SIZE
+        unique = list(dict.fromkeys(t.strip() for t in texts if t and t.strip()))
+        batches, current, size = [], [], 0
+        for text in unique:
+            if current and (len(current) >= batch_size or size + len(text) > self.BATCH_MAX_CHARS):
+                batches.append(current)
+                current, size = [], 0
+            current.append(text)
+            size += len(text)
+        if current:
+            batches.append(current)
+
+        semaphore = asyncio.Semaphore(self.BATCH_CONCURRENCY)
+        answers: Dict[str, Dict[str, Any]] = {}
+
+        async def run(batch: List[str]):
+            for attempt in range(self.BATCH_RETRIES + 1):
+                try:
+                    async with semaphore:
+                        found = await self._categorize_chunk(batch, categories)
+                    break
+                except httpx.HTTPError as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        logger.error(f"AI batch categorization failed ({len(batch)} items): {e}")
+                        return
+                    await asyncio.sleep(delay)
+            answers.update(found)
+            missing = [t for t in batch if t not in found]
+            if missing and len(batch) > 1:
+                half = (len(missing) + 1) // 2
+                await asyncio.gather(run(missing[:half]), run(missing[half:]))
+
+        await asyncio.gather(*(run(b) for b in batches))
+        logger.info(f"Batch categorization: {len(answers)}/{len(unique)} texts in {len(batches)} initial batches")
+        return [answers.get((t or '').strip()) for t in texts]
+
+    async def _categorize_chunk(self, batch: List[str], categories: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """text -> answer for the items of one prompt that came back valid"""
+        cat_context = "\n".join([f"- {c['name']} (ID: {c['id']})" for c in categories])
+        items = json.dumps([{"i": i, "text": t} for i, t in enumerate(batch)], ensure_ascii=False)
+        prompt = f"""
+        Eres un Asesor Financiero experto para una familia chilena. 
+        Clasifica CADA gasto de la lista según las categorías disponibles.
+        
+        GASTOS (JSON, "i" es el índice):
+        {items}
+        
+        CATEGORÍAS DISPONIBLES:
+        {cat_context}
+        {BUCKET_RULES}
+        INSTRUCCIÓN: Devuelve un arreglo JSON con un objeto por gasto, en el mismo orden:
+        {{"i": índice, "category_id": ID de la categoría, "bucket": "oxigeno" | "vida" | "blindaje",
+          "normalized_description": versión limpia del gasto, "amount_hint": monto como número o null}}
+        
+        RESPUESTA SOLO EN JSON:
+        """
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(self.endpoint, json=payload, headers=headers, params=params)
-                response.raise_for_status()
-                result = response.json()
-                
-                content = result['candidates'][0]['content']['parts'][0]['text']
-                return json.loads(content)
+            result = await self._generate_json(prompt, timeout=60.0)
+        except httpx.HTTPError:
+            raise
         except Exception as e:
-            logger.error(f"Error in AI categorization: {e}")
+            logger.warning(f"Unusable AI batch answer ({len(batch)} items): {e}")
+            return {}
+
+        if isinstance(result, dict):
+            result = result.get('items') or result.get('results') or []
+        found = {}
+        valid_ids = {c['id'] for c in categories}
+        for entry in result if isinstance(result, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            i = entry.pop('i', None)
+            if isinstance(i, int) and 0 <= i < len(batch) and entry.get('category_id') in valid_ids:
+                entry.setdefault('advice', '')
+                found[batch[i]] = entry
+        return found
+
+    def _retry_delay(self, error: httpx.HTTPError, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying a failed call; None to give up"""
+        if attempt >= self.BATCH_RETRIES:
+            return None
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            if status != 429 and status < 500:
+                return None
+            retry_after = error.response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+        elif not isinstance(error, httpx.TransportError):
             return None
+        return self.BATCH_BACKOFF * 2 ** attempt
@@ -1,11 +1,156 @@
 ﻿from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import base64
 import json
 import logging
-from typing import Optional
+import threading
+import time
+from typing import Optional, List, Dict, Any, Callable
 import requests
 
 logger = logging.getLogger(__name__)
 
+# Per-tier latency and how often receipts escalate (process lifetime)
+_STATS: Dict[str, Any] = {'receipts': 0, 'escalated': 0, 'tiers': {}}
+_STATS_LOCK = threading.Lock()
+_LATENCY_WINDOW = 500
+
+
+def _record_tier(tier: str, elapsed_ms: float, reasons: List[str]) -> None:
+    with _STATS_LOCK:
+        entry = _STATS['tiers'].setdefault(tier, {'count': 0, 'ms': 0.0, 'reasons': {}, 'samples': deque(maxlen=_LATENCY_WINDOW)})
+        entry['count'] += 1
+        entry['ms'] += elapsed_ms
+        entry['samples'].append(elapsed_ms)
+        for reason in reasons:
+            entry['reasons'][reason] = entry['reasons'].get(reason, 0) + 1
+
+
+def _record_receipt(escalated: bool) -> None:
+    with _STATS_LOCK:
+        _STATS['receipts'] += 1
+        _STATS['escalated'] += int(escalated)
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def extraction_stats() -> Dict[str, Any]:
+    """Calls and latency (mean, p50, p99) per tier, why each tier escalated, escalation rate, hedging"""
+    with _STATS_LOCK:
+        receipts = _STATS['receipts']
+        stats = {
+            'receipts': receipts,
+            'escalation_rate': round(_STATS['escalated'] / receipts, 4) if receipts else None,
+            'tiers': {
+                tier: {
+                    'count': t['count'],
+                    'avg_ms': round(t['ms'] / t['count'], 1) if t['count'] else None,
+                    'p50_ms': _percentile(t['samples'], 0.5),
+                    'p99_ms': _percentile(t['samples'], 0.99),
+                    'reasons': dict(t['reasons'])
+                }
+                for tier, t in _STATS['tiers'].items()
+            }
+        }
+    if _HEDGE is not None:
+        stats['hedging'] = dict(_HEDGE.stats)
+    return stats
+
+
+class HedgePolicy:
+    """
+    Hedged Gemini calls for tail latency
+
+    A call that hasn't answered by the `percentile` latency of recent
+    calls to its model gets a second request; the first valid answer wins.
+    At most `max_inflight` hedges run at once, so a slow Gemini can't
+    double our load. A request already on the wire can't be interrupted:
+    the loser is cancelled if it hasn't started, otherwise its answer is
+    discarded.
+    """
+
+    def __init__(self, percentile: float = 0.9, max_inflight: int = 4, default_delay: float = 8.0,
+                 min_delay: float = 1.0, min_samples: int = 20, workers: int = 32):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini")
+        self.stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'capped': 0}
+
+    def delay(self, model_name: str) -> float:
+        """Seconds to wait for the first request before hedging"""
+        with self._lock:
+            samples = list(self._latencies.get(model_name) or [])
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return max(_percentile(samples, self.percentile), self.min_delay)
+
+    def observe(self, model_name: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(model_name, deque(maxlen=_LATENCY_WINDOW)).append(seconds)
+
+    def _timed(self, model_name: str, call: Callable[[], Any]) -> Callable[[], Any]:
+        def run():
+            started = time.perf_counter()
+            result = call()
+            self.observe(model_name, time.perf_counter() - started)
+            return result
+        return run
+
+    def run(self, model_name: str, call: Callable[[], Any], hedge_model: str, hedge_call: Callable[[], Any]) -> Any:
+        """call(), hedged with hedge_call() past the deadline; raises if both fail"""
+        self.stats['calls'] += 1
+        first = self._pool.submit(self._timed(model_name, call))
+        done, _ = wait([first], timeout=self.delay(model_name))
+        if done:
+            return first.result()
+        if not self._slots.acquire(blocking=False):
+            self.stats['capped'] += 1
+            return first.result()
+
+        self.stats['hedged'] += 1
+        logger.info(f"Hedging slow {model_name} call with {hedge_model}")
+        second = self._pool.submit(self._timed(hedge_model, hedge_call))
+        second.add_done_callback(lambda _: self._slots.release())
+
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    if future is second:
+                        self.stats['hedge_wins'] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+_HEDGE: Optional[HedgePolicy] = None
+_HEDGE_LOCK = threading.Lock()
+
+
+def hedge_policy() -> HedgePolicy:
+    """Process-wide hedging policy (shared latency history and hedge cap)"""
+    global _HEDGE
+    if _HEDGE is None:
+        with _HEDGE_LOCK:
+            if _HEDGE is None:
+                from app.core.config import settings
+                _HEDGE = HedgePolicy(settings.gemini_hedge_percentile, settings.gemini_hedge_max_inflight)
+    return _HEDGE
+
 
 class ReceiptExtractionResult:
     """Standardized result from receipt extraction"""
@@ -100,76 +245,193 @@ If any line looks like a product, include it as an item name even if qty/unit ar
 If the receipt is readable but details are partial, still return items with null qty/unit.
 If nothing is legible, return items: [] and set is_blurry = true."""
 
-    def __init__(self, api_key: str, model_name: str | None = None, fallback_model_name: str | None = None):
+    MULTI_IMAGE_NOTE = """MULTIPLE IMAGES
+The images are consecutive parts of ONE receipt, in order from top to bottom.
+Return a single JSON object for the whole receipt. Parts may overlap: list each
+purchased line once. Take the store from the header and the total from the end."""
+
+    # Escalate below this confidence, or when line totals miss the total by
+    # more than this share (and this many pesos: rounding, bag fees)
+    MIN_CONFIDENCE = 0.6
+    RECONCILE_TOLERANCE = 0.05
+    RECONCILE_MIN_CLP = 100
+
+    API_BASE = "https://generativelanguage.googleapis.com"
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str | None = None,
+        fallback_model_name: str | None = None,
+        hedge: bool = False,
+        hedge_model: str | None = None,
+        hedge_policy: HedgePolicy | None = None,
+        base_url: str | None = None
+    ):
         if not api_key:
             raise ValueError("GEMINI_API_KEY is required")
         self.api_key = api_key
         self.model_name = model_name or "gemini-1.5-flash"
-        self.fallback_model_name = fallback_model_name or "gemini-1.5-flash"
+        self.fallback_model_name = fallback_model_name or self.model_name
+        # Optional hedging: a second request (hedge_model or the same one)
+        # when a call runs past the usual latency
+        self.hedge = hedge
+        self.hedge_model = hedge_model
+        self._hedge_policy = hedge_policy
+        # Another host speaking the same REST contract (scripts/stub_gemini.py)
+        self.base_url = (base_url or self.API_BASE).rstrip("/")
         logger.info(f"GeminiVisionExtractor initialized with raw REST client for model: {self.model_name}")
     
     def extract(self, image_url: str) -> ReceiptExtractionResult:
-        try:
-            logger.info(f"Starting extraction for image: {image_url}")
-            
-            # Download image
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            image_bytes = response.content
-            mime_type = response.headers.get("Content-Type", "image/jpeg").split(";")[0].strip()
-            if not mime_type.startswith("image/"):
-                mime_type = "image/jpeg"
-                
-            import base64
-            encoded_image = base64.b64encode(image_bytes).decode('utf-8')
-            
-            # Use raw REST API v1beta
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_name}:generateContent?key={self.api_key}"
-            
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {"text": self.EXTRACTION_PROMPT},
-                            {"inline_data": {"mime_type": mime_type, "data": encoded_image}}
-                        ]
-                    }
-                ]
-            }
-            
-            headers = {"Content-Type": "application/json"}
-            api_res = requests.post(url, json=payload, headers=headers, timeout=60)
-            
-            if api_res.status_code != 200:
-                logger.error(f"Gemini API Error: {api_res.text}")
-                return ReceiptExtractionResult(success=False, error=f"Gemini API returned {api_res.status_code}")
-                
-            res_json = api_res.json()
-            response_text = ""
-            if "candidates" in res_json and len(res_json["candidates"]) > 0:
-                response_text = res_json["candidates"][0].get("content", {}).get("parts", [{}])[0].get("text", "")
-            
-            # Parse JSON
-            try:
-                data = json.loads(response_text)
-            except json.JSONDecodeError:
-                json_text = self._extract_json(response_text)
-                data = json.loads(json_text)
-            
-            self._validate_schema(data)
+        return self.extract_many([image_url])
 
-            # Map legacy info
-            store_info = data.get('store', {})
-            data.setdefault('store_name', store_info.get('name'))
-            data.setdefault('confidence', data.get('confidence_overall'))
-            
-            return ReceiptExtractionResult(success=True, data=data)
+    def extract_many(self, image_urls: List[str]) -> ReceiptExtractionResult:
+        """
+        One receipt photographed in one or more parts (a Telegram album):
+        every image goes in the same request, so a long receipt costs a
+        single LLM call and comes back as a single result.
+
+        Tiered: the cheap model answers first, and the receipt is escalated
+        (stronger model, then the best-effort prompt) only when the answer
+        doesn't pass review. The best answer seen is returned; how it was
+        reached is in data['extraction'].
+        """
+        try:
+            logger.info(f"Starting extraction for {len(image_urls)} image(s): {image_urls[0]}")
             
+            # Download images once, in order; every tier reuses them
+            image_parts = [self._image_part(image_url) for image_url in image_urls]
         except Exception as e:
             error_msg = f"Extraction failed: {str(e)}"
             logger.error(error_msg)
             return ReceiptExtractionResult(success=False, error=error_msg)
+
+        prompt = self.EXTRACTION_PROMPT
+        if len(image_parts) > 1:
+            prompt = f"{prompt}\n{self.MULTI_IMAGE_NOTE}"
+
+        best, best_key, last_error = None, None, None
+        trail = []
+        for n, (tier, model_name, tier_prompt) in enumerate(self._tiers(prompt)):
+            started = time.perf_counter()
+            try:
+                data = self._request(model_name, tier_prompt, image_parts)
+                reasons = self.review(data)
+            except Exception as e:
+                data, reasons, last_error = None, ['invalid'], str(e)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            _record_tier(tier, elapsed_ms, reasons)
+            trail.append({'tier': tier, 'model': model_name, 'ms': round(elapsed_ms), 'reasons': reasons})
+
+            if data is not None:
+                key = (not reasons, -len(reasons), data.get('confidence_overall') or 0, n)
+                if best_key is None or key > best_key:
+                    best, best_key = data, key
+            if not reasons:
+                break
+            logger.info(f"Escalating receipt extraction after {tier} ({model_name}): {', '.join(reasons)}")
+
+        _record_receipt(len(trail) > 1)
+        if best is None:
+            error_msg = f"Extraction failed: {last_error}"
+            logger.error(error_msg)
+            return ReceiptExtractionResult(success=False, error=error_msg)
+
+        # Map legacy info
+        store_info = best.get('store', {})
+        best.setdefault('store_name', store_info.get('name'))
+        best.setdefault('confidence', best.get('confidence_overall'))
+        best['extraction'] = {
+            'tier': trail[best_key[3]]['tier'],
+            'model': trail[best_key[3]]['model'],
+            'escalated': len(trail) > 1,
+            'attempts': trail
+        }
+        return ReceiptExtractionResult(success=True, data=best)
+
+    def _tiers(self, prompt: str) -> List[tuple]:
+        """(tier, model, prompt) in escalation order"""
+        tiers = [('primary', self.model_name, prompt)]
+        if self.fallback_model_name != self.model_name:
+            tiers.append(('strong', self.fallback_model_name, prompt))
+        tiers.append(('best_effort', self.fallback_model_name, f"{prompt}\n{self.EXTRACTION_PROMPT_FALLBACK}"))
+        return tiers
+
+    def _request(self, model_name: str, prompt: str, image_parts: List[dict]) -> dict:
+        """_call, hedged when enabled"""
+        if not self.hedge:
+            return self._call(model_name, prompt, image_parts)
+        hedge_model = self.hedge_model or model_name
+        policy = self._hedge_policy or hedge_policy()
+        return policy.run(
+            model_name, lambda: self._call(model_name, prompt, image_parts),
+            hedge_model, lambda: self._call(hedge_model, prompt, image_parts)
+        )
+
+    def _call(self, model_name: str, prompt: str, image_parts: List[dict]) -> dict:
+        """One Gemini call; the parsed and schema-checked JSON, or raises"""
+        # Use raw REST API v1beta
+        url = f"{self.base_url}/v1beta/models/{model_name}:generateContent?key={self.api_key}"
+        
+        payload = {
+            "contents": [
+                {
+                    "parts": [{"text": prompt}] + image_parts
+                }
+            ]
+        }
+        
+        headers = {"Content-Type": "application/json"}
+        api_res = requests.post(url, json=payload, headers=headers, timeout=60)
+        
+        if api_res.status_code != 200:
+            logger.error(f"Gemini API Error: {api_res.text}")
+            raise ValueError(f"Gemini API returned {api_res.status_code}")
+            
+        res_json = api_res.json()
+        response_text = ""
+        if "candidates" in res_json and len(res_json["candidates"]) > 0:
+            response_text = res_json["candidates"][0].get("content", {}).get("parts", [{}])[0].get("text", "")
+        
+        # Parse JSON
+        try:
+            data = json.loads(response_text)
+        except json.JSONDecodeError:
+            json_text = self._extract_json(response_text)
+            data = json.loads(json_text)
+        
+        self._validate_schema(data)
+        return data
+
+    def review(self, data: dict) -> List[str]:
+        """Why an answer should be escalated; empty when it is good enough"""
+        reasons = []
+        if (data.get('confidence_overall') or 0) < self.MIN_CONFIDENCE:
+            reasons.append('low_confidence')
+        if data.get('is_blurry'):
+            reasons.append('blurry')
+        if not self._reconciles(data):
+            reasons.append('unreconciled')
+        return reasons
+
+    def _reconciles(self, data: dict) -> bool:
+        """Item line totals add up to the total (within tolerance), when both are there"""
+        total = data.get('total')
+        lines = [it.get('line_total') for it in data.get('items') or [] if isinstance(it, dict)]
+        lines = [v for v in lines if isinstance(v, (int, float))]
+        if not isinstance(total, (int, float)) or total <= 0 or not lines:
+            return True
+        return abs(sum(lines) - total) <= max(total * self.RECONCILE_TOLERANCE, self.RECONCILE_MIN_CLP)
     
+    def _image_part(self, image_url: str) -> dict:
+        response = requests.get(image_url, timeout=30)
+        response.raise_for_status()
+        mime_type = response.headers.get("Content-Type", "image/jpeg").split(";")[0].strip()
+        if not mime_type.startswith("image/"):
+            mime_type = "image/jpeg"
+        encoded_image = base64.b64encode(response.content).decode('utf-8')
+        return {"inline_data": {"mime_type": mime_type, "data": encoded_image}}
+
     def _extract_json(self, text: str) -> str:
         if "```json" in text:
             return text.split("```json")[1].split("```")[0].strip()
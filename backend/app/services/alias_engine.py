@@ -0,0 +1,141 @@
+from app.services.name_normalizer import normalize_key
+from collections import deque
+from pathlib import Path
+import threading
+import json
+import logging
+from typing import Optional, Dict, Any, List, Tuple, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+ALIASES_PATH = Path(__file__).resolve().parents[1] / "data" / "receipt_aliases.json"
+
+_ENGINE: Optional["AliasEngine"] = None
+_LOCK = threading.Lock()
+
+
+class AliasEngine:
+    """
+    Aho-Corasick automaton over every alias pattern
+
+    One pass over a normalized line finds all patterns it contains; the
+    entry listed first in the table wins (aliases before fallbacks), the
+    same result as checking entries in order but without rescanning the
+    line once per pattern.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]], source_path: str = "", source_mtime: float = 0.0):
+        self.entries = entries
+        self.source_path = source_path
+        self.source_mtime = source_mtime
+        # goto[state] = {char: state}; out[state] = best (lowest) entry rank ending here
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Optional[int]] = [None]
+
+        for rank, entry in enumerate(entries):
+            for pattern in entry.get('patterns') or []:
+                self._insert(normalize_key(pattern), rank)
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _insert(self, pattern: str, rank: int) -> None:
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+            state = nxt
+        self._out[state] = rank if self._out[state] is None else min(self._out[state], rank)
+
+    def _link(self) -> None:
+        # Breadth-first failure links; each state's output also covers the
+        # patterns that end at its failure state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                inherited = self._out[self._fail[nxt]]
+                if inherited is not None and (self._out[nxt] is None or inherited < self._out[nxt]):
+                    self._out[nxt] = inherited
+
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """First table entry with a pattern contained in text, or None"""
+        best = None
+        state = 0
+        for ch in normalize_key(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            rank = self._out[state]
+            if rank is not None and (best is None or rank < best):
+                best = rank
+                if best == 0:
+                    break
+        return self.entries[best] if best is not None else None
+
+    def suggest(self, text: str) -> Optional[Tuple[str, str]]:
+        """(clean name, brand) for an OCR name, or None"""
+        entry = self.match(text)
+        return (entry['name'], entry.get('brand') or '') if entry else None
+
+    def stream(self, names: Iterable[str]) -> Iterator[Tuple[str, str, str]]:
+        """(raw, clean, brand) per name; clean/brand empty when nothing matched"""
+        for raw in names:
+            clean, brand = self.suggest(raw) or ('', '')
+            yield raw, clean, brand
+
+
+def load_entries(path: Path) -> List[Dict[str, Any]]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return list(data.get('aliases') or []) + list(data.get('fallbacks') or [])
+
+
+def get_engine(path: Optional[Path] = None) -> AliasEngine:
+    """Compiled engine for the alias table, recompiled when the file changes"""
+    global _ENGINE
+    path = path or ALIASES_PATH
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return AliasEngine([])
+
+    source = str(path)
+    engine = _ENGINE
+    if engine is not None and (engine.source_path, engine.source_mtime) == (source, mtime):
+        return engine
+    with _LOCK:
+        if _ENGINE is None or (_ENGINE.source_path, _ENGINE.source_mtime) != (source, mtime):
+            _ENGINE = AliasEngine(load_entries(path), source, mtime)
+            logger.info(f"Alias engine compiled: {len(_ENGINE)} entries")
+        return _ENGINE
+
+
+def apply(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    name_clean/name_brand for a receipt item from the alias table, unless
+    the user or extractor already gave a clean name. Returns the fields to set.
+    """
+    if item.get('name_clean'):
+        return {}
+    suggestion = get_engine().suggest(item.get('name_raw') or '')
+    if not suggestion:
+        return {}
+    clean, brand = suggestion
+    updates = {'name_clean': clean}
+    if brand and not item.get('name_brand'):
+        updates['name_brand'] = brand
+    return updates
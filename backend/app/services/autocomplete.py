@@ -0,0 +1,246 @@
+from google.cloud.firestore import Client
+from supabase import Client as SupabaseClient
+from app.services.product_search import normalize_term
+from app.services import price_matrix
+from bisect import bisect_left, insort
+from datetime import datetime
+from heapq import nlargest
+import threading
+import logging
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+logger = logging.getLogger(__name__)
+
+# Kinds of suggestions
+PRODUCT = 'product'
+STORE = 'store'
+PATTERN = 'pattern'
+ITEM = 'item'           # free-text shopping list names
+
+# Rebuilt at most every 10 minutes; writes through this process are applied
+# in between (see record)
+_INDEX_TTL_SECONDS = 600
+
+# (source, household_id) -> index; the REST API (Supabase ids) and the
+# Telegram/receipt flows (Firestore ids) keep separate indexes
+_INDEXES: Dict[Tuple[str, str], "AutocompleteIndex"] = {}
+# Guards the two dicts; loads run under the (source, household) build lock
+_LOCK = threading.Lock()
+_BUILD_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+
+_CORE_FIELDS = ('kind', 'id', 'label', 'weight', 'aliases')
+
+
+class AutocompleteIndex:
+    """
+    Frequency-weighted prefix index
+
+    Every entry is indexed under each token suffix of its label and aliases
+    ("arroz grado 2" under "arroz grado 2", "grado 2" and "2"), kept in a
+    sorted array. A query is a bisect to the prefix range plus a top-k by
+    weight over that range. Thread-safe: writes (record) and suggestions
+    share the index's lock, and suggestions are copies.
+    """
+
+    def __init__(self):
+        self.entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._terms: List[Tuple[str, str, str]] = []   # sorted (term, kind, id)
+        self._lock = threading.RLock()
+        self.built_at = datetime.utcnow()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(
+        self,
+        kind: str,
+        entry_id: str,
+        label: str,
+        weight: float = 1,
+        aliases: Optional[List[str]] = None,
+        data: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Insert or replace an entry"""
+        key = (kind, entry_id)
+        with self._lock:
+            if key in self.entries:
+                self.remove(kind, entry_id)
+
+            entry = {'kind': kind, 'id': entry_id, 'label': label, 'weight': weight,
+                     'aliases': list(aliases or []), **(data or {})}
+            self.entries[key] = entry
+            for term in self._terms_for(entry):
+                insort(self._terms, (term, kind, entry_id))
+
+    def remove(self, kind: str, entry_id: str) -> None:
+        with self._lock:
+            if self.entries.pop((kind, entry_id), None) is None:
+                return
+            self._terms = [t for t in self._terms if (t[1], t[2]) != (kind, entry_id)]
+
+    def bump(self, kind: str, entry_id: str, label: Optional[str] = None, delta: float = 1, **data) -> None:
+        """Increase an entry's weight, creating it if needed"""
+        with self._lock:
+            entry = self.entries.get((kind, entry_id))
+            if entry is None:
+                if label:
+                    self.add(kind, entry_id, label, weight=delta, data=data)
+                return
+            if label and label != entry['label']:
+                extra = {k: v for k, v in entry.items() if k not in _CORE_FIELDS}
+                self.add(kind, entry_id, label, weight=entry['weight'], aliases=entry['aliases'], data=extra)
+                entry = self.entries[(kind, entry_id)]
+            entry['weight'] += delta
+            entry.update(data)
+
+    def suggest(self, prefix: str, limit: int = 10, kinds: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Top `limit` entries with a term starting with prefix, heaviest first"""
+        q = normalize_term(prefix)
+        with self._lock:
+            if not q:
+                candidates = self.entries.keys()
+            else:
+                candidates = set()
+                pos = bisect_left(self._terms, (q, '', ''))
+                while pos < len(self._terms) and self._terms[pos][0].startswith(q):
+                    candidates.add((self._terms[pos][1], self._terms[pos][2]))
+                    pos += 1
+
+            if kinds:
+                candidates = [key for key in candidates if key[0] in kinds]
+            top = nlargest(limit, candidates, key=lambda key: (self.entries[key]['weight'], key))
+            return [dict(self.entries[key]) for key in top]
+
+    @staticmethod
+    def _terms_for(entry: Dict[str, Any]) -> set:
+        terms = set()
+        for name in [entry['label'], *entry['aliases']]:
+            tokens = normalize_term(name).split()
+            terms.update(" ".join(tokens[i:]) for i in range(len(tokens)))
+        return terms
+
+
+def supabase_loader(supabase: SupabaseClient) -> Callable[[str], AutocompleteIndex]:
+    """Products, stores and past shopping list names, weighted by purchases"""
+    def load(household_id: str) -> AutocompleteIndex:
+        matrix = price_matrix.get_matrix(supabase, household_id)
+        store_names = {s['id']: s.get('name') for s in matrix['stores']}
+        product_counts, store_counts, latest = {}, {}, {}
+        for p in matrix['products']:
+            for store_id, cell in p['prices'].items():
+                product_counts[p['product_id']] = product_counts.get(p['product_id'], 0) + cell['count']
+                store_counts[store_id] = store_counts.get(store_id, 0) + cell['count']
+            store_id, cell = max(p['prices'].items(), key=lambda sc: str(sc[1].get('last_date') or ''))
+            latest[p['product_id']] = {
+                'unit_price': cell['latest'],
+                'unit': p.get('unit'),
+                'store_name': store_names.get(store_id),
+                'date': cell.get('last_date')
+            }
+
+        index = AutocompleteIndex()
+        products = supabase.table('products').select('*').eq('household_id', household_id).execute().data or []
+        for p in products:
+            label = p.get('name_norm') or p.get('name_raw')
+            if label:
+                index.add(PRODUCT, p['id'], label, weight=product_counts.get(p['id'], 0),
+                          aliases=[p['name_raw']] if p.get('name_raw') and p.get('name_norm') else None,
+                          data={'latest_price': latest.get(p['id'])})
+
+        stores = supabase.table('stores').select('*').eq('household_id', household_id).execute().data or []
+        for s in stores:
+            if s.get('name') and not s.get('archived'):
+                index.add(STORE, s['id'], s['name'], weight=store_counts.get(s['id'], 0),
+                          aliases=(s.get('aliases') or []) + (s.get('legal_names') or []))
+
+        items = supabase.table('shopping_list').select('name, product_id').eq('household_id', household_id).execute().data or []
+        for it in items:
+            if it.get('name') and not it.get('product_id'):
+                index.bump(ITEM, normalize_term(it['name']), it['name'])
+        return index
+    return load
+
+
+def firestore_loader(db: Client) -> Callable[[str], AutocompleteIndex]:
+    """Products, stores and expense patterns from Firestore"""
+    def load(household_id: str) -> AutocompleteIndex:
+        household_ref = db.collection('households').document(household_id)
+        counts = {}
+        for doc in household_ref.collection('product_price_stats').stream():
+            counts[doc.id] = (doc.to_dict().get('overall') or {}).get('count', 0)
+
+        index = AutocompleteIndex()
+        for doc in household_ref.collection('products').stream():
+            data = doc.to_dict()
+            label = data.get('name_norm') or data.get('name_raw')
+            if label:
+                index.add(PRODUCT, doc.id, label, weight=counts.get(doc.id, 0), aliases=data.get('aliases'))
+
+        patterns = {}
+        for doc in household_ref.collection('expense_patterns').stream():
+            data = doc.to_dict()
+            patterns[doc.id] = data
+            if data.get('store_name'):
+                index.add(PATTERN, doc.id, data['store_name'], weight=data.get('count', 1),
+                          data=_pattern_data(data))
+
+        for doc in household_ref.collection('stores').stream():
+            data = doc.to_dict()
+            if data.get('name') and not data.get('archived'):
+                index.add(STORE, doc.id, data['name'], weight=(patterns.get(doc.id) or {}).get('count', 0),
+                          aliases=(data.get('aliases') or []) + (data.get('legal_names') or []))
+        return index
+    return load
+
+
+def get_index(source: str, household_id: str, loader: Callable[[str], AutocompleteIndex]) -> AutocompleteIndex:
+    """
+    Cached index for (source, household), built with loader if missing or
+    stale. One load at a time per (source, household); other households
+    and record() don't wait for it. Blocking: call through
+    asyncio.to_thread from async code.
+    """
+    key = (source, household_id)
+    index = _INDEXES.get(key)
+    now = datetime.utcnow()
+    if index and (now - index.built_at).total_seconds() < _INDEX_TTL_SECONDS:
+        return index
+
+    with _LOCK:
+        build_lock = _BUILD_LOCKS.setdefault(key, threading.Lock())
+    with build_lock:
+        index = _INDEXES.get(key)
+        if index and (now - index.built_at).total_seconds() < _INDEX_TTL_SECONDS:
+            return index
+        index = loader(household_id)
+        with _LOCK:
+            _INDEXES[key] = index
+        logger.info(f"Autocomplete index built for {source}/{household_id}: {len(index)} entries")
+        return index
+
+
+def record(household_id: str, kind: str, entry_id: str, label: Optional[str], delta: float = 1, **data) -> None:
+    """Apply a write to every cached index of the household (no-op if none built)"""
+    with _LOCK:
+        indexes = [index for (source, hh_id), index in _INDEXES.items() if hh_id == household_id]
+    for index in indexes:
+        index.bump(kind, entry_id, label, delta, **data)
+
+
+def invalidate(household_id: Optional[str] = None) -> None:
+    """Drop cached indexes for one household (or all)"""
+    with _LOCK:
+        if household_id is None:
+            _INDEXES.clear()
+        else:
+            for key in [k for k in _INDEXES if k[1] == household_id]:
+                del _INDEXES[key]
+
+
+def _pattern_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'avg_amount': data.get('avg_amount'),
+        'last_amount': data.get('last_amount'),
+        'category_id': data.get('category_id'),
+        'count': data.get('count', 1)
+    }
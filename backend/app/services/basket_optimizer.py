@@ -0,0 +1,157 @@
+from supabase import Client as SupabaseClient
+from app.services import price_matrix
+from app.services.shopping_estimator import convert_qty
+import numpy as np
+import logging
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# Dense product × store arrays built from the cached price matrix, reused
+# until the matrix itself is rebuilt
+_ARRAYS: Dict[str, Dict[str, Any]] = {}
+
+
+class PriceArrays:
+    """Latest unit prices as a (products × stores) float array, NaN = never bought there; units per product row"""
+
+    def __init__(self, matrix: Dict[str, Any]):
+        self.store_ids: List[str] = [s['id'] for s in matrix['stores']]
+        self.store_names: Dict[str, Optional[str]] = {s['id']: s.get('name') for s in matrix['stores']}
+        self.product_index: Dict[str, int] = {}
+        self.units: List[Optional[str]] = [p.get('unit') for p in matrix['products']]
+        self.prices = np.full((len(matrix['products']), len(self.store_ids)), np.nan)
+
+        store_col = {sid: j for j, sid in enumerate(self.store_ids)}
+        for i, product in enumerate(matrix['products']):
+            self.product_index[product['product_id']] = i
+            for store_id, cell in product['prices'].items():
+                j = store_col.get(store_id)
+                if j is not None:
+                    self.prices[i, j] = cell['latest']
+
+
+def optimize(items: List[Dict[str, Any]], arrays: PriceArrays) -> Dict[str, Any]:
+    """
+    Cheapest single store, cheapest two-store split and per-item savings
+
+    Items are shopping_list rows; quantity (default 1) is converted to the
+    product's price unit, and an item whose unit can't be (grams against a
+    price per unit) is left unpriced. Stores are ranked by how many items they carry first
+    and by total second, so a store that is cheap only because it lacks half
+    the list never wins.
+    """
+    priced, unpriced, quantities = [], [], []
+    for it in items:
+        row = arrays.product_index.get(it.get('product_id'))
+        if row is None or np.isnan(arrays.prices[row]).all():
+            unpriced.append(it.get('name'))
+            continue
+        unit = arrays.units[row]
+        qty = convert_qty(float(it.get('quantity') or it.get('qty') or 1), it.get('unit') or unit, unit)
+        if qty is None:
+            unpriced.append(it.get('name'))
+            continue
+        priced.append(it)
+        quantities.append(qty)
+    result = {
+        'items': len(items),
+        'priced_items': len(priced),
+        'unpriced': unpriced,
+        'best_store': None,
+        'stores': [],
+        'best_pair': None,
+        'item_savings': []
+    }
+    if not priced or not arrays.store_ids:
+        return result
+
+    rows = np.array([arrays.product_index[it['product_id']] for it in priced])
+    qty = np.array(quantities)
+    costs = arrays.prices[rows] * qty[:, None]  # items × stores
+    available = ~np.isnan(costs)
+
+    # Single store
+    coverage = available.sum(axis=0)
+    totals = np.where(available, costs, 0.0).sum(axis=0)
+    order = np.lexsort((totals, -coverage))
+    result['stores'] = [
+        {
+            'store_id': arrays.store_ids[j],
+            'store_name': arrays.store_names.get(arrays.store_ids[j]),
+            'total': round(float(totals[j])),
+            'covered': int(coverage[j]),
+            'missing': [priced[i].get('name') for i in np.flatnonzero(~available[:, j])]
+        }
+        for j in order if coverage[j]
+    ]
+    best = int(order[0])
+    result['best_store'] = result['stores'][0]
+
+    # Two-store split: each item bought wherever it's cheaper of the pair
+    n_stores = len(arrays.store_ids)
+    if n_stores >= 2:
+        filled = np.where(available, costs, np.inf)
+        pair_costs = np.minimum(filled[:, :, None], filled[:, None, :])  # items × s × s
+        pair_available = np.isfinite(pair_costs)
+        pair_coverage = pair_available.sum(axis=0)
+        pair_totals = np.where(pair_available, pair_costs, 0.0).sum(axis=0)
+        a_idx, b_idx = np.triu_indices(n_stores, k=1)
+        pair_order = np.lexsort((pair_totals[a_idx, b_idx], -pair_coverage[a_idx, b_idx]))
+        a, b = int(a_idx[pair_order[0]]), int(b_idx[pair_order[0]])
+        buy_at_a = filled[:, a] <= filled[:, b]
+        result['best_pair'] = {
+            'store_ids': [arrays.store_ids[a], arrays.store_ids[b]],
+            'store_names': [arrays.store_names.get(arrays.store_ids[a]), arrays.store_names.get(arrays.store_ids[b])],
+            'total': round(float(pair_totals[a, b])),
+            'covered': int(pair_coverage[a, b]),
+            'assignment': {
+                arrays.store_ids[a]: [priced[i].get('name') for i in np.flatnonzero(buy_at_a & np.isfinite(filled[:, a]))],
+                arrays.store_ids[b]: [priced[i].get('name') for i in np.flatnonzero(~buy_at_a & np.isfinite(filled[:, b]))]
+            },
+            'savings_vs_best_store': round(float(totals[best] - pair_totals[a, b]))
+            if pair_coverage[a, b] == coverage[best] else None
+        }
+
+    # Per item: cheapest store vs the best single store and vs the priciest
+    filled_min = np.where(available, costs, np.inf)
+    filled_max = np.where(available, costs, -np.inf)
+    cheapest = filled_min.argmin(axis=1)
+    priciest = filled_max.max(axis=1)
+    for i, item in enumerate(priced):
+        j = int(cheapest[i])
+        at_best = costs[i, best]
+        result['item_savings'].append({
+            'product_id': item['product_id'],
+            'name': item.get('name'),
+            'quantity': float(qty[i]),
+            'cheapest_store_id': arrays.store_ids[j],
+            'cheapest_store_name': arrays.store_names.get(arrays.store_ids[j]),
+            'cheapest_cost': round(float(costs[i, j])),
+            'cost_at_best_store': None if np.isnan(at_best) else round(float(at_best)),
+            'savings_vs_best_store': None if np.isnan(at_best) else round(float(at_best - costs[i, j])),
+            'savings_vs_priciest': round(float(priciest[i] - costs[i, j]))
+        })
+    result['item_savings'].sort(key=lambda s: s['savings_vs_priciest'], reverse=True)
+    return result
+
+
+def get_arrays(supabase: SupabaseClient, household_id: str) -> PriceArrays:
+    """Price arrays for a household, rebuilt only when the matrix changes"""
+    matrix = price_matrix.get_matrix(supabase, household_id)
+    cached = _ARRAYS.get(household_id)
+    if cached and cached['matrix'] is matrix:
+        return cached['arrays']
+    arrays = PriceArrays(matrix)
+    _ARRAYS[household_id] = {'matrix': matrix, 'arrays': arrays}
+    return arrays
+
+
+def optimize_month(supabase: SupabaseClient, household_id: str, month: str) -> Dict[str, Any]:
+    """Optimize a month's unchecked shopping list (blocking)"""
+    resp = supabase.table('shopping_list').select('*')\
+        .eq('household_id', household_id).eq('month', month).execute()
+    items = [it for it in resp.data or [] if not it.get('is_checked')]
+    result = optimize(items, get_arrays(supabase, household_id))
+    result['month'] = month
+    return result
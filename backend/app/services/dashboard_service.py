@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta, date, timezone
 from typing import List, Dict, Any
 from supabase import Client as SupabaseClient
+from app.services import recipe_costing
 from app.domain.models import Transaction, RecurringItem, ProductPrice, HouseholdSignals, Status
 from app.domain.logic import (
     compute_spending_zone,
@@ -57,8 +58,9 @@ class DashboardService:
                 next_month_start = target_date.replace(month=target_date.month + 1, day=1).strftime("%Y-%m-%d")
             
             # Meals Total (Planificados en el mes M)
-            meal_resp = self.supabase.table("meal_plans").select("recipe_cost").eq("household_id", household_id).gte("date", start_of_month_str).execute()
-            meals_total = sum((m.get("recipe_cost") or 0) for m in meal_resp.data)
+            meal_resp = self.supabase.table("meal_plans").select("recipe_id, recipe_name, recipe_cost").eq("household_id", household_id).gte("date", start_of_month_str).execute()
+            meals = recipe_costing.apply_live_costs(self.supabase, household_id, meal_resp.data or [])
+            meals_total = sum((m.get("recipe_cost") or 0) for m in meals)
             
             # Shopping List Extras Total (Extras en el mes M)
             shop_resp = self.supabase.table("shopping_list").select("estimated_cost").eq("household_id", household_id).eq("month", month_key).execute()
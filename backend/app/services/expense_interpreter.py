@@ -0,0 +1,420 @@
+from supabase import Client as SupabaseClient
+from app.services.name_normalizer import normalize_term
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+import threading
+import logging
+import math
+import re
+import time
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Models are rebuilt at most every 10 minutes; expenses saved through this
+# process are learned in between (see record)
+_MODEL_TTL_SECONDS = 600
+_MODELS: Dict[str, "ExpenseModel"] = {}
+_LOCK = threading.Lock()
+
+# A local answer is used only when the amount parsed and the classifier
+# is this sure, with this much evidence behind it
+MIN_CONFIDENCE = 0.8
+MIN_SUPPORT = 2
+
+# "45 lucas", "45 mil", "$45.000", "12.990", "1,5 lucas", "2 palos"
+_AMOUNT = re.compile(
+    r'(?P<cur>\$)?\s*(?P<num>\d{1,3}(?:[.\s]\d{3})+|\d+(?:[.,]\d+)?)\s*'
+    r'(?P<unit>lucas|luca|mil|k|palos|palo|millones|millon|millón)?\b',
+    re.IGNORECASE
+)
+_MULTIPLIER = {'luca': 1000, 'lucas': 1000, 'mil': 1000, 'k': 1000,
+               'palo': 1000000, 'palos': 1000000, 'millon': 1000000, 'millón': 1000000, 'millones': 1000000}
+
+# Words that say nothing about the category
+_STOPWORDS = frozenset(
+    "en el la los las de del al un una unos unas y o por para con pesos peso clp "
+    "gaste gasto gastamos compre compramos pague pagamos hoy ayer".split()
+)
+
+
+def parse_amount(text: str) -> Tuple[Optional[int], Optional[Tuple[int, int]]]:
+    """
+    CLP amount in a free-text expense and its span, or (None, None)
+
+    An amount with a unit ("lucas", "mil", "palos") or a "$" wins over a
+    bare number; among bare numbers the largest is taken ("2 panes 3000").
+    """
+    best, best_rank = None, None
+    for m in _AMOUNT.finditer(text or ''):
+        raw, unit = m.group('num'), (m.group('unit') or '').lower()
+        if re.fullmatch(r'\d{1,3}(?:[.\s]\d{3})+', raw):
+            value = float(re.sub(r'[.\s]', '', raw))
+        else:
+            value = float(raw.replace(',', '.'))
+        value *= _MULTIPLIER.get(unit, 1)
+        rank = (bool(unit or m.group('cur')), value)
+        if value > 0 and (best_rank is None or rank > best_rank):
+            best, best_rank = (int(round(value)), m.span()), rank
+    return best if best else (None, None)
+
+
+def template(text: str, span: Optional[Tuple[int, int]] = None) -> str:
+    """Normalized text with the amount left out: '45 lucas en el Jumbo' -> 'en el jumbo'"""
+    if span:
+        text = text[:span[0]] + ' ' + text[span[1]:]
+    return normalize_term(text)
+
+
+# Firestore auto ids and UUIDs found in transactions.store_id
+_ID_LIKE = re.compile(r'[A-Za-z0-9]{20}|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27}')
+
+
+def tokens(text: str) -> List[str]:
+    return [t for t in text.split() if t not in _STOPWORDS and not t.isdigit()]
+
+
+class ExpenseModel:
+    """
+    Multinomial naive Bayes over the words of a household's categorized
+    expenses (transaction descriptions, store names from expense_patterns)
+
+    Also remembers, per text template, the description the expense was
+    saved with, so a repeated phrase gets the same clean name back.
+    """
+
+    def __init__(self):
+        self.token_counts: Dict[str, Counter] = defaultdict(Counter)   # category -> token -> n
+        self.totals: Counter = Counter()                                # category -> tokens seen
+        self.docs: Counter = Counter()                                  # category -> examples
+        self.buckets: Dict[str, Counter] = defaultdict(Counter)
+        self.labels: Dict[str, str] = {}
+        self.vocab: set = set()
+        self.built_at = datetime.utcnow()
+
+    def __len__(self) -> int:
+        return sum(self.docs.values())
+
+    def learn(self, text: str, category_id: str, bucket: Optional[str] = None,
+              label: Optional[str] = None, weight: int = 1) -> None:
+        if not category_id:
+            return
+        _, span = parse_amount(text)
+        key = template(text, span)
+        words = tokens(key)
+        if not words:
+            return
+        for w in words:
+            self.token_counts[category_id][w] += weight
+        self.totals[category_id] += len(words) * weight
+        self.docs[category_id] += weight
+        self.vocab.update(words)
+        if bucket:
+            self.buckets[category_id][bucket] += weight
+        if label:
+            self.labels[key] = label
+
+    def classify(self, text: str, allowed: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """Best category among allowed with its posterior and word evidence, or None"""
+        words = [w for w in tokens(text) if w in self.vocab]
+        classes = [c for c in (allowed if allowed is not None else self.docs) if self.docs.get(c)]
+        if not words or not classes:
+            return None
+
+        n_docs = sum(self.docs[c] for c in classes)
+        vocab_size = len(self.vocab)
+        scores = {}
+        for c in classes:
+            counts, total = self.token_counts[c], self.totals[c]
+            score = math.log(self.docs[c] / n_docs)
+            for w in words:
+                score += math.log((counts[w] + 1) / (total + vocab_size))
+            scores[c] = score
+
+        top = max(scores, key=scores.get)
+        peak = scores[top]
+        norm = sum(math.exp(s - peak) for s in scores.values())
+        bucket = self.buckets[top].most_common(1)
+        return {
+            'category_id': top,
+            'confidence': 1.0 / norm,
+            'support': sum(self.token_counts[top][w] for w in words),
+            'bucket': bucket[0][0] if bucket else None
+        }
+
+
+class InterpretCache:
+    """LRU of LLM interpretations keyed by (text template, category set)"""
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, frozenset], Dict[str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple[str, frozenset]) -> Optional[Dict[str, Any]]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple[str, frozenset], value: Dict[str, Any]) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_CACHE = InterpretCache()
+_STATS = {tier: {'count': 0, 'ms': 0.0} for tier in ('local', 'cache', 'llm', 'failed')}
+
+
+def build_model(supabase: SupabaseClient, household_id: str, db=None, limit: int = 2000) -> ExpenseModel:
+    """Learn from the household's recent categorized transactions (and Firestore patterns when db is given)"""
+    model = ExpenseModel()
+    rows = supabase.table('transactions').select('description, category_id, bucket, store_id')\
+        .eq('household_id', household_id)\
+        .order('occurred_on', desc=True)\
+        .limit(limit)\
+        .execute().data or []
+    for row in rows:
+        if row.get('description') and row.get('category_id'):
+            label = row.get('store_id')
+            if label and _ID_LIKE.fullmatch(label):
+                label = None
+            model.learn(row['description'], row['category_id'], row.get('bucket'), label)
+
+    if db is not None:
+        for doc in db.collection('households').document(household_id).collection('expense_patterns').stream():
+            data = doc.to_dict()
+            if data.get('store_name') and data.get('category_id'):
+                model.learn(data['store_name'], data['category_id'], label=data['store_name'],
+                            weight=min(int(data.get('count') or 1), 5))
+    return model
+
+
+def get_model(supabase: SupabaseClient, household_id: str, db=None) -> ExpenseModel:
+    """
+    Cached model for the household, rebuilt when older than the TTL.
+    Blocking: call through asyncio.to_thread from async code.
+    """
+    model = _MODELS.get(household_id)
+    now = datetime.utcnow()
+    if model and (now - model.built_at).total_seconds() < _MODEL_TTL_SECONDS:
+        return model
+    with _LOCK:
+        model = _MODELS.get(household_id)
+        if model and (now - model.built_at).total_seconds() < _MODEL_TTL_SECONDS:
+            return model
+        model = build_model(supabase, household_id, db)
+        _MODELS[household_id] = model
+        logger.info(f"Expense model built for {household_id}: {len(model)} examples, {len(model.vocab)} words")
+        return model
+
+
+def record(household_id: str, text: str, category_id: Optional[str], bucket: Optional[str] = None,
+           label: Optional[str] = None) -> None:
+    """Learn a saved expense in the cached model (no-op if none built)"""
+    with _LOCK:
+        model = _MODELS.get(household_id)
+        if model is not None and category_id:
+            model.learn(text, category_id, bucket, label)
+
+
+def invalidate(household_id: Optional[str] = None) -> None:
+    with _LOCK:
+        if household_id is None:
+            _MODELS.clear()
+            _CACHE.clear()
+        else:
+            _MODELS.pop(household_id, None)
+
+
+def stats() -> Dict[str, Any]:
+    """Answers per tier, share answered without the LLM and mean latency"""
+    total = sum(s['count'] for s in _STATS.values())
+    tiers = {
+        tier: {'count': s['count'], 'avg_ms': round(s['ms'] / s['count'], 2) if s['count'] else None}
+        for tier, s in _STATS.items()
+    }
+    local = _STATS['local']['count'] + _STATS['cache']['count']
+    return {
+        'total': total,
+        'hit_rate': round(local / total, 4) if total else None,
+        'tiers': tiers,
+        'cache_size': len(_CACHE)
+    }
+
+
+def _count(tier: str, started: float, share: int = 1) -> None:
+    """Record one answer; batch answers each take their share of the elapsed time"""
+    _STATS[tier]['count'] += 1
+    _STATS[tier]['ms'] += (time.perf_counter() - started) * 1000 / share
+
+
+def _clean_description(key: str, model: Optional[ExpenseModel]) -> str:
+    if model is not None and key in model.labels:
+        return model.labels[key]
+    return " ".join(tokens(key)).title() or "Gasto"
+
+
+def _quick_answer(
+    text: str,
+    allowed: List[str],
+    model: Optional[ExpenseModel]
+) -> Tuple[Optional[Dict[str, Any]], Tuple[str, frozenset], Optional[int]]:
+    """(local or cached answer or None, cache key, parsed amount)"""
+    amount, span = parse_amount(text)
+    key = template(text, span)
+
+    if amount and model is not None:
+        guess = model.classify(key, allowed)
+        if guess and guess['confidence'] >= MIN_CONFIDENCE and guess['support'] >= MIN_SUPPORT:
+            return {
+                'category_id': guess['category_id'],
+                'bucket': guess['bucket'],
+                'normalized_description': _clean_description(key, model),
+                'amount_hint': amount,
+                'advice': '',
+                'confidence': round(guess['confidence'], 3),
+                'source': 'local'
+            }, (key, frozenset(allowed)), amount
+
+    # The amount is only left out of the key when we parsed it ourselves
+    cache_key = (key if amount else normalize_term(text), frozenset(allowed))
+    cached = _CACHE.get(cache_key)
+    if cached is not None:
+        return dict(cached, amount_hint=amount or cached.get('amount_hint'), source='cache'), cache_key, amount
+    return None, cache_key, amount
+
+
+def _llm_answer(suggestion: Optional[Dict[str, Any]], cache_key: Tuple[str, frozenset],
+                amount: Optional[int]) -> Optional[Dict[str, Any]]:
+    if not suggestion:
+        return None
+    _CACHE.put(cache_key, dict(suggestion))
+    return dict(suggestion, amount_hint=amount or suggestion.get('amount_hint'), source='llm')
+
+
+async def interpret(
+    text: str,
+    categories: List[Dict[str, Any]],
+    llm: Callable[[str, List[Dict[str, Any]]], Awaitable[Optional[Dict[str, Any]]]],
+    model: Optional[ExpenseModel] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Same answer shape as AIAdvisorService.categorize_text, from the first
+    tier that is sure enough:
+
+    1. local: amount parsed by regex and the household model confident
+    2. cache: an LLM answer for the same text template and category set
+    3. llm: the LLM itself (the answer is cached)
+
+    'source' says which tier answered. None when the LLM failed.
+    """
+    started = time.perf_counter()
+    answer, cache_key, amount = _quick_answer(text, [c['id'] for c in categories], model)
+    if answer is not None:
+        _count(answer['source'], started)
+        return answer
+
+    answer = _llm_answer(await llm(text, categories), cache_key, amount)
+    _count('llm' if answer else 'failed', started)
+    return answer
+
+
+async def interpret_many(
+    texts: List[str],
+    categories: List[Dict[str, Any]],
+    batch_llm: Callable[[List[str], List[Dict[str, Any]]], Awaitable[List[Optional[Dict[str, Any]]]]],
+    model: Optional[ExpenseModel] = None
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    interpret for many texts: the local and cache tiers per text, then the
+    rest in one batched LLM pass (AIAdvisorService.categorize_batch).
+    Results follow texts.
+    """
+    started = time.perf_counter()
+    allowed = [c['id'] for c in categories]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    pending: Dict[int, Tuple[Tuple[str, frozenset], Optional[int]]] = {}
+    for i, text in enumerate(texts):
+        answer, cache_key, amount = _quick_answer(text or '', allowed, model)
+        if answer is not None:
+            results[i] = answer
+            _count(answer['source'], started, len(texts))
+        else:
+            pending[i] = (cache_key, amount)
+
+    if pending:
+        suggestions = await batch_llm([texts[i] for i in pending], categories)
+        for (i, (cache_key, amount)), suggestion in zip(pending.items(), suggestions):
+            results[i] = _llm_answer(suggestion, cache_key, amount)
+            _count('llm' if results[i] else 'failed', started, len(texts))
+    return results
+
+
+async def recategorize(
+    supabase: SupabaseClient,
+    household_id: str,
+    batch_llm: Callable[[List[str], List[Dict[str, Any]]], Awaitable[List[Optional[Dict[str, Any]]]]],
+    only_uncategorized: bool = True,
+    limit: int = 1000,
+    apply: bool = False
+) -> Dict[str, Any]:
+    """
+    Re-run interpretation over the household's latest transactions and
+    report (or, with apply, write) category/bucket changes. Rows getting the
+    same category and bucket are updated with one query.
+    """
+    query = supabase.table('transactions').select('id, description, category_id, bucket')\
+        .eq('household_id', household_id)
+    if only_uncategorized:
+        query = query.is_('category_id', 'null')
+    rows = query.order('occurred_on', desc=True).limit(limit).execute().data or []
+    rows = [r for r in rows if r.get('description')]
+
+    categories = supabase.table('categories').select('id, name').eq('household_id', household_id).execute().data or []
+    model = get_model(supabase, household_id) if rows else None
+    answers = await interpret_many([r['description'] for r in rows], categories, batch_llm, model)
+
+    changes, unresolved = [], 0
+    for row, answer in zip(rows, answers):
+        if not answer:
+            unresolved += 1
+            continue
+        if (answer['category_id'], answer.get('bucket')) != (row.get('category_id'), row.get('bucket')):
+            changes.append({
+                'id': row['id'],
+                'description': row['description'],
+                'category_id': answer['category_id'],
+                'bucket': answer.get('bucket'),
+                'previous_category_id': row.get('category_id'),
+                'source': answer['source']
+            })
+
+    updates = 0
+    if apply and changes:
+        groups: Dict[Tuple[str, Optional[str]], List[str]] = defaultdict(list)
+        for change in changes:
+            groups[(change['category_id'], change['bucket'])].append(change['id'])
+            record(household_id, change['description'], change['category_id'], change['bucket'])
+        for (category_id, bucket), ids in groups.items():
+            for i in range(0, len(ids), 200):
+                supabase.table('transactions').update({'category_id': category_id, 'bucket': bucket})\
+                    .in_('id', ids[i:i + 200])\
+                    .execute()
+                updates += 1
+
+    return {
+        'scanned': len(rows),
+        'changed': len(changes),
+        'unresolved': unresolved,
+        'applied': bool(apply),
+        'update_queries': updates,
+        'changes': changes
+    }
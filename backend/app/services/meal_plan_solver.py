@@ -0,0 +1,201 @@
+from supabase import Client as SupabaseClient
+from app.services import recipe_costing, recipe_index
+from app.services.product_search import normalize_term
+from datetime import date, timedelta
+import numpy as np
+import logging
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# Same default as the dashboard's food budget card
+DEFAULT_FOOD_BUDGET = 500000
+
+
+def month_days(month: str) -> List[str]:
+    """'2026-03' -> ['2026-03-01', ..., '2026-03-31']"""
+    first = date.fromisoformat(f"{month}-01")
+    days, d = [], first
+    while d.month == first.month:
+        days.append(d.isoformat())
+        d += timedelta(days=1)
+    return days
+
+
+def solve(
+    recipes: List[Dict[str, Any]],
+    costs: Dict[str, float],
+    days: List[str],
+    no_repeat_days: int = 7,
+    pinned: Optional[Dict[str, str]] = None,
+    min_per_type: Optional[Dict[str, int]] = None,
+    max_per_type: Optional[Dict[str, int]] = None,
+    pinned_recipes: Optional[List[Dict[str, Any]]] = None,
+    budget: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Cheapest lunch per day under the constraints (pure, no I/O)
+
+    Days are filled in order with the cheapest recipe that is allowed: not
+    served in the previous no_repeat_days days nor pinned within that
+    distance, and under its meal type's maximum. When the free days left
+    are just enough for the meal type minimums still owed, only those types
+    are allowed. If nothing is allowed the no-repeat rule is relaxed for
+    that day (least recently served wins) and the day is reported.
+    With a budget, a recipe is only taken if the month can still close
+    within it (pinned days at their cost, free days at the cheapest one);
+    the budget wins over the meal type minimums, which are then reported
+    as unmet. pinned_recipes names pinned recipes that aren't candidates
+    themselves.
+    """
+    pinned = pinned or {}
+    candidates = [r for r in recipes if costs.get(r['id'], 0) > 0]
+    by_id = {r['id']: r for r in (pinned_recipes or []) + recipes}
+    col = {r['id']: j for j, r in enumerate(candidates)}
+    cost = np.array([costs[r['id']] for r in candidates], dtype=float)
+    types = [normalize_term(r.get('meal_type')) for r in candidates]
+    type_names = sorted(set(types) | {normalize_term(t) for t in (min_per_type or {})} | {normalize_term(t) for t in (max_per_type or {})})
+    type_of = np.array([type_names.index(t) for t in types], dtype=int)
+    mins = np.zeros(len(type_names), dtype=int)
+    maxs = np.full(len(type_names), len(days), dtype=int)
+    for t, n in (min_per_type or {}).items():
+        mins[type_names.index(normalize_term(t))] = n
+    for t, n in (max_per_type or {}).items():
+        maxs[type_names.index(normalize_term(t))] = n
+
+    n_days = len(days)
+    day_pos = {d: i for i, d in enumerate(days)}
+    # Distances are in calendar days: `days` may skip dates
+    ordinals = np.array([date.fromisoformat(d[:10]).toordinal() for d in days], dtype=float)
+    # Recipes pinned later can't be used within no_repeat_days before their pin
+    pin_block = np.zeros((n_days, len(candidates)), dtype=bool)
+    for day, rid in pinned.items():
+        if day in day_pos and rid in col:
+            p = day_pos[day]
+            pin_block[:, col[rid]] |= np.abs(ordinals - ordinals[p]) <= no_repeat_days
+            pin_block[p, col[rid]] = False
+
+    last_used = np.full(len(candidates), -np.inf)
+    counts = np.zeros(len(type_names), dtype=int)
+    free_left = sum(1 for d in days if d not in pinned)
+    # Lower bound of what the remaining days will cost
+    pinned_left = sum(costs.get(rid, 0) for d, rid in pinned.items() if d in day_pos)
+    floor = cost.min() if len(candidates) else 0.0
+    spent = 0.0
+    plan, relaxed = [], []
+    for i, day in enumerate(days):
+        rid = pinned.get(day)
+        if rid is None and len(candidates):
+            free_left -= 1
+            allowed = (ordinals[i] - last_used > no_repeat_days) & ~pin_block[i] & (counts[type_of] < maxs[type_of])
+            owed = np.maximum(mins - counts, 0)
+            pool = allowed & (owed[type_of] > 0) if owed.sum() > free_left else allowed
+            if budget is not None:
+                affordable = spent + cost + free_left * floor + pinned_left <= budget
+                if (pool & affordable).any():
+                    pool &= affordable
+                elif (allowed & affordable).any():
+                    pool = allowed & affordable
+            if pool.any():
+                j = int(np.where(pool, cost, np.inf).argmin())
+            else:
+                relaxed.append(day)
+                # lexsort: last key is primary -> least recently served, then cheapest
+                j = int(np.lexsort((cost, last_used))[0])
+            rid = candidates[j]['id']
+        if rid is None:
+            continue
+        if day in pinned:
+            pinned_left -= costs.get(rid, 0)
+        spent += costs.get(rid, 0)
+
+        j = col.get(rid)
+        if j is not None:
+            last_used[j] = ordinals[i]
+            counts[type_of[j]] += 1
+        recipe = by_id.get(rid) or {}
+        plan.append({
+            'date': day,
+            'type': 'lunch',
+            'recipe_id': rid,
+            'recipe_name': recipe.get('name', ''),
+            'recipe_cost': int(round(costs.get(rid, 0))),
+            'pinned': day in pinned
+        })
+
+    return {
+        'meals': plan,
+        'total': sum(m['recipe_cost'] for m in plan),
+        'relaxed_days': relaxed,
+        'type_counts': {type_names[t]: int(counts[t]) for t in range(len(type_names)) if counts[t]},
+        'unmet_minimums': {type_names[t]: int(mins[t] - counts[t]) for t in range(len(type_names)) if counts[t] < mins[t]}
+    }
+
+
+def recipe_cost_vector(supabase: SupabaseClient, household_id: str) -> Dict[str, float]:
+    """Live recipe costs, falling back to the catalog's static cost"""
+    catalog = recipe_index.get_index(recipe_index.RECIPES_CSV)
+    costs = {r['id']: float(r.get('cost') or 0) for r in catalog.recipes}
+    try:
+        for rid, c in recipe_costing.get_costs(supabase, household_id).items():
+            if c['cost'] > 0:
+                costs[rid] = float(c['cost'])
+    except Exception as e:
+        logger.warning(f"Live recipe costs unavailable for {household_id}, using catalog costs: {e}")
+    return costs
+
+
+def propose_month(
+    supabase: SupabaseClient,
+    household_id: str,
+    month: str,
+    no_repeat_days: int = 7,
+    meal_types: Optional[List[str]] = None,
+    min_per_type: Optional[Dict[str, int]] = None,
+    max_per_type: Optional[Dict[str, int]] = None,
+    pinned: Optional[Dict[str, str]] = None,
+    keep_existing: bool = True,
+    budget: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    A month of lunches (blocking). Lunches already planned are pinned when
+    keep_existing; the budget defaults to households.settings.food_budget.
+    """
+    days = month_days(month)
+    catalog = recipe_index.get_index(recipe_index.RECIPES_CSV)
+    allowed_types = {normalize_term(t) for t in (meal_types or ['Almuerzo'])}
+    recipes = [r for r in catalog.recipes if normalize_term(r.get('meal_type')) in allowed_types]
+
+    all_pins = {}
+    if keep_existing:
+        kept = set()
+        existing = supabase.table('meal_plans').select('date, recipe_id, recipe_name')\
+            .eq('household_id', household_id)\
+            .eq('type', 'lunch')\
+            .gte('date', days[0])\
+            .lte('date', days[-1])\
+            .execute().data or []
+        for meal in existing:
+            rid = recipe_costing.resolve_recipe_id(meal.get('recipe_id'), meal.get('recipe_name'))
+            if rid:
+                all_pins[meal['date']] = rid
+            else:
+                kept.add(meal['date'])  # free-text lunch, not ours to replace
+        days = [d for d in days if d not in kept or d in (pinned or {})]
+    all_pins.update(pinned or {})
+    pinned_recipes = [catalog.get(rid) for rid in set(all_pins.values()) if catalog.get(rid)]
+
+    if budget is None:
+        resp = supabase.table('households').select('settings').eq('id', household_id).execute()
+        settings_data = (resp.data[0].get('settings') if resp.data else None) or {}
+        budget = float(settings_data.get('food_budget', DEFAULT_FOOD_BUDGET))
+
+    costs = recipe_cost_vector(supabase, household_id)
+    result = solve(recipes, costs, days, no_repeat_days, all_pins, min_per_type, max_per_type, pinned_recipes, budget)
+    result.update({
+        'month': month,
+        'budget': budget,
+        'within_budget': result['total'] <= budget,
+        'over_budget_by': max(result['total'] - budget, 0)
+    })
+    return result
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, Any, List, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class _Group:
+    __slots__ = ('leader', 'items', 'opened', 'last')
+
+    def __init__(self, leader: Hashable):
+        self.leader = leader
+        self.items: List[tuple] = []
+        self.opened = self.last = time.monotonic()
+
+
+class MediaGroupBuffer:
+    """
+    Collects the photos of a Telegram album (one update per photo, sharing
+    a media_group_id) so the album is handled once
+
+    The webhook add()s every album photo as it arrives; the first update of
+    a group is its leader. The leader's job calls collect(), which waits
+    until no photo has arrived for `window` seconds (at most `max_wait`
+    overall, or until `max_items`) and takes the whole group. Every other
+    update's collect() returns None. A photo arriving after its group was
+    taken opens a new group.
+    """
+
+    def __init__(self, window: float = 1.5, max_wait: float = 8.0, max_items: int = 10):
+        self.window = window
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self._groups: Dict[Hashable, _Group] = {}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def add(self, group_id: Hashable, update_id: Hashable, order: Any, item: Any) -> bool:
+        """Buffer an album item; True when update_id leads a new group"""
+        group = self._groups.get(group_id)
+        leader = group is None
+        if leader:
+            group = self._groups[group_id] = _Group(update_id)
+        group.items.append((order, item))
+        group.last = time.monotonic()
+        return leader
+
+    async def collect(self, group_id: Hashable, update_id: Hashable) -> Optional[List[Any]]:
+        """The group's items in `order` when update_id leads it, else None"""
+        group = self._groups.get(group_id)
+        if group is None or group.leader != update_id:
+            return None
+        while len(group.items) < self.max_items:
+            now = time.monotonic()
+            remaining = min(group.last + self.window, group.opened + self.max_wait) - now
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+        del self._groups[group_id]
+        items = [item for _, item in sorted(group.items, key=lambda pair: pair[0])]
+        logger.info(f"Media group {group_id}: {len(items)} item(s)")
+        return items
@@ -0,0 +1,83 @@
+from functools import lru_cache
+import unicodedata
+import re
+from typing import Callable, Iterable, List
+
+# Product names repeat endlessly across receipts, price rows and Notion
+# exports, so every normalizer is memoized
+_CACHE_SIZE = 65536
+
+# normalize_name pipeline, compiled once
+_CODE_PREFIX = re.compile(r'(?i)\b(?:COD|SKU|PLU|INT)\b.*?(?=\s|$)')   # "COD (123)", "SKU: 123", "PLU 1234"
+_PAREN_CODE = re.compile(r'\(\s*\d+[\s\d]*\)')                       # "(12345)"
+_LONG_NUMBER = re.compile(r'\b\d{4,}\b')                              # "Arroz 12345" (but not "Arroz 1kg")
+_DISALLOWED = re.compile(r'[^A-Za-z0-9\sáéíóúÁÉÍÓÚñÑ\%\.-]')
+
+_NON_TERM = re.compile(r'[^a-z0-9%]+')
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def normalize_name(name: str) -> str:
+    """
+    Display name of a product as stored in name_norm
+
+    - Remove codes like "COD (12345)", "SKU 123", "PLU 999"
+    - Remove parenthesized and isolated 4+ digit numbers (likely codes)
+    - Collapse whitespace, title case, drop special chars
+    """
+    name = _CODE_PREFIX.sub('', name or '')
+    name = _PAREN_CODE.sub('', name)
+    name = _LONG_NUMBER.sub('', name)
+    name = " ".join(name.split()).title()
+    name = _DISALLOWED.sub('', name)
+    return name.strip()
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def normalize_term(text: str) -> str:
+    """Lowercase, strip accents and punctuation so 'Azúcar  1KG' == 'azucar 1kg'"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = _NON_TERM.sub(' ', text.lower())
+    return " ".join(text.split())
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def normalize_key(text: str) -> str:
+    """Lowercase with collapsed whitespace; keeps accents and punctuation"""
+    return " ".join((text or "").lower().split())
+
+
+def dedupe_key(name: str) -> str:
+    """normalize_name without spaces or case: 'Arroz  Grado 2' == 'arrozgrado2'"""
+    return normalize_name(name).replace(" ", "").lower()
+
+
+def normalize_batch(values, fn: Callable[[str], str] = normalize_name):
+    """
+    Apply a normalizer to a list (returns a list) or a pandas Series
+    (returns a Series). Each distinct value is normalized once.
+    """
+    if hasattr(values, 'unique') and hasattr(values, 'map'):
+        uniques = values.dropna().unique()
+        mapping = {v: fn(str(v)) for v in uniques}
+        return values.map(mapping)
+    return _normalize_list(values, fn)
+
+
+def _normalize_list(values: Iterable[str], fn: Callable[[str], str]) -> List[str]:
+    seen = {}
+    out = []
+    for v in values:
+        if v not in seen:
+            seen[v] = fn(v or '')
+        out.append(seen[v])
+    return out
+
+
+def cache_info():
+    return {
+        'normalize_name': normalize_name.cache_info()._asdict(),
+        'normalize_term': normalize_term.cache_info()._asdict(),
+        'normalize_key': normalize_key.cache_info()._asdict()
+    }
@@ -0,0 +1,187 @@
+from supabase import Client as SupabaseClient
+from datetime import datetime
+from statistics import median
+from threading import Lock
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Product × store price matrix per household, cached in memory.
+# A cache hit costs one tiny query (row count + newest created_at of
+# product_prices); any new or deleted price changes that version and
+# forces a rebuild, as does invalidate() on receipt confirmation.
+_CACHE: Dict[str, Dict[str, Any]] = {}
+_CACHE_TTL_SECONDS = 600
+_LOCK = Lock()
+_PAGE_SIZE = 1000
+
+
+def build_cells(price_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    One pass over raw product_prices rows -> one cell per (product, store, unit)
+
+    Same shape as the product_store_price_matrix() SQL function
+    (sql/schema_migration_v7.sql), used when that function isn't deployed.
+    """
+    groups: Dict[Tuple[str, str, str], List[tuple]] = {}
+    for row in price_rows:
+        product_id, store_id = row.get('product_id'), row.get('store_id')
+        if not product_id or not store_id or row.get('unit_price') is None:
+            continue
+        key = (product_id, store_id, row.get('unit') or 'unit')
+        groups.setdefault(key, []).append(
+            (str(row.get('date') or ''), str(row.get('created_at') or ''), float(row['unit_price']))
+        )
+
+    cells = []
+    for (product_id, store_id, unit), points in groups.items():
+        latest = max(points, key=lambda p: (p[0], p[1]))
+        cells.append({
+            'product_id': product_id,
+            'store_id': store_id,
+            'unit': unit,
+            'latest_unit_price': latest[2],
+            'median_unit_price': median(p[2] for p in points),
+            'n': len(points),
+            'last_date': latest[0] or None
+        })
+    return cells
+
+
+def assemble(
+    cells: List[Dict[str, Any]],
+    products: List[Dict[str, Any]],
+    stores: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Shape cells into the matrix payload
+
+    Each product is compared on its dominant unit (most purchases), so a
+    price per kg is never ranked against a price per unit.
+    """
+    unit_counts: Dict[str, Dict[str, int]] = {}
+    for cell in cells:
+        counts = unit_counts.setdefault(cell['product_id'], {})
+        counts[cell['unit']] = counts.get(cell['unit'], 0) + int(cell.get('n') or 0)
+    dominant = {pid: max(counts, key=counts.get) for pid, counts in unit_counts.items()}
+
+    rows: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for cell in cells:
+        product_id = cell['product_id']
+        if cell['unit'] != dominant[product_id]:
+            continue
+        rows.setdefault(product_id, {})[cell['store_id']] = {
+            'latest': float(cell['latest_unit_price']),
+            'median': float(cell['median_unit_price']),
+            'count': int(cell.get('n') or 0),
+            'last_date': cell.get('last_date')
+        }
+
+    products_by_id = {p['id']: p for p in products}
+    matrix_products = []
+    for product_id, prices in rows.items():
+        p = products_by_id.get(product_id)
+        if not p:
+            continue
+        cheapest = min(prices, key=lambda s: prices[s]['latest'])
+        matrix_products.append({
+            'product_id': product_id,
+            'name': p.get('name_norm') or p.get('name_raw') or 'Sin nombre',
+            'group': p.get('group'),
+            'category_tag': p.get('category_tag'),
+            'unit': dominant[product_id],
+            'prices': prices,
+            'cheapest_store_id': cheapest
+        })
+    matrix_products.sort(key=lambda p: (p['name'] or '').lower())
+
+    used_stores = {s for p in matrix_products for s in p['prices']}
+    matrix_stores = sorted(
+        ({'id': s['id'], 'name': s.get('name')} for s in stores if s['id'] in used_stores),
+        key=lambda s: (s.get('name') or '').lower()
+    )
+    return {'stores': matrix_stores, 'products': matrix_products}
+
+
+def filter_matrix(
+    matrix: Dict[str, Any],
+    category_tag: Optional[str] = None,
+    group: Optional[str] = None
+) -> Dict[str, Any]:
+    products = [
+        p for p in matrix['products']
+        if (category_tag is None or p.get('category_tag') == category_tag)
+        and (group is None or p.get('group') == group)
+    ]
+    used_stores = {s for p in products for s in p['prices']}
+    return {
+        **matrix,
+        'stores': [s for s in matrix['stores'] if s['id'] in used_stores],
+        'products': products
+    }
+
+
+def get_matrix(supabase: SupabaseClient, household_id: str) -> Dict[str, Any]:
+    """Cached full matrix for a household (blocking)"""
+    version = _data_version(supabase, household_id)
+    now = datetime.utcnow()
+    cached = _CACHE.get(household_id)
+    if cached and cached['version'] == version and (now - cached['ts']).total_seconds() < _CACHE_TTL_SECONDS:
+        return cached['data']
+
+    with _LOCK:
+        cached = _CACHE.get(household_id)
+        if cached and cached['version'] == version and (now - cached['ts']).total_seconds() < _CACHE_TTL_SECONDS:
+            return cached['data']
+
+        cells = _load_cells(supabase, household_id)
+        products = _fetch_all(lambda: supabase.table("products").select("*")
+                              .eq("household_id", household_id)) if cells else []
+        stores = supabase.table("stores").select("id, name").eq("household_id", household_id).execute().data or []
+
+        data = assemble(cells, products, stores)
+        data['generated_at'] = now.isoformat()
+        _CACHE[household_id] = {'ts': now, 'version': version, 'data': data}
+        logger.info(f"Price matrix built for {household_id}: {len(data['products'])} products x {len(data['stores'])} stores")
+        return data
+
+
+def invalidate(household_id: Optional[str] = None) -> None:
+    """Drop the cached matrix for one household (or all)"""
+    with _LOCK:
+        if household_id is None:
+            _CACHE.clear()
+        else:
+            _CACHE.pop(household_id, None)
+
+
+def _data_version(supabase: SupabaseClient, household_id: str) -> tuple:
+    resp = supabase.table("product_prices").select("created_at", count="exact")\
+        .eq("household_id", household_id).order("created_at", desc=True).limit(1).execute()
+    newest = resp.data[0].get("created_at") if resp.data else None
+    return (resp.count, newest)
+
+
+def _load_cells(supabase: SupabaseClient, household_id: str) -> List[Dict[str, Any]]:
+    try:
+        return _fetch_all(lambda: supabase.rpc("product_store_price_matrix", {"p_household_id": household_id}))
+    except Exception as e:
+        # Function not deployed yet: aggregate the raw rows here instead
+        logger.warning(f"product_store_price_matrix unavailable, scanning product_prices: {e}")
+        rows = _fetch_all(lambda: supabase.table("product_prices")
+                          .select("product_id, store_id, unit, unit_price, date, created_at")
+                          .eq("household_id", household_id))
+        return build_cells(rows)
+
+
+def _fetch_all(make_query) -> List[Dict[str, Any]]:
+    """Page through a query (PostgREST caps responses at 1000 rows)"""
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        page = make_query().range(start, start + _PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        start += _PAGE_SIZE
@@ -0,0 +1,48 @@
+from supabase import Client as SupabaseClient
+from app.domain import price_series
+from typing import Optional, Dict, Any
+
+# Compact per-product price history lives in the Supabase table
+# product_price_series (packed arrays, see app.domain.price_series), kept in
+# sync with product_prices by a trigger (sql/schema_migration_v5.sql).
+
+
+def load_series(supabase: SupabaseClient, household_id: str, product_id: str) -> Dict[str, Any]:
+    """
+    Read a product's packed series from Supabase (one row), falling back to
+    building it from product_prices if the row doesn't exist yet
+    """
+    resp = supabase.table("product_price_series").select("*")\
+        .eq("household_id", household_id).eq("product_id", product_id).limit(1).execute()
+    if resp.data:
+        row = resp.data[0]
+        series = price_series.new_series(product_id)
+        for key in ('d', 'p', 's', 'q', 'u', 'stores', 'units'):
+            series[key] = row.get(key) or []
+        return series
+
+    prices_resp = supabase.table("product_prices").select("date, unit_price, store_id, qty, unit")\
+        .eq("household_id", household_id).eq("product_id", product_id).execute()
+    return price_series.build_series(product_id, prices_resp.data or [])
+
+
+def series_payload(
+    supabase: SupabaseClient,
+    household_id: str,
+    product_id: str,
+    points: Optional[int] = None,
+    unit: Optional[str] = None,
+    series: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Chart payload with store names resolved in a single batched query (pass `series` if already loaded)"""
+    if series is None:
+        series = load_series(supabase, household_id, product_id)
+    payload = price_series.to_payload(series, points=points, unit=unit)
+
+    store_ids = [s for s in payload['stores'] if s]
+    names = {}
+    if store_ids:
+        stores_resp = supabase.table("stores").select("id, name").in_("id", store_ids).execute()
+        names = {s["id"]: s.get("name") for s in stores_resp.data or []}
+    payload['store_names'] = [names.get(s) for s in payload['stores']]
+    return payload
@@ -1,5 +1,9 @@
 from google.cloud.firestore import Client
 from datetime import datetime, timedelta
+from app.services import product_search
+from app.services.price_stats import PriceStatsService
+from app.domain.price_stats import mean_price
+import asyncio
 import logging
 import re
 from typing import Optional, Dict, Any, List
@@ -9,6 +13,7 @@ logger = logging.getLogger(__name__)
 class PriceService:
     def __init__(self, db: Client):
         self.db = db
+        self.stats_service = PriceStatsService(db)
 
     async def get_price_comparison(self, query_text: str, household_id: str) -> str:
         """
@@ -27,21 +32,20 @@ class PriceService:
         product_id = product['id']
         product_name = product['name_norm'] or product['name_raw']
 
-        # 3. Get recent prices (last 90 days)
-        cutoff_date = datetime.now() - timedelta(days=90)
-        
-        prices_ref = self.db.collection('households').document(household_id).collection('product_prices')
-        query = prices_ref.where('product_id', '==', product_id).where('date', '>=', cutoff_date).stream()
-        
-        price_records = []
-        for doc in query:
-            price_records.append(doc.to_dict())
+        # 3. Price stats: one document read, maintained on every confirmed receipt
+        stats_doc = await asyncio.to_thread(self.stats_service.get_stats, household_id, product_id)
+        if not stats_doc:
+            # History not rebuilt yet for this product: derive the same stats from the last 90 days
+            cutoff_date = datetime.now() - timedelta(days=90)
+            price_records = await asyncio.to_thread(self._get_recent_prices, product_id, household_id, cutoff_date)
+            stats_doc = PriceStatsService.build_doc(product_id, price_records)
 
-        if not price_records:
+        by_unit = stats_doc.get('by_unit') or {}
+        if not by_unit:
             return f"{product_name.upper()}\n\nNo tengo registros recientes de este producto.\nAyúdame subiendo boletas para aprender."
 
         # 4. Data Quality Check (Internal Thresholds)
-        num_compras = len(price_records)
+        num_compras = stats_doc['overall']['count']
         confidence_label = ""
         if num_compras < 3:
             confidence_label = " (Datos limitados)"
@@ -49,7 +53,7 @@ class PriceService:
             confidence_label = " (Comparación confiable)"
 
         # 5. Filter by unit or decide if to use total price
-        available_units = set(p['unit'] for p in price_records)
+        available_units = set(by_unit)
         
         # Rule for "composite" or non-standard items: if 'unit' is the only unit and we have no weights
         is_composite = len(available_units) == 1 and 'unit' in available_units
@@ -57,23 +61,19 @@ class PriceService:
         if target_unit and target_unit in available_units:
             use_unit = target_unit
         else:
-            unit_counts = {}
-            for p in price_records:
-                unit_counts[p['unit']] = unit_counts.get(p['unit'], 0) + 1
-            use_unit = max(unit_counts, key=unit_counts.get)
+            use_unit = max(by_unit, key=lambda u: by_unit[u]['count'])
 
-        filtered_prices = [p for p in price_records if p['unit'] == use_unit]
+        unit_stats = by_unit[use_unit]
         
         # 6. Calculate stats
-        unit_prices = [p['unit_price'] for p in filtered_prices]
-        avg_price = sum(unit_prices) / len(unit_prices)
-        min_price = min(unit_prices)
-        max_price = max(unit_prices)
+        avg_price = mean_price(unit_stats)
+        min_price = unit_stats['min']
+        max_price = unit_stats['max']
         
         # Find cheapest store
-        cheapest_record = min(filtered_prices, key=lambda x: x['unit_price'])
-        store_id = cheapest_record['store_id']
-        store_name = await self._get_store_name(store_id, household_id)
+        store_slots = [s for s in (stats_doc.get('by_store_unit') or {}).values() if s.get('unit') == use_unit]
+        cheapest_slot = min(store_slots, key=lambda s: s['min']) if store_slots else {}
+        store_name = await self._get_store_name(cheapest_slot.get('store_id'), household_id)
 
         # 7. Final Formatting
         unit_display = use_unit if use_unit != 'unit' else 'un'
@@ -82,7 +82,7 @@ class PriceService:
         res = [
             f"<b>{product_name.upper()}</b>{confidence_label}",
             f"\n• Precio promedio: ${avg_price:,.0f}/{unit_display}",
-            f"• Rango reciente: ${min_price:,.0f} – ${max_price:,.0f}/{unit_display}",
+            f"• Rango de precios: ${min_price:,.0f} – ${max_price:,.0f}/{unit_display}",
             f"• Tienda más barata: {store_name}",
             f"\n<i>Comparación basada en precio {tipo_comparacion}.</i>" if is_composite else ""
         ]
@@ -106,27 +106,21 @@ class PriceService:
         return unit
 
     async def _find_product(self, name: str, household_id: str) -> Optional[Dict[str, Any]]:
-        products_ref = self.db.collection('households').document(household_id).collection('products')
-        docs = products_ref.stream()
-        
-        best_match = None
-        highest_score = 0
-        import difflib
-        
-        for doc in docs:
-            data = doc.to_dict()
-            data['id'] = doc.id
-            score = max(
-                difflib.SequenceMatcher(None, name.lower(), data.get('name_norm', '').lower()).ratio(),
-                difflib.SequenceMatcher(None, name.lower(), data.get('name_raw', '').lower()).ratio()
-            )
-            if score > 0.6 and score > highest_score:
-                highest_score = score
-                best_match = data
-        return best_match
+        # Index is cached per household; only a cold/stale build touches Firestore
+        index = await asyncio.to_thread(product_search.get_index, self.db, household_id)
+        return index.best(name)
+
+    def _get_recent_prices(self, product_id: str, household_id: str, cutoff_date: datetime) -> List[Dict[str, Any]]:
+        prices_ref = self.db.collection('households').document(household_id).collection('product_prices')
+        query = prices_ref.where('product_id', '==', product_id).where('date', '>=', cutoff_date).stream()
+        return [doc.to_dict() for doc in query]
 
     async def _get_store_name(self, store_id: str, household_id: str) -> str:
-        doc = self.db.collection('households').document(household_id).collection('stores').document(store_id).get()
+        if not store_id:
+            return "Tienda desconocida"
+        doc = await asyncio.to_thread(
+            self.db.collection('households').document(household_id).collection('stores').document(store_id).get
+        )
         if doc.exists:
             return doc.to_dict().get('name', 'Tienda desconocida')
         return "Tienda desconocida"
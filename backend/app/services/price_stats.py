@@ -0,0 +1,133 @@
+from google.cloud.firestore import Client
+from google.cloud import firestore
+from app.domain import price_stats
+from datetime import datetime
+import logging
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class PriceStatsService:
+    """
+    Per-product price statistics, maintained incrementally
+
+    One document per product in households/{id}/product_price_stats/{product_id}:
+    - overall: stats over every price of the product
+    - by_unit: {unit: stats}
+    - by_store_unit: {"<store_id>__<unit>": stats + store_id/unit}
+
+    Each stats dict holds count, sum, min, max, last_price, last_date and a
+    quantile sketch (see app.domain.price_stats), so price comparisons and
+    product status need a single document read.
+    """
+
+    def __init__(self, db: Client):
+        self.db = db
+        self.collection = "product_price_stats"
+
+    def _stats_ref(self, household_id: str, product_id: str):
+        return self.db.collection('households').document(household_id)\
+            .collection(self.collection).document(product_id)
+
+    def record_price(
+        self,
+        household_id: str,
+        product_id: str,
+        store_id: Optional[str],
+        unit: Optional[str],
+        unit_price: float,
+        occurred_on: datetime
+    ) -> None:
+        """Fold a newly created product_prices row into the stats document"""
+        doc_ref = self._stats_ref(household_id, product_id)
+        transaction = self.db.transaction()
+
+        @firestore.transactional
+        def _update(transaction):
+            snap = doc_ref.get(transaction=transaction)
+            doc = snap.to_dict() if snap.exists else self._new_doc(product_id)
+            self._apply(doc, store_id, unit, unit_price, occurred_on)
+            doc['updated_at'] = datetime.now()
+            transaction.set(doc_ref, doc)
+
+        _update(transaction)
+
+    def get_stats(self, household_id: str, product_id: str) -> Optional[Dict[str, Any]]:
+        snap = self._stats_ref(household_id, product_id).get()
+        return snap.to_dict() if snap.exists else None
+
+    def get_many(self, household_id: str, product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Batched read of several stats documents (one round trip)"""
+        if not product_ids:
+            return {}
+        refs = [self._stats_ref(household_id, pid) for pid in product_ids]
+        return {snap.id: snap.to_dict() for snap in self.db.get_all(refs) if snap.exists}
+
+    def rebuild(self, household_id: str) -> int:
+        """
+        Recompute every stats document from the full product_prices history
+
+        Returns the number of product documents written.
+        """
+        prices_ref = self.db.collection('households').document(household_id)\
+            .collection('product_prices')
+
+        docs: Dict[str, Dict[str, Any]] = {}
+        for price_doc in prices_ref.order_by('date').stream():
+            data = price_doc.to_dict()
+            product_id = data.get('product_id')
+            if not product_id:
+                continue
+            doc = docs.setdefault(product_id, self._new_doc(product_id))
+            self._apply(doc, data.get('store_id'), data.get('unit'), data.get('unit_price'), data.get('date'))
+
+        batch = self.db.batch()
+        ops = 0
+        now = datetime.now()
+        for product_id, doc in docs.items():
+            doc['updated_at'] = now
+            batch.set(self._stats_ref(household_id, product_id), doc)
+            ops += 1
+            if ops >= 400:
+                batch.commit()
+                batch = self.db.batch()
+                ops = 0
+        if ops:
+            batch.commit()
+
+        logger.info(f"Rebuilt price stats for household {household_id}: {len(docs)} products")
+        return len(docs)
+
+    @classmethod
+    def build_doc(cls, product_id: str, price_records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Stats document from raw product_prices dicts (no Firestore access)"""
+        doc = cls._new_doc(product_id)
+        for data in sorted(price_records, key=lambda p: price_stats.as_naive(p['date']) if p.get('date') else datetime.min):
+            cls._apply(doc, data.get('store_id'), data.get('unit'), data.get('unit_price'), data.get('date'))
+        return doc
+
+    @staticmethod
+    def _new_doc(product_id: str) -> Dict[str, Any]:
+        return {
+            'product_id': product_id,
+            'overall': price_stats.new_stats(),
+            'by_unit': {},
+            'by_store_unit': {}
+        }
+
+    @staticmethod
+    def _apply(doc: Dict[str, Any], store_id: Optional[str], unit: Optional[str], unit_price: float, occurred_on) -> None:
+        unit = unit or 'unit'
+        price_stats.add_price(doc['overall'], unit_price, occurred_on)
+
+        unit_stats = doc['by_unit'].setdefault(unit.replace('.', ''), price_stats.new_stats())
+        price_stats.add_price(unit_stats, unit_price, occurred_on)
+
+        key = price_stats.stats_key(store_id, unit)
+        slot = doc['by_store_unit'].get(key)
+        if slot is None:
+            slot = price_stats.new_stats()
+            slot.update({'store_id': store_id, 'unit': unit})
+            doc['by_store_unit'][key] = slot
+        price_stats.add_price(slot, unit_price, occurred_on)
@@ -1,6 +1,7 @@
 from google.cloud.firestore import Client
+from app.services import product_search, autocomplete
+from app.services.name_normalizer import normalize_name
 from difflib import SequenceMatcher
-import re
 import logging
 from typing import Optional
 
@@ -61,35 +62,8 @@ class ProductMatcher:
         return product_id
     
     def _normalize_name(self, name: str) -> str:
-        """
-        Normalize product name for matching
-        
-        - Remove codes like "COD (12345)", "SKU 123", "PLU 999"
-        - Remove isolated numbers (likely codes)
-        - Remove extra whitespace
-        - Title case
-        """
-        # 1. Remove common code patterns
-        # Matches "COD (123)", "COD 123", "SKU: 123", "PLU 1234"
-        name = re.sub(r'(?i)\b(?:COD|SKU|PLU|INT)\b.*?(?=\s|$)', '', name)
-        
-        # 2. Remove parenthesized numbers typically associated with codes e.g. "(12345)"
-        name = re.sub(r'\(\s*\d+[\s\d]*\)', '', name)
-        
-        # 3. Remove isolated large numbers (often PLU codes without prefix)
-        # Assuming product names rarely have >3 digit isolated numbers (like "Arroz 1kg" is fine, "Arroz 12345" is code)
-        name = re.sub(r'\b\d{4,}\b', '', name)
-
-        # 4. Remove extra whitespace
-        name = " ".join(name.split())
-        
-        # 5. Title case
-        name = name.title()
-        
-        # 6. Remove special chars (mostly) but allow basic ones
-        name = re.sub(r'[^A-Za-z0-9\sáéíóúÁÉÍÓÚñÑ\%\.-]', '', name)
-        
-        return name.strip()
+        """Normalize product name for matching (see name_normalizer.normalize_name)"""
+        return normalize_name(name)
     
     def _fuzzy_match(
         self,
@@ -155,6 +129,8 @@ class ProductMatcher:
         update_time, product_ref = self.db.collection('households').document(household_id)\
             .collection('products').add(product_data)
         self._index_product(household_id, product_ref.id, name_norm)
+        product_search.index_product(household_id, product_ref.id, product_data)
+        autocomplete.record(household_id, autocomplete.PRODUCT, product_ref.id, name_norm, delta=0)
         return product_ref.id
 
     def _index_product(self, household_id: str, product_id: str, name_norm: str) -> None:
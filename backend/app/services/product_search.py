@@ -0,0 +1,203 @@
+from google.cloud.firestore import Client
+from app.services.name_normalizer import normalize_term
+from difflib import SequenceMatcher
+from bisect import bisect_left, insort
+from datetime import datetime
+import threading
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Same threshold the old linear scan in PriceService used
+MATCH_THRESHOLD = 0.6
+
+# Rebuild from Firestore at most every 10 minutes; writes made through this
+# process are applied incrementally in between (see index_product)
+_INDEX_TTL_SECONDS = 600
+
+_INDEXES: Dict[str, "ProductSearchIndex"] = {}
+_LOCK = threading.Lock()
+
+
+class ProductSearchIndex:
+    """
+    In-memory search index over a household's products
+
+    Every product is indexed under its normalized name_norm, name_raw,
+    aliases and "name + brand". Lookups go exact → word prefix → token → fuzzy,
+    and only the fuzzy stage runs SequenceMatcher, over a small candidate set.
+    Thread-safe: writes (index_product) and searches share the index's lock.
+    """
+
+    def __init__(self):
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self._terms: List[Tuple[str, str]] = []        # sorted (term, product_id)
+        self._tokens: Dict[str, set] = {}               # token -> {product_id}
+        self._lock = threading.RLock()
+        self.built_at = datetime.utcnow()
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def add(self, product_id: str, data: Dict[str, Any]) -> None:
+        """Insert or replace a product"""
+        with self._lock:
+            self._add(product_id, data)
+
+    def _add(self, product_id: str, data: Dict[str, Any]) -> None:
+        if product_id in self.products:
+            self._remove(product_id)
+
+        entry = dict(data)
+        entry['id'] = product_id
+        self.products[product_id] = entry
+
+        for term in self._terms_for(entry):
+            insort(self._terms, (term, product_id))
+            for token in term.split():
+                self._tokens.setdefault(token, set()).add(product_id)
+
+    def remove(self, product_id: str) -> None:
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id: str) -> None:
+        entry = self.products.pop(product_id, None)
+        if not entry:
+            return
+        self._terms = [t for t in self._terms if t[1] != product_id]
+        for term in self._terms_for(entry):
+            for token in term.split():
+                ids = self._tokens.get(token)
+                if ids:
+                    ids.discard(product_id)
+                    if not ids:
+                        del self._tokens[token]
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+        """Return up to `limit` (score, product) pairs, best first"""
+        q = normalize_term(query)
+        with self._lock:
+            return self._search(q, limit) if q else []
+
+    def _search(self, q: str, limit: int) -> List[Tuple[float, Dict[str, Any]]]:
+        if not self._terms:
+            return []
+
+        scores: Dict[str, float] = {}
+
+        # 1. Exact and prefix matches on any indexed term. A prefix ending on
+        #    a word boundary ("arroz" -> "arroz grado 2") is a strong hit; one
+        #    ending mid-word is scaled by how much of the term it covers, so
+        #    "sal" doesn't find "salchicha viena"
+        pos = bisect_left(self._terms, (q, ''))
+        while pos < len(self._terms) and self._terms[pos][0].startswith(q):
+            term, product_id = self._terms[pos]
+            pos += 1
+            if term == q:
+                score = 1.0
+            elif term[len(q)] == ' ':
+                score = 0.9
+            else:
+                score = 0.9 * len(q) / len(term)
+                if score <= MATCH_THRESHOLD:
+                    continue
+            scores[product_id] = max(scores.get(product_id, 0.0), score)
+
+        if scores:
+            return self._top(scores, limit)
+
+        # 2. Candidates sharing a token (or a token prefix) with the query
+        candidates = set()
+        for token in q.split():
+            candidates |= self._tokens.get(token, set())
+            if len(token) >= 3:
+                tpos = bisect_left(self._terms, (token, ''))
+                while tpos < len(self._terms) and self._terms[tpos][0].startswith(token):
+                    candidates.add(self._terms[tpos][1])
+                    tpos += 1
+
+        # 3. Nothing shares a token: fall back to all products (typos like "arros")
+        if not candidates:
+            candidates = set(self.products)
+
+        for product_id in candidates:
+            best = 0.0
+            for term in self._terms_for(self.products[product_id]):
+                best = max(best, self._score(q, term))
+            if best > MATCH_THRESHOLD:
+                scores[product_id] = best
+
+        return self._top(scores, limit)
+
+    def best(self, query: str) -> Optional[Dict[str, Any]]:
+        results = self.search(query, limit=1)
+        return results[0][1] if results else None
+
+    @staticmethod
+    def _score(q: str, term: str) -> float:
+        """Whole-string ratio, or per-token ratio (slightly discounted) so
+        'arros' still finds 'arroz grado 2'"""
+        full = SequenceMatcher(None, q, term).ratio()
+        term_tokens = term.split()
+        token_scores = [
+            max(SequenceMatcher(None, qt, tt).ratio() for tt in term_tokens)
+            for qt in q.split()
+        ]
+        return max(full, 0.95 * sum(token_scores) / len(token_scores))
+
+    def _top(self, scores: Dict[str, float], limit: int) -> List[Tuple[float, Dict[str, Any]]]:
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        return [(score, self.products[product_id]) for product_id, score in ranked]
+
+    @staticmethod
+    def _terms_for(entry: Dict[str, Any]) -> set:
+        names = [entry.get('name_norm'), entry.get('name_raw'), entry.get('name_clean')]
+        names.extend(entry.get('aliases') or [])
+        brand = entry.get('brand') or entry.get('name_brand')
+        if brand:
+            names.append(f"{entry.get('name_norm') or entry.get('name_raw') or ''} {brand}")
+        return {t for t in (normalize_term(n) for n in names if n) if t}
+
+
+def get_index(db: Client, household_id: str) -> ProductSearchIndex:
+    """
+    Get the cached index for a household, building it from Firestore if
+    missing or stale. Blocking: call through asyncio.to_thread from async code.
+    """
+    index = _INDEXES.get(household_id)
+    now = datetime.utcnow()
+    if index and (now - index.built_at).total_seconds() < _INDEX_TTL_SECONDS:
+        return index
+
+    with _LOCK:
+        index = _INDEXES.get(household_id)
+        if index and (now - index.built_at).total_seconds() < _INDEX_TTL_SECONDS:
+            return index
+
+        products_ref = db.collection('households').document(household_id)\
+            .collection('products')
+        index = ProductSearchIndex()
+        for doc in products_ref.stream():
+            index.add(doc.id, doc.to_dict())
+
+        _INDEXES[household_id] = index
+        logger.info(f"Product search index built for {household_id}: {len(index)} products")
+        return index
+
+
+def index_product(household_id: str, product_id: str, data: Dict[str, Any]) -> None:
+    """Apply a product write to the cached index (no-op if not built yet)"""
+    index = _INDEXES.get(household_id)
+    if index is not None:
+        index.add(product_id, data)
+
+
+def invalidate(household_id: Optional[str] = None) -> None:
+    """Drop the cached index for one household (or all)"""
+    with _LOCK:
+        if household_id is None:
+            _INDEXES.clear()
+        else:
+            _INDEXES.pop(household_id, None)
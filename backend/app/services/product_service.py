@@ -1,12 +1,14 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 from google.cloud.firestore import Client
-from app.domain.models import ProductPrice, Status
-from app.domain.logic import compute_product_status
+from app.domain.models import Status
+from app.domain.logic import compute_product_status_from_stats
+from app.services.price_stats import PriceStatsService
 
 class ProductService:
     def __init__(self, db: Client):
         self.db = db
+        self.stats_service = PriceStatsService(db)
 
     def get_strategic_products(self, household_id: str, category: str = None) -> List[Dict[str, Any]]:
         # 1. Fetch Products
@@ -19,25 +21,16 @@ class ProductService:
         products_docs = list(query.stream())
         results = []
 
-        # 2. Fetch Prices (Transactions) for context
-        # Ideally we'd do a big query, but for MVP we loop (careful with N+1)
-        # Optimization: Fetch all transactions with a product_id once?
-        # For now, let's just return the static data + Green status.
+        # 2. Price stats for every product in one batched read
+        stats_by_product = self.stats_service.get_many(household_id, [doc.id for doc in products_docs])
         
         for doc in products_docs:
             p_data = doc.to_dict()
             product_id = doc.id
             
-            # TODO: Fetch real price history
-            prices: List[ProductPrice] = [] 
-            
-            status = compute_product_status(prices)
-            
-            summary = "Estable"
-            if status == Status.YELLOW:
-                summary = "Subiendo"
-            elif status == Status.RED:
-                summary = "Caro"
+            stats = self._dominant_unit_stats(stats_by_product.get(product_id))
+            status = compute_product_status_from_stats(stats)
+            summary = self.summary_for_status(status)
                 
             results.append({
                 "product_id": product_id,
@@ -49,6 +42,22 @@ class ProductService:
             
         return results
 
+    @staticmethod
+    def _dominant_unit_stats(stats_doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Stats of the most purchased unit (kg and unit prices don't compare)"""
+        by_unit = (stats_doc or {}).get('by_unit') or {}
+        if not by_unit:
+            return {}
+        return max(by_unit.values(), key=lambda s: s.get('count', 0))
+
+    @staticmethod
+    def summary_for_status(status: Status) -> str:
+        if status == Status.YELLOW:
+            return "Subiendo"
+        if status == Status.RED:
+            return "Caro"
+        return "Estable"
+
     def _get_icon_for_category(self, category: str) -> str:
         icons = {
             'esenciales': '🍚',
@@ -1,5 +1,7 @@
 from google.cloud.firestore import Client
 from app.services.product_matcher import ProductMatcher
+from app.services.price_stats import PriceStatsService
+from app.services import price_matrix, autocomplete, alias_engine
 from datetime import datetime, date, time
 from typing import Optional
 import logging
@@ -20,6 +22,7 @@ class ReceiptProcessor:
     def __init__(self, db: Client):
         self.db = db
         self.product_matcher = ProductMatcher(db)
+        self.price_stats = PriceStatsService(db)
     
     def confirm_receipt(
         self,
@@ -102,6 +105,8 @@ class ReceiptProcessor:
             occurred_on=occurred_on,
             receipt_id=receipt_id
         )
+        if items_stats['prices']:
+            price_matrix.invalidate(household_id)
         
         # Update receipt status and metadata
         receipt_ref.update({
@@ -165,6 +170,7 @@ class ReceiptProcessor:
         
         _, store_ref = stores_ref.add(store_data)
         logger.info(f"Created new store: {store_name}")
+        autocomplete.record(household_id, autocomplete.STORE, store_ref.id, store_name, delta=0)
         
         return store_ref.id
     
@@ -253,6 +259,9 @@ class ReceiptProcessor:
         
         for item_doc in items:
             item_data = item_doc.to_dict()
+            # Known OCR names -> clean name + brand before matching
+            alias_fields = alias_engine.apply(item_data)
+            item_data.update(alias_fields)
             name_raw = item_data.get('name_raw')
             name_clean = item_data.get('name_clean')
             name_brand = item_data.get('name_brand')
@@ -264,8 +273,8 @@ class ReceiptProcessor:
                 household_id=household_id
             )
             
-            # Update item with product_id
-            items_ref.document(item_doc.id).update({'product_id': product_id})
+            # Update item with product_id (and alias fields, same write)
+            items_ref.document(item_doc.id).update({'product_id': product_id, **alias_fields})
             
             # Track if new or existing
             # (We can't easily tell here, but product_matcher logs it)
@@ -324,6 +333,20 @@ class ReceiptProcessor:
             .collection('product_prices').add(price_data)
         
         logger.debug(f"Price created: {product_id} @ {store_id} = {total_price}")
+        autocomplete.record(household_id, autocomplete.PRODUCT, product_id, None)
+
+        # Keep per-product stats in sync (non-blocking; rebuild job can repair)
+        try:
+            self.price_stats.record_price(
+                household_id=household_id,
+                product_id=product_id,
+                store_id=store_id,
+                unit=price_data['unit'],
+                unit_price=unit_price,
+                occurred_on=occurred_on
+            )
+        except Exception as e:
+            logger.warning(f"Failed to update price stats for {product_id}: {e}")
 
     def _update_receipt_items(self, receipt_ref, items: list):
         """Update items subcollection with user corrections"""
@@ -408,7 +431,7 @@ class ReceiptProcessor:
             }
             pattern_ref.update(updates)
         else:
-            pattern_ref.set({
+            updates = {
                 'store_name': store_name,
                 'store_id': store_id,
                 'last_amount': total,
@@ -418,4 +441,15 @@ class ReceiptProcessor:
                 'category_id': category_id,
                 'created_at': now,
                 'updated_at': now
-            })
+            }
+            pattern_ref.set(updates)
+
+        autocomplete.record(
+            household_id, autocomplete.PATTERN, doc_id, store_name,
+            avg_amount=updates['avg_amount'],
+            last_amount=total,
+            category_id=updates['category_id'],
+            count=updates['count']
+        )
+        if store_id:
+            autocomplete.record(household_id, autocomplete.STORE, store_id, None)
@@ -0,0 +1,313 @@
+from supabase import Client as SupabaseClient
+from app.services import price_matrix, recipe_index
+from app.services.product_search import ProductSearchIndex, normalize_term
+from app.services.recipe_index import parse_cost, strip_link
+from app.services.shopping_estimator import product_unit_prices, convert_qty
+from pathlib import Path
+import numpy as np
+import threading
+import csv
+import logging
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# Recipe measure units in the Notion ingredients export -> base units
+_RECIPE_UNITS = {'gr': 'g', 'g': 'g', 'ml': 'ml', 'unidad': 'unit', '': 'g'}
+
+# An ingredient is only priced as a product on an exact, word-prefix or
+# near-identical match; anything looser keeps the Notion cost
+MIN_MATCH_SCORE = 0.9
+
+# household_id -> RecipeCostModel
+_MODELS: Dict[str, "RecipeCostModel"] = {}
+# {recipe_id: [ingredient lines]} for the current catalog and ingredients CSV
+_LINES: Dict[str, Any] = {}
+_LOCK = threading.Lock()
+
+
+def load_ingredient_lines(path: Path) -> List[Dict[str, Any]]:
+    """One dict per (recipe, ingredient) row of the Notion ingredients CSV"""
+    if not path.exists():
+        return []
+    lines = []
+    with path.open("r", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            recipe = strip_link(row.get("RECETA") or "")
+            if not recipe:
+                continue
+            qty = parse_cost(row.get("Cantidad necesaria en unidad base") or row.get("Cantidad necesaria") or "")
+            unit = _RECIPE_UNITS.get((row.get("Unidad de medida de receta") or "").strip().lower(), 'g')
+            lines.append({
+                'recipe': recipe,
+                'ingredient': (row.get("Ingredientes en receta") or "").strip(),
+                'product': strip_link(row.get("Producto de despensa") or ""),
+                'qty': qty,
+                'unit': unit,
+                # Static Notion price per base unit, used when we have no purchase
+                'static_unit_price': parse_cost(row.get("Precio gramo") or "")
+            })
+    return lines
+
+
+def _match_product(search: ProductSearchIndex, name: str) -> Optional[str]:
+    """Product bought for an ingredient line, if one matches closely enough"""
+    hits = search.search(name, limit=1) if name else []
+    if hits and hits[0][0] >= MIN_MATCH_SCORE:
+        return hits[0][1]['id']
+    return None
+
+
+class RecipeCostModel:
+    """
+    Recipe costs as a matrix product
+
+    qty[r, p] is how much of product p recipe r needs, in the unit p is
+    priced in; cost = qty @ price, with lines that have no mapped product or
+    no purchase yet at the static Notion price. A line that can't be
+    expressed in the product's price unit (grams against a price per unit)
+    also keeps its Notion cost and doesn't count as live. When prices
+    change only the changed columns are re-applied instead of the whole
+    product.
+    """
+
+    def __init__(
+        self,
+        recipes: List[Dict[str, Any]],
+        lines: List[Dict[str, Any]],
+        products: List[Dict[str, Any]],
+        unit_prices: Dict[str, Dict[str, Any]]
+    ):
+        self.recipe_ids = [r['id'] for r in recipes]
+        recipe_row = {normalize_term(r['name']): i for i, r in enumerate(recipes)}
+
+        search = ProductSearchIndex()
+        for p in products:
+            search.add(p['id'], p)
+
+        mapped = {}      # normalized product name -> product_id or None
+        line_refs = []   # (recipe row, product_id or None, line)
+        for line in lines:
+            r = recipe_row.get(normalize_term(line['recipe']))
+            if r is None:
+                continue
+            # The linked pantry product when there is one, else the ingredient name
+            key = normalize_term(line['product'] or line['ingredient'])
+            if key not in mapped:
+                mapped[key] = _match_product(search, key)
+            line_refs.append((r, mapped[key], line))
+
+        self.product_ids = sorted({pid for _, pid, _ in line_refs if pid})
+        col = {pid: j for j, pid in enumerate(self.product_ids)}
+        self.units = {pid: None for pid in self.product_ids}
+
+        n_recipes, n_products = len(self.recipe_ids), len(self.product_ids)
+        self.qty = np.zeros((n_recipes, n_products))
+        self.static_lines = np.zeros((n_recipes, n_products))  # Notion cost of lines priceable on p
+        self.fixed_lines = np.zeros((n_recipes, n_products))   # Notion cost of lines in another dimension
+        self.mismatched = np.zeros((n_recipes, n_products), dtype=int)
+        self.static = np.zeros(n_recipes)                      # lines with no product at all
+        self.total_lines = np.zeros(n_recipes, dtype=int)
+        self.unmapped_lines = np.zeros(n_recipes, dtype=int)
+        self._uses = np.zeros((n_recipes, n_products), dtype=bool)
+        self._touches = np.zeros((n_recipes, n_products), dtype=bool)
+        self._column_lines: List[List[tuple]] = [[] for _ in self.product_ids]
+        for r, pid, line in line_refs:
+            self.total_lines[r] += 1
+            if pid is None:
+                self.unmapped_lines[r] += 1
+                self.static[r] += line['qty'] * line['static_unit_price']
+                continue
+            self._column_lines[col[pid]].append((r, line))
+            self._touches[r, col[pid]] = True
+
+        for j, pid in enumerate(self.product_ids):
+            self._layout(j, (unit_prices.get(pid) or {}).get('unit'))
+
+        # Start with every mapped line at its Notion price, then apply prices
+        self.prices = np.full(n_products, np.nan)
+        self.costs = self.static_lines.sum(axis=1)
+        self.priced_lines = np.zeros(n_recipes, dtype=int)
+        self.update_prices(unit_prices)
+
+    def _layout(self, j: int, unit: Optional[str]) -> None:
+        """Fill column j with its lines expressed in unit (the product's price unit)"""
+        pid = self.product_ids[j]
+        self.units[pid] = unit
+        for m in (self.qty, self.static_lines, self.fixed_lines):
+            m[:, j] = 0
+        self.mismatched[:, j] = 0
+        self._uses[:, j] = False
+        for r, line in self._column_lines[j]:
+            static_cost = line['qty'] * line['static_unit_price']
+            qty = convert_qty(line['qty'], line['unit'], unit or line['unit'])
+            if qty is None:
+                self.fixed_lines[r, j] += static_cost
+                self.mismatched[r, j] += 1
+                continue
+            self.qty[r, j] += qty
+            self.static_lines[r, j] += static_cost
+            self._uses[r, j] = True
+
+    def update_prices(self, unit_prices: Dict[str, Dict[str, Any]]) -> int:
+        """Apply new latest prices; returns how many recipes changed"""
+        new = np.array([
+            (unit_prices.get(pid) or {}).get('latest', np.nan) for pid in self.product_ids
+        ], dtype=float)
+        moved = [j for j, pid in enumerate(self.product_ids)
+                 if (unit_prices.get(pid) or {}).get('unit') not in (None, self.units[pid])]
+        changed = np.flatnonzero(~((new == self.prices) | (np.isnan(new) & np.isnan(self.prices))))
+        if moved:
+            # Priced in another unit now: re-lay those columns, recost all once
+            for j in moved:
+                self._layout(j, unit_prices[self.product_ids[j]]['unit'])
+            self.prices = new
+            self.costs = self._column_costs(np.arange(len(self.product_ids)), self.prices).sum(axis=1)
+            changed = np.union1d(changed, moved).astype(int)
+        elif not len(changed):
+            return 0
+        else:
+            # Per changed column, what each recipe pays: live price or the Notion fallback
+            old_cols = self._column_costs(changed, self.prices[changed])
+            new_cols = self._column_costs(changed, new[changed])
+            self.costs = self.costs + (new_cols - old_cols).sum(axis=1)
+            self.prices[changed] = new[changed]
+
+        self.priced_lines = (self._uses & ~np.isnan(self.prices)).sum(axis=1)
+        return int(self._touches[:, changed].any(axis=1).sum())
+
+    def _column_costs(self, cols: np.ndarray, prices: np.ndarray) -> np.ndarray:
+        live = self.qty[:, cols] * np.nan_to_num(prices, nan=0.0)
+        return np.where(np.isnan(prices)[None, :], self.static_lines[:, cols], live)
+
+    def total_costs(self) -> np.ndarray:
+        return self.costs + self.static + self.fixed_lines.sum(axis=1)
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        totals = self.total_costs()
+        out = {}
+        for i, rid in enumerate(self.recipe_ids):
+            if not self.total_lines[i]:
+                continue
+            priced = int(self.priced_lines[i])
+            products = int(self._uses[i].sum())
+            mismatched = int(self.mismatched[i].sum())
+            out[rid] = {
+                'cost': int(round(totals[i])),
+                'priced_products': priced,
+                'products': products,
+                'ingredients': int(self.total_lines[i]),
+                'source': 'live' if priced and priced == products and not self.unmapped_lines[i] and not mismatched
+                else 'partial' if priced else 'static'
+            }
+        return out
+
+
+def recipe_lines() -> Dict[str, List[Dict[str, Any]]]:
+    """Ingredient lines grouped by recipe_id, reloaded when either CSV changes"""
+    catalog = recipe_index.get_index(recipe_index.RECIPES_CSV)
+    lines_mtime = _mtime(recipe_index.INGREDIENTS_CSV)
+    cached = _LINES
+    if cached.get('catalog') is catalog and cached.get('mtime') == lines_mtime:
+        return cached['by_recipe']
+
+    ids = {normalize_term(r['name']): r['id'] for r in catalog.recipes}
+    by_recipe: Dict[str, List[Dict[str, Any]]] = {}
+    for line in load_ingredient_lines(recipe_index.INGREDIENTS_CSV):
+        rid = ids.get(normalize_term(line['recipe']))
+        if rid:
+            by_recipe.setdefault(rid, []).append(line)
+    _LINES.update({'catalog': catalog, 'mtime': lines_mtime, 'by_recipe': by_recipe})
+    return by_recipe
+
+
+def get_costs(supabase: SupabaseClient, household_id: str) -> Dict[str, Dict[str, Any]]:
+    """
+    {recipe_id: {cost, priced_products, products, ingredients, source}}
+
+    The model (recipe × product quantities) is rebuilt when the recipe or
+    ingredient CSVs change; price changes are applied incrementally.
+    Blocking: call through asyncio.to_thread from async code.
+    """
+    catalog = recipe_index.get_index(recipe_index.RECIPES_CSV)
+    matrix = price_matrix.get_matrix(supabase, household_id)
+    lines_mtime = _mtime(recipe_index.INGREDIENTS_CSV)
+
+    with _LOCK:
+        model = _MODELS.get(household_id)
+        if model is None or model.catalog is not catalog or model.lines_mtime != lines_mtime:
+            products = supabase.table('products').select('*').eq('household_id', household_id).execute().data or []
+            model = RecipeCostModel(
+                catalog.recipes,
+                load_ingredient_lines(recipe_index.INGREDIENTS_CSV),
+                products,
+                product_unit_prices(matrix)
+            )
+            model.catalog = catalog
+            model.lines_mtime = lines_mtime
+            model.matrix = matrix
+            _MODELS[household_id] = model
+            logger.info(f"Recipe cost model built for {household_id}: {len(model.recipe_ids)} recipes x {len(model.product_ids)} products")
+        elif model.matrix is not matrix:
+            changed = model.update_prices(product_unit_prices(matrix))
+            model.matrix = matrix
+            logger.info(f"Recipe costs refreshed for {household_id}: {changed} recipes changed")
+        return model.as_dict()
+
+
+def resolve_recipe_id(recipe_id: Optional[str], recipe_name: Optional[str] = None) -> Optional[str]:
+    """Catalog ID for a meal plan entry, by ID or else by name (plans saved with old IDs)"""
+    catalog = recipe_index.get_index(recipe_index.RECIPES_CSV)
+    if recipe_id and catalog.get(recipe_id):
+        return recipe_id
+    if recipe_name:
+        for recipe in catalog.search(q=recipe_name, limit=20)['items']:
+            if normalize_term(recipe['name']) == normalize_term(recipe_name):
+                return recipe['id']
+    return None
+
+
+def cost_for(costs: Dict[str, Dict[str, Any]], recipe_id: Optional[str], recipe_name: Optional[str] = None) -> Optional[int]:
+    """Live cost of a meal plan entry, None if the recipe isn't costed"""
+    if recipe_id and recipe_id in costs:
+        return costs[recipe_id]['cost']
+    resolved = resolve_recipe_id(recipe_id, recipe_name)
+    return costs[resolved]['cost'] if resolved in costs else None
+
+
+def apply_live_costs(supabase: SupabaseClient, household_id: str, meals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    meal_plans rows with recipe_cost replaced by the live cost where known
+    (the saved cost is kept as saved_cost). Falls back to the saved costs
+    if the model can't be built.
+    """
+    try:
+        costs = get_costs(supabase, household_id)
+    except Exception as e:
+        logger.warning(f"Live recipe costs unavailable for {household_id}: {e}")
+        return meals
+
+    out = []
+    for meal in meals:
+        live = cost_for(costs, meal.get('recipe_id'), meal.get('recipe_name'))
+        if live is None:
+            out.append(meal)
+        else:
+            out.append({**meal, 'saved_cost': meal.get('recipe_cost'), 'recipe_cost': live})
+    return out
+
+
+def invalidate(household_id: Optional[str] = None) -> None:
+    with _LOCK:
+        if household_id is None:
+            _MODELS.clear()
+            _LINES.clear()
+        else:
+            _MODELS.pop(household_id, None)
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
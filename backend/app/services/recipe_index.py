@@ -0,0 +1,266 @@
+from app.services.product_search import normalize_term
+from app.core.config import settings
+from pathlib import Path
+import tempfile
+import threading
+import hashlib
+import json
+import csv
+import re
+import logging
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# Bump when the parsed recipe shape changes so old snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+NOTION_DIR = Path(__file__).resolve().parents[3] / "Datos Notion" / "Extracted" / "Private & Shared" / "Bases de datos Familiares (Maestra Suprema)"
+RECIPES_CSV = NOTION_DIR / "Recetario Familiar 24088a385be780ae8514f2a7bcf9b4a2.csv"
+INGREDIENTS_CSV = NOTION_DIR / "Ingredientes de Recetas 24088a385be7808d8b39e609e0b92f0e_all.csv"
+
+_INDEX: Optional["RecipeIndex"] = None
+_LOCK = threading.Lock()
+
+
+def parse_cost(value: str) -> float:
+    if not value:
+        return 0.0
+    cleaned = re.sub(r"[^0-9\.,]", "", str(value))
+    has_dot = "." in cleaned
+    has_comma = "," in cleaned
+    if has_dot and has_comma:
+        cleaned = cleaned.replace(".", "").replace(",", ".")
+    elif has_comma and not has_dot:
+        cleaned = cleaned.replace(",", ".")
+    try:
+        return float(cleaned)
+    except Exception:
+        return 0.0
+
+
+def parse_ingredients(value: str) -> List[str]:
+    if not value:
+        return []
+
+    # Split by common separators: comma, semicolon, pipe, newline
+    raw_parts = re.split(r'[,;|\n]', str(value))
+    parts = [p.strip() for p in raw_parts if p.strip()]
+
+    result = []
+    for p in parts:
+        p = p.replace("@", "").strip()
+        result.append(p)
+    return result
+
+
+def strip_link(value: str) -> str:
+    """'Harina (Ingredientes%20de%20Recetas/Harina%20….csv)' -> 'Harina'"""
+    # Notion links are URL-encoded (no spaces) and may nest parentheses
+    return re.sub(r"\s*\(\S*\.(csv|md)\)\s*$", "", value or "").strip()
+
+
+def ingredient_key(line: str) -> str:
+    return normalize_term(strip_link(line))
+
+
+def recipe_id(name: str, meal_type: str, seen: Dict[str, int]) -> str:
+    """
+    Content-derived ID, identical across processes and restarts
+    (unlike hash(), which is salted per process)
+    """
+    base = hashlib.sha1(f"{normalize_term(name)}|{normalize_term(meal_type)}".encode("utf-8")).hexdigest()[:12]
+    seen[base] = seen.get(base, 0) + 1
+    return base if seen[base] == 1 else f"{base}-{seen[base]}"
+
+
+def parse_csv(path: Path) -> List[Dict[str, Any]]:
+    items = []
+    seen: Dict[str, int] = {}
+    with path.open("r", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            name = (row.get("Receta") or "").strip()
+            if not name:
+                continue
+            meal_type = (row.get("Tipo de comida") or "").strip()
+            ingredients_raw = (
+                row.get("Ingredientes (intermedio)") or
+                row.get("Ingredientes") or
+                row.get("Ingredients") or
+                row.get("Ingredientes (relación)") or
+                ""
+            )
+            cost_value = parse_cost(row.get("Valor receta") or row.get("Costo receta") or row.get("Costo Estimado") or row.get("Precio") or "")
+            items.append({
+                "id": row.get("ID") or recipe_id(name, meal_type, seen),
+                "name": name,
+                "meal_type": meal_type,
+                "ingredients": parse_ingredients(ingredients_raw),
+                "cost": cost_value
+            })
+    return items
+
+
+class RecipeIndex:
+    """
+    Parsed recipe catalog with inverted indexes
+
+    Recipes are kept sorted by name; by_ingredient, by_meal_type and
+    by_token map a normalized key to the set of recipe positions, so filters
+    are set intersections and pagination is a slice of the sorted result.
+    """
+
+    def __init__(
+        self,
+        recipes: List[Dict[str, Any]],
+        source_path: str = "",
+        source_mtime: float = 0.0,
+        source_hash: str = ""
+    ):
+        self.recipes = sorted(recipes, key=lambda r: normalize_term(r["name"]))
+        self.source_path = source_path
+        self.source_mtime = source_mtime
+        self.source_hash = source_hash
+        self.by_id: Dict[str, int] = {}
+        self.by_ingredient: Dict[str, set] = {}
+        self.by_meal_type: Dict[str, set] = {}
+        self.by_token: Dict[str, set] = {}
+
+        for pos, recipe in enumerate(self.recipes):
+            self.by_id[recipe["id"]] = pos
+            self.by_meal_type.setdefault(normalize_term(recipe.get("meal_type")), set()).add(pos)
+            for line in recipe.get("ingredients") or []:
+                key = ingredient_key(line)
+                if key:
+                    self.by_ingredient.setdefault(key, set()).add(pos)
+            for token in normalize_term(recipe["name"]).split():
+                self.by_token.setdefault(token, set()).add(pos)
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    def get(self, recipe_id: str) -> Optional[Dict[str, Any]]:
+        pos = self.by_id.get(recipe_id)
+        return self.recipes[pos] if pos is not None else None
+
+    def search(
+        self,
+        ingredient: Optional[str] = None,
+        meal_type: Optional[str] = None,
+        q: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 200
+    ) -> Dict[str, Any]:
+        """Recipes matching every given filter, as {total, items}"""
+        postings = []
+        if ingredient:
+            postings.append(self.by_ingredient.get(ingredient_key(ingredient), set()))
+        if meal_type:
+            postings.append(self.by_meal_type.get(normalize_term(meal_type), set()))
+        if q:
+            for token in normalize_term(q).split():
+                postings.append(self._token_prefix(token))
+
+        if postings:
+            positions = sorted(set.intersection(*sorted(postings, key=len)))
+        else:
+            positions = range(len(self.recipes))
+
+        return {
+            "total": len(positions),
+            "items": [self.recipes[pos] for pos in positions[offset:offset + limit]]
+        }
+
+    def _token_prefix(self, prefix: str) -> set:
+        # Name vocabularies are small (hundreds of tokens), a scan is fine
+        exact = self.by_token.get(prefix)
+        matched = set(exact) if exact else set()
+        for token, positions in self.by_token.items():
+            if token != prefix and token.startswith(prefix):
+                matched |= positions
+        return matched
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        return {
+            "version": SNAPSHOT_VERSION,
+            "source_path": self.source_path,
+            "source_mtime": self.source_mtime,
+            "source_hash": self.source_hash,
+            "recipes": self.recipes
+        }
+
+
+def snapshot_path() -> Path:
+    if settings.recipe_snapshot_path:
+        return Path(settings.recipe_snapshot_path)
+    return Path(tempfile.gettempdir()) / "belnafinanzas_recipes.json"
+
+
+def get_index(csv_path: Path) -> RecipeIndex:
+    """
+    Current index for csv_path
+
+    A stat() per call: unchanged mtime reuses the in-memory index. A
+    changed mtime with unchanged content (re-export, touch) only refreshes
+    the mtime; otherwise the CSV is re-parsed and the snapshot rewritten.
+    On cold start the snapshot is used when it matches the CSV.
+    """
+    global _INDEX
+    source = str(csv_path)
+    try:
+        mtime = csv_path.stat().st_mtime
+    except FileNotFoundError:
+        return RecipeIndex([])
+
+    index = _INDEX
+    if index is not None and index.source_path == source and index.source_mtime == mtime:
+        return index
+
+    with _LOCK:
+        index = _INDEX
+        if index is None or index.source_path != source:
+            index = _load_snapshot(source)
+        if index is not None and index.source_mtime == mtime:
+            _INDEX = index
+            return index
+
+        source_hash = hashlib.sha1(csv_path.read_bytes()).hexdigest()
+        if index is not None and index.source_hash == source_hash:
+            index.source_mtime = mtime
+        else:
+            index = RecipeIndex(parse_csv(csv_path), source, mtime, source_hash)
+            logger.info(f"Recipe index built: {len(index)} recipes")
+        _write_snapshot(index)
+        _INDEX = index
+        return index
+
+
+def invalidate() -> None:
+    global _INDEX
+    with _LOCK:
+        _INDEX = None
+
+
+def _load_snapshot(source: str) -> Optional[RecipeIndex]:
+    path = snapshot_path()
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != SNAPSHOT_VERSION or data.get("source_path") != source:
+            return None
+        return RecipeIndex(data["recipes"], source, data.get("source_mtime", 0.0), data.get("source_hash", ""))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable recipe snapshot {path}: {e}")
+        return None
+
+
+def _write_snapshot(index: RecipeIndex) -> None:
+    path = snapshot_path()
+    try:
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(index.to_snapshot(), ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+    except Exception as e:
+        logger.warning(f"Could not write recipe snapshot {path}: {e}")
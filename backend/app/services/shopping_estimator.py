@@ -0,0 +1,211 @@
+from supabase import Client as SupabaseClient
+from app.services import price_matrix
+from app.services.product_search import ProductSearchIndex
+from datetime import datetime, timezone
+from statistics import median
+from threading import Lock
+import logging
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# estimate_source values stored on shopping_list rows
+SOURCE_MANUAL = 'manual'                    # typed by the user, never overwritten
+SOURCE_LATEST = 'latest_price'              # most recent unit price × quantity
+SOURCE_MEDIAN = 'median_price'              # median unit price across stores × quantity
+SOURCE_PRODUCT_MANUAL = 'product_manual_price'  # products.manual_price × quantity
+
+# Units are converted within the same dimension only
+_UNIT_FACTORS = {
+    'g': ('g', 1), 'gr': ('g', 1), 'kg': ('g', 1000),
+    'ml': ('ml', 1), 'cc': ('ml', 1), 'l': ('ml', 1000), 'lt': ('ml', 1000),
+    'unit': ('unit', 1), 'unidad': ('unit', 1), 'un': ('unit', 1)
+}
+
+# Lookups derived from the cached price matrix, per household; rebuilt
+# whenever price_matrix hands back a new matrix
+_CONTEXT: Dict[str, tuple] = {}
+_CONTEXT_LOCK = Lock()
+
+
+def unit_dimension(unit: Optional[str]) -> Optional[str]:
+    """'g', 'ml' or 'unit' (None for units we don't know)"""
+    factor = _UNIT_FACTORS.get((unit or '').strip().lower())
+    return factor[0] if factor else None
+
+
+def convert_qty(qty: float, from_unit: Optional[str], to_unit: Optional[str]) -> Optional[float]:
+    """
+    Quantity expressed in to_unit, or None when the units don't measure the
+    same thing (grams against a price per unit): a wrong estimate is worse
+    than none
+    """
+    src_name, dst_name = (from_unit or '').strip().lower(), (to_unit or '').strip().lower()
+    if src_name == dst_name:
+        return qty
+    src, dst = _UNIT_FACTORS.get(src_name), _UNIT_FACTORS.get(dst_name)
+    if not src or not dst or src[0] != dst[0]:
+        return None
+    return qty * src[1] / dst[1]
+
+
+def product_unit_prices(matrix: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """{product_id: {unit, latest, median}} collapsed across stores"""
+    out = {}
+    for product in matrix['products']:
+        cells = list(product['prices'].values())
+        if not cells:
+            continue
+        newest = max(cells, key=lambda c: str(c.get('last_date') or ''))
+        out[product['product_id']] = {
+            'unit': product.get('unit'),
+            'latest': newest['latest'],
+            'median': median(c['median'] for c in cells)
+        }
+    return out
+
+
+def estimate_items(
+    items: List[Dict[str, Any]],
+    products: List[Dict[str, Any]],
+    unit_prices: Dict[str, Dict[str, Any]],
+    basis: str = 'median',
+    index: Optional[ProductSearchIndex] = None
+) -> List[Dict[str, Any]]:
+    """
+    Fill estimated_cost on shopping_list rows (pure, no I/O)
+
+    Each item resolves to a product by product_id, else by fuzzy name
+    match; its cost is the product's median (or latest) unit price times
+    quantity, falling back to the product's manual_price. Rows whose
+    estimate_source is 'manual' are left alone, and so are rows whose unit
+    can't be converted to the price's unit (a stale automatic estimate on
+    them is cleared). Returns only the rows whose estimate changed.
+    """
+    products_by_id = {p['id']: p for p in products}
+    if index is None:
+        index = ProductSearchIndex()
+        for p in products:
+            index.add(p['id'], p)
+
+    now = datetime.now(timezone.utc).isoformat()
+    changed = []
+    for item in items:
+        if item.get('estimate_source') == SOURCE_MANUAL:
+            continue
+
+        product_id = item.get('product_id')
+        if product_id not in products_by_id:
+            match = index.best(item.get('name') or '')
+            product_id = match['id'] if match else None
+        if not product_id:
+            continue
+
+        qty = float(item.get('quantity') or 1)
+        priced = unit_prices.get(product_id)
+        product = products_by_id.get(product_id) or {}
+        if priced:
+            unit_price = priced['latest'] if basis == 'latest' else priced['median']
+            priced_qty = convert_qty(qty, item.get('unit') or priced['unit'], priced['unit'])
+            source = SOURCE_LATEST if basis == 'latest' else SOURCE_MEDIAN
+        elif product.get('manual_price') is not None:
+            manual_unit = product.get('manual_unit')
+            unit_price = float(product['manual_price'])
+            priced_qty = convert_qty(qty, item.get('unit') or manual_unit, manual_unit)
+            source = SOURCE_PRODUCT_MANUAL
+        else:
+            continue
+
+        if priced_qty is None:
+            logger.debug(f"Shopping item {item.get('id')}: unit {item.get('unit')} not comparable with the price unit")
+            if item.get('estimated_cost') is None:
+                continue
+            cost, source = None, None
+        else:
+            cost = int(round(unit_price * priced_qty))
+        if (cost == item.get('estimated_cost') and source == item.get('estimate_source')
+                and product_id == item.get('product_id')):
+            continue
+        changed.append({
+            **item,
+            'product_id': product_id,
+            'estimated_cost': cost,
+            'estimate_source': source,
+            'estimated_at': now
+        })
+    return changed
+
+
+def estimate_month(
+    supabase: SupabaseClient,
+    household_id: str,
+    month: str,
+    item_ids: Optional[List[str]] = None,
+    basis: str = 'median'
+) -> int:
+    """
+    Re-estimate a month's list (or just item_ids) and write changes back in
+    a single upsert. Returns the number of rows updated.
+    """
+    query = supabase.table('shopping_list').select('*')\
+        .eq('household_id', household_id).eq('month', month)
+    if item_ids:
+        query = query.in_('id', item_ids)
+    items = query.execute().data or []
+    if not items:
+        return 0
+
+    products = supabase.table('products').select('*').eq('household_id', household_id).execute().data or []
+    unit_prices = product_unit_prices(price_matrix.get_matrix(supabase, household_id))
+
+    changed = estimate_items(items, products, unit_prices, basis=basis)
+    if changed:
+        supabase.table('shopping_list').upsert(changed).execute()
+    return len(changed)
+
+
+def _matrix_context(supabase: SupabaseClient, household_id: str) -> tuple:
+    """(products, search index, unit prices) over the priced products of the cached matrix"""
+    matrix = price_matrix.get_matrix(supabase, household_id)
+    with _CONTEXT_LOCK:
+        cached = _CONTEXT.get(household_id)
+        if cached and cached[0] is matrix:
+            return cached[1:]
+        products = [{'id': p['product_id'], 'name_norm': p['name']} for p in matrix['products']]
+        index = ProductSearchIndex()
+        for p in products:
+            index.add(p['id'], p)
+        context = (matrix, products, index, product_unit_prices(matrix))
+        _CONTEXT[household_id] = context
+        return context[1:]
+
+
+def estimate_new_item(supabase: SupabaseClient, household_id: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Estimate a row about to be inserted (returns it unchanged if nothing matched)
+
+    Names are matched against the priced products of the cached matrix, so
+    an insert costs the matrix's version check; only a product_id with no
+    prices (manual_price) is read. The nightly estimate covers the rest.
+    """
+    products, index, unit_prices = _matrix_context(supabase, household_id)
+    product_id = item.get('product_id')
+    if product_id and product_id not in unit_prices:
+        products = products + (supabase.table('products').select('*')
+                               .eq('household_id', household_id).eq('id', product_id).execute().data or [])
+    changed = estimate_items([item], products, unit_prices, index=index)
+    return changed[0] if changed else item
+
+
+def estimate_all(supabase: SupabaseClient, month: Optional[str] = None) -> Dict[str, Any]:
+    """Nightly batch: refresh every household's list for the month"""
+    target_month = month or datetime.now().strftime('%Y-%m')
+    households = supabase.table('households').select('id').execute().data or []
+    summary = {}
+    for hh in households:
+        try:
+            summary[hh['id']] = estimate_month(supabase, hh['id'], target_month)
+        except Exception as e:
+            logger.error(f"Shopping list estimate failed for household {hh['id']}: {e}")
+            summary[hh['id']] = {'error': str(e)}
+    return summary
@@ -0,0 +1,189 @@
+from supabase import Client as SupabaseClient
+from app.services import recipe_costing, recipe_index, price_matrix
+from app.services.product_search import ProductSearchIndex, normalize_term
+from app.services.shopping_estimator import estimate_items, product_unit_prices, unit_dimension, convert_qty, SOURCE_MANUAL
+from datetime import date, timedelta
+import uuid
+import logging
+from typing import Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# shopping_list.origin of rows written by the generator; rows without it
+# were added by hand and are never touched
+ORIGIN_MEAL_PLAN = 'meal_plan'
+
+# Set on every upserted row: a bulk upsert writes the union of the rows'
+# columns, so a key missing from one row would be written as NULL
+_ESTIMATE_FIELDS = ('estimated_cost', 'estimate_source', 'estimated_at')
+
+
+def week_of_month(day: str) -> Tuple[str, int]:
+    """'2026-03-09' -> ('2026-03', 2), same weeks as the shopping list UI"""
+    d = date.fromisoformat(day[:10])
+    return d.strftime('%Y-%m'), (d.day - 1) // 7 + 1
+
+
+def month_bounds(start_date: str, end_date: str) -> Tuple[str, str]:
+    """The range widened to whole months: generated rows are kept per month"""
+    start = date.fromisoformat(start_date[:10]).replace(day=1)
+    end = date.fromisoformat(end_date[:10])
+    next_month = (end.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start.isoformat(), (next_month - timedelta(days=1)).isoformat()
+
+
+def aggregate(meals: List[Dict[str, Any]], lines_by_recipe: Dict[str, List[Dict[str, Any]]]) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+    """
+    Ingredient needs per (month, product key, unit) and week (pure, no I/O)
+
+    Returns {(month, key, unit): {name, unit, weeks: {week: qty}}}.
+    Quantities are summed within a dimension only, in its base unit
+    (kg and g add up as g; g and units stay separate rows). Meals whose
+    recipe has no ingredient lines fall back to the catalog's ingredient
+    names, without a quantity; those are dropped when the product is
+    already needed with one.
+    """
+    needs: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    catalog = recipe_index.get_index(recipe_index.RECIPES_CSV)
+    for meal in meals:
+        rid = recipe_costing.resolve_recipe_id(meal.get('recipe_id'), meal.get('recipe_name'))
+        if not rid:
+            continue
+        month, week = week_of_month(meal['date'])
+        lines = lines_by_recipe.get(rid)
+        if lines is None:
+            recipe = catalog.get(rid) or {}
+            lines = [{'product': recipe_index.strip_link(name), 'qty': 0, 'unit': None}
+                     for name in recipe.get('ingredients') or []]
+
+        for line in lines:
+            name = line.get('product') or line.get('ingredient')
+            key = normalize_term(name)
+            if not key:
+                continue
+            unit = unit_dimension(line.get('unit')) or line.get('unit') or ''
+            qty = convert_qty(line.get('qty') or 0, line.get('unit'), unit) if unit else line.get('qty') or 0
+            need = needs.setdefault((month, key, unit), {'name': name, 'unit': unit or None, 'weeks': {}})
+            need['weeks'][week] = need['weeks'].get(week, 0) + qty
+
+    quantified = {(month, key) for (month, key, _), need in needs.items() if any(need['weeks'].values())}
+    return {
+        (month, key, unit): need for (month, key, unit), need in needs.items()
+        if any(need['weeks'].values()) or (month, key) not in quantified
+    }
+
+
+def to_rows(needs: Dict[Tuple[str, str, str], Dict[str, Any]], household_id: str) -> List[Dict[str, Any]]:
+    """
+    shopping_list rows for the aggregated needs
+
+    A product needed in a single week is a monthly item; otherwise weeks
+    with the same quantity share one weekly row (the list repeats a weekly
+    row in each of its weeks).
+    """
+    rows = []
+    for (month, _, _), need in sorted(needs.items()):
+        by_qty: Dict[float, List[int]] = {}
+        for week, qty in sorted(need['weeks'].items()):
+            by_qty.setdefault(round(qty, 3), []).append(week)
+        for qty, weeks in by_qty.items():
+            single = len(need['weeks']) == 1
+            rows.append({
+                'household_id': household_id,
+                'month': month,
+                'name': need['name'],
+                'quantity': qty or None,
+                'unit': need['unit'] if qty else None,
+                'bucket': 'monthly' if single else 'weekly',
+                'weeks': [] if single else weeks,
+                'is_checked': False,
+                'origin': ORIGIN_MEAL_PLAN
+            })
+    return rows
+
+
+def generate(supabase: SupabaseClient, household_id: str, start_date: str, end_date: str) -> Dict[str, Any]:
+    """
+    Build the shopping list for the meal plan between two dates (blocking)
+
+    The range is widened to whole months, since list rows belong to a
+    month. Regenerating keeps the id (and checked state) of matching generated
+    rows, and a cost typed by the user along with their quantity, and
+    removes generated rows no longer needed; hand-added rows for
+    the same product are left as they are and the product is skipped.
+    Writes are one upsert and at most one delete.
+    """
+    start_date, end_date = month_bounds(start_date, end_date)
+    meals = supabase.table('meal_plans').select('*')\
+        .eq('household_id', household_id)\
+        .gte('date', start_date)\
+        .lte('date', end_date)\
+        .execute().data or []
+    rows = to_rows(aggregate(meals, recipe_costing.recipe_lines()), household_id)
+    months = sorted({r['month'] for r in rows} | {start_date[:7], end_date[:7]})
+
+    existing = supabase.table('shopping_list').select('*')\
+        .eq('household_id', household_id)\
+        .in_('month', months)\
+        .execute().data or []
+    products = supabase.table('products').select('*').eq('household_id', household_id).execute().data or []
+
+    # Resolve products once per name and price through the estimator
+    index = ProductSearchIndex()
+    for p in products:
+        index.add(p['id'], p)
+    matched = {}
+    for row in rows:
+        key = normalize_term(row['name'])
+        if key not in matched:
+            match = index.best(row['name'])
+            matched[key] = match['id'] if match else None
+        row['product_id'] = matched[key]
+
+    manual = {
+        (r.get('month'), r.get('product_id') or normalize_term(r.get('name')))
+        for r in existing if r.get('origin') != ORIGIN_MEAL_PLAN
+    }
+    generated = {
+        (r.get('month'), normalize_term(r.get('name')), tuple(r.get('weeks') or []), r.get('unit')): r
+        for r in existing if r.get('origin') == ORIGIN_MEAL_PLAN
+    }
+
+    upserts, skipped = [], []
+    for row in rows:
+        if (row['month'], row['product_id'] or normalize_term(row['name'])) in manual:
+            if row['name'] not in skipped:
+                skipped.append(row['name'])
+            continue
+        previous = generated.pop((row['month'], normalize_term(row['name']), tuple(row['weeks']), row['unit']), None)
+        if previous:
+            row['id'] = previous['id']
+            row['is_checked'] = previous.get('is_checked', False)
+            if previous.get('estimate_source') == SOURCE_MANUAL:
+                row['quantity'] = previous.get('quantity')
+                row.update({field: previous.get(field) for field in _ESTIMATE_FIELDS})
+        else:
+            row['id'] = str(uuid.uuid4())
+        upserts.append(row)
+
+    unit_prices = product_unit_prices(price_matrix.get_matrix(supabase, household_id))
+    to_estimate = [r for r in upserts if r.get('estimate_source') != SOURCE_MANUAL]
+    estimates = {r['id']: r for r in estimate_items(to_estimate, products, unit_prices, index=index)}
+    upserts = [{**dict.fromkeys(_ESTIMATE_FIELDS), **estimates.get(r['id'], r)} for r in upserts]
+
+    # Stale generated rows: the meal was removed or changed
+    stale = [r['id'] for r in generated.values() if not r.get('is_checked')]
+    if upserts:
+        supabase.table('shopping_list').upsert(upserts).execute()
+    if stale:
+        supabase.table('shopping_list').delete().eq('household_id', household_id).in_('id', stale).execute()
+
+    logger.info(f"Shopping list generated for {household_id} {start_date}..{end_date}: "
+                f"{len(upserts)} rows from {len(meals)} meals, {len(stale)} removed")
+    return {
+        'meals': len(meals),
+        'items': len(upserts),
+        'removed': len(stale),
+        'skipped': skipped,
+        'estimated_total': sum((r.get('estimated_cost') or 0) * max(len(r.get('weeks') or []), 1) for r in upserts)
+    }
@@ -0,0 +1,156 @@
+from collections import deque
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Optional, Dict, Any, Hashable
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class _Outgoing:
+    __slots__ = ('method', 'kwargs', 'progress', 'future', 'attempts')
+
+    def __init__(self, method: str, kwargs: Dict[str, Any], progress: bool, future: asyncio.Future):
+        self.method = method
+        self.kwargs = kwargs
+        self.progress = progress
+        self.future = future
+        self.attempts = 0
+
+
+class _Chat:
+    __slots__ = ('queue', 'task', 'next_at', 'progress_id', 'inflight')
+
+    def __init__(self):
+        self.queue: deque = deque()
+        self.task: Optional[asyncio.Task] = None
+        self.next_at = 0.0
+        self.progress_id: Optional[int] = None
+        self.inflight: Optional[_Outgoing] = None
+
+
+class TelegramOutbox:
+    """
+    Outbound Bot API calls, paced to stay under Telegram's flood limits
+
+    Calls for a chat go out in order, at most one per `chat_interval`
+    seconds; across chats at most `rate_per_second`. A 429 puts the call
+    back at the head of its chat and waits the `retry_after` Telegram asked
+    for (up to `max_retries` times).
+
+    Progress messages ("Subiendo...", "Procesando...") are coalesced: one
+    still waiting to go out is replaced by the next, and once sent the
+    next progress message edits it instead of adding another. Any other
+    message ends the run. Calls never raise; failures resolve to None.
+    """
+
+    def __init__(self, bot, rate_per_second: float = 25.0, chat_interval: float = 1.0, max_retries: int = 3):
+        self.bot = bot
+        self.global_interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._chats: Dict[Hashable, _Chat] = {}
+        self._next_global = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {'sent': 0, 'edited': 0, 'coalesced': 0, 'retried': 0, 'failed': 0}
+
+    def __len__(self) -> int:
+        return sum(len(chat.queue) for chat in self._chats.values())
+
+    def submit(self, chat_id: Hashable, method: str, kwargs: Dict[str, Any], progress: bool = False) -> asyncio.Future:
+        """Queue bot.<method>(**kwargs); the future resolves to its result"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Event loop changed (e.g. test clients): old tasks are gone
+            self._loop = loop
+            self._chats.clear()
+            self._next_global = 0.0
+
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat()
+
+        if progress and chat.queue and chat.queue[-1].progress and chat.queue[-1] is not chat.inflight:
+            # Superseded before it went out
+            chat.queue[-1].kwargs = kwargs
+            self.stats['coalesced'] += 1
+            return chat.queue[-1].future
+
+        item = _Outgoing(method, kwargs, progress, loop.create_future())
+        chat.queue.append(item)
+        if chat.task is None or chat.task.done():
+            chat.task = asyncio.create_task(self._drain(chat_id, chat))
+        return item.future
+
+    async def join(self) -> None:
+        """Wait until every queued call went out (tests, graceful shutdown)"""
+        tasks = [chat.task for chat in self._chats.values() if chat.task and not chat.task.done()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _slot(self, chat: _Chat) -> float:
+        """Seconds to wait before this chat may call; reserves the slot"""
+        now = self._loop.time()
+        at = max(now, chat.next_at, self._next_global)
+        self._next_global = at + self.global_interval
+        chat.next_at = at + self.chat_interval
+        return at - now
+
+    async def _drain(self, chat_id: Hashable, chat: _Chat) -> None:
+        while chat.queue:
+            delay = self._slot(chat)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # A busy loop wakes late: pace the next call from the real send time
+            sent_at = self._loop.time()
+            chat.next_at = max(chat.next_at, sent_at + self.chat_interval)
+            self._next_global = max(self._next_global, sent_at + self.global_interval)
+            item = chat.queue[0]
+            method, kwargs = item.method, item.kwargs
+            if item.progress and chat.progress_id is not None:
+                method, kwargs = 'edit_message_text', dict(kwargs, message_id=chat.progress_id)
+
+            chat.inflight = item
+            try:
+                result = await getattr(self.bot, method)(**kwargs)
+            except RetryAfter as e:
+                chat.inflight = None
+                item.attempts += 1
+                wait = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else float(e.retry_after)
+                chat.next_at = self._loop.time() + wait
+                if item.attempts <= self.max_retries:
+                    self.stats['retried'] += 1
+                    logger.warning(f"Telegram flood limit on chat {chat_id}, retrying in {wait}s")
+                    continue
+                self._finish(chat, item, None)
+                self.stats['failed'] += 1
+                logger.error(f"Telegram {method} to {chat_id} dropped after {item.attempts} flood limits")
+                continue
+            except Exception as e:
+                chat.inflight = None
+                if method != item.method and "not modified" not in str(e).lower():
+                    # Progress message gone: send a fresh one
+                    chat.progress_id = None
+                    continue
+                self._finish(chat, item, None)
+                self.stats['failed'] += 1
+                logger.error(f"Failed Telegram {method} to {chat_id}: {e}")
+                continue
+
+            chat.inflight = None
+            if method == 'send_message':
+                self.stats['sent'] += 1
+                chat.progress_id = getattr(result, 'message_id', None) if item.progress else None
+            else:
+                self.stats['edited'] += 1
+            self._finish(chat, item, result)
+
+        if chat.progress_id is None and self._chats.get(chat_id) is chat:
+            del self._chats[chat_id]
+
+    def _finish(self, chat: _Chat, item: _Outgoing, result: Any) -> None:
+        chat.queue.popleft()
+        if not item.future.done():
+            item.future.set_result(result)
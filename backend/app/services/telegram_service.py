@@ -1,6 +1,7 @@
 from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application
 from app.core.config import settings
+from app.services.telegram_outbox import TelegramOutbox
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,8 +12,10 @@ class TelegramService:
     """
     _instance = None
     
-    def __init__(self):
-        if not settings.telegram_bot_token or "reemplazar" in settings.telegram_bot_token:
+    def __init__(self, bot: Bot = None):
+        if bot is not None:
+            self.bot = bot
+        elif not settings.telegram_bot_token or "reemplazar" in settings.telegram_bot_token:
             logger.warning("Telegram token not configured")
             self.bot = None
         else:
@@ -21,6 +24,13 @@ class TelegramService:
             except Exception as e:
                 logger.error(f"Failed to initialize Telegram Bot: {e}")
                 self.bot = None
+        # Sends and edits go through the outbox so handlers and alert runs
+        # can't trip Telegram's flood limits
+        self.outbox = TelegramOutbox(
+            self.bot,
+            rate_per_second=settings.telegram_rate_per_second,
+            chat_interval=settings.telegram_chat_interval
+        )
 
     @classmethod
     def get_instance(cls):
@@ -28,39 +38,37 @@ class TelegramService:
             cls._instance = cls()
         return cls._instance
 
-    async def send_message(self, chat_id: int, text: str, parse_mode: str = "HTML", reply_markup = None):
-        """Send a text message"""
+    async def send_message(self, chat_id: int, text: str, parse_mode: str = "HTML", reply_markup = None, progress: bool = False):
+        """
+        Send a text message. Progress messages ("Procesando...") don't wait
+        for delivery and consecutive ones collapse into edits of one message.
+        """
         if not self.bot:
             logger.warning("Bot attempting to send message but token not set")
             return
             
-        try:
-            return await self.bot.send_message(
-                chat_id=chat_id, 
-                text=text, 
-                parse_mode=parse_mode,
-                reply_markup=reply_markup
-            )
-        except Exception as e:
-            logger.error(f"Failed to send Telegram message: {e}")
+        sent = self.outbox.submit(chat_id, 'send_message', {
+            'chat_id': chat_id,
+            'text': text,
+            'parse_mode': parse_mode,
+            'reply_markup': reply_markup
+        }, progress=progress)
+        if progress:
             return None
+        return await sent
 
     async def edit_message(self, chat_id: int, message_id: int, text: str, parse_mode: str = "HTML", reply_markup = None):
         """Edit an existing message"""
         if not self.bot:
             return
             
-        try:
-            return await self.bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text=text,
-                parse_mode=parse_mode,
-                reply_markup=reply_markup
-            )
-        except Exception as e:
-            logger.error(f"Failed to edit Telegram message: {e}")
-            return None
+        return await self.outbox.submit(chat_id, 'edit_message_text', {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'text': text,
+            'parse_mode': parse_mode,
+            'reply_markup': reply_markup
+        })
 
     async def get_file_url(self, file_id: str) -> str:
         """Get full URL for a file (photo)"""
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, Any, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class UserCache:
+    """
+    telegram_user_id -> linked user doc (or None when unlinked), with a TTL
+
+    Unlinked lookups expire sooner since linking can happen elsewhere;
+    /start linking invalidates its entry right away.
+    """
+
+    def __init__(self, ttl: float = 300, negative_ttl: float = 30, max_size: int = 5000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, telegram_id: Hashable) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(found, user doc); found is False when missing or expired"""
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(telegram_id, None)
+            self.stats['misses'] += 1
+            return False, None
+        self._entries.move_to_end(telegram_id)
+        self.stats['hits'] += 1
+        return True, entry[1]
+
+    def put(self, telegram_id: Hashable, user: Optional[Dict[str, Any]]) -> None:
+        ttl = self.ttl if user else self.negative_ttl
+        self._entries[telegram_id] = (time.monotonic() + ttl, user)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id: Optional[Hashable] = None) -> None:
+        if telegram_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(telegram_id, None)
+
+
+class ConversationStore:
+    """
+    Per-user conversation state (users.waiting_for) kept in process
+
+    Reads are local once a user's state is known (seeded from the user doc
+    fetched for the user cache). Writes are local at once and persisted
+    write-behind: changed users are flushed to Firestore together after
+    `flush_delay` seconds, so the doc survives restarts without a write on
+    the message path. A failed flush keeps the user dirty for the next one.
+    """
+
+    def __init__(self, flush_delay: float = 1.0):
+        self.flush_delay = flush_delay
+        self._state: Dict[Hashable, Any] = {}
+        self._dirty: set = set()
+        self._db = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    def known(self, user_id: Hashable) -> bool:
+        return user_id in self._state
+
+    def get(self, user_id: Hashable) -> Optional[Dict[str, Any]]:
+        return self._state.get(user_id)
+
+    def seed(self, user_id: Hashable, value: Optional[Dict[str, Any]]) -> None:
+        """State read from Firestore; ignored once the user is known locally"""
+        self._state.setdefault(user_id, value)
+
+    def set(self, db, user_id: Hashable, value: Optional[Dict[str, Any]]) -> None:
+        self._state[user_id] = value
+        self._dirty.add(user_id)
+        self._db = db
+        flusher = self._flusher
+        if flusher is None or flusher.done() or flusher.get_loop() is not asyncio.get_running_loop():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    def clear(self, db, user_id: Hashable) -> None:
+        if self.get(user_id) is not None:
+            self.set(db, user_id, None)
+
+    async def _flush_later(self) -> None:
+        # Keep going while writes land during a flush; stop if Firestore
+        # rejects everything (the next set() retries)
+        while self._dirty:
+            await asyncio.sleep(self.flush_delay)
+            if not await self.flush():
+                break
+
+    async def flush(self) -> int:
+        """Write every changed user's state; returns how many were written"""
+        if not self._dirty or self._db is None:
+            return 0
+        batch = {user_id: self._state.get(user_id) for user_id in self._dirty}
+        self._dirty.clear()
+        db = self._db
+
+        def write():
+            failed = []
+            for user_id, value in batch.items():
+                try:
+                    db.collection('users').document(user_id).update({'waiting_for': value})
+                except Exception as e:
+                    logger.error(f"Failed to persist waiting_for for {user_id}: {e}")
+                    failed.append(user_id)
+            return failed
+
+        failed = await asyncio.to_thread(write)
+        self._dirty.update(failed)
+        return len(batch) - len(failed)
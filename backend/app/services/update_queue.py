@@ -0,0 +1,111 @@
+from collections import OrderedDict, deque
+import asyncio
+import logging
+from typing import Optional, Dict, Any, Callable, Awaitable, Hashable
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class UpdateQueue:
+    """
+    Bounded worker pool for webhook updates with per-key ordering
+
+    Jobs sharing a key (a Telegram chat) run one at a time in arrival
+    order; different keys run concurrently on up to `workers` tasks. A key
+    is on the ready queue at most once, and only the worker that took it
+    puts it back, so a chat's jobs never overlap. Update IDs seen recently
+    are remembered so redeliveries are dropped.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 1000, seen_size: int = 10000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.seen_size = seen_size
+        self._seen: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._pending: Dict[Hashable, deque] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: list = []
+        self._size = 0
+        self.stats = {'accepted': 0, 'duplicates': 0, 'rejected': 0, 'done': 0, 'failed': 0}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def seen(self, update_id: Hashable) -> bool:
+        return update_id in self._seen
+
+    def submit(self, update_id: Hashable, key: Hashable, job: Job) -> bool:
+        """
+        Queue job unless update_id was already seen. Returns False for
+        duplicates; raises QueueFull when max_pending jobs are waiting.
+        """
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            self.stats['duplicates'] += 1
+            return False
+        if self._size >= self.max_pending:
+            self.stats['rejected'] += 1
+            raise asyncio.QueueFull()
+
+        self._ensure_started()
+        self._seen[update_id] = None
+        while len(self._seen) > self.seen_size:
+            self._seen.popitem(last=False)
+
+        self._size += 1
+        self.stats['accepted'] += 1
+        jobs = self._pending.get(key)
+        if jobs is None:
+            self._pending[key] = deque([job])
+            self._ready.put_nowait(key)
+        else:
+            jobs.append(job)
+        return True
+
+    async def join(self) -> None:
+        """Wait until every queued job has run (tests, graceful shutdown)"""
+        if self._ready is not None:
+            await self._ready.join()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._ready = None
+        self._loop = None
+        self._pending.clear()
+        self._size = 0
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._tasks and self._loop is loop:
+            return
+        # First submit, or the event loop changed (e.g. test clients)
+        self._loop = loop
+        self._ready = asyncio.Queue()
+        self._pending.clear()
+        self._size = 0
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            key = await self._ready.get()
+            jobs = self._pending[key]
+            job = jobs.popleft()
+            try:
+                await job()
+                self.stats['done'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"Update worker {n} failed on {key}: {e}")
+            finally:
+                self._size -= 1
+                if jobs:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                self._ready.task_done()
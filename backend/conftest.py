@@ -0,0 +1,212 @@
+"""
+Shared pytest fixtures
+
+Settings() requires these variables at import time; tests never talk to
+Firebase, Gemini or Telegram, so placeholders are enough.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+for _key, _value in {
+    "FIREBASE_PROJECT_ID": "test-project",
+    "FIREBASE_STORAGE_BUCKET": "test-project.appspot.com",
+    "GOOGLE_APPLICATION_CREDENTIALS": "service-account-key.json",
+    "GEMINI_API_KEY": "test-key",
+    "TELEGRAM_BOT_TOKEN": "reemplazar",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+
+class _Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = len(data) if count is None else count
+
+
+class FakeQuery:
+    """Minimal PostgREST query builder over in-memory rows"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table_name = table
+        self.filters = []
+        self.order_key = None
+        self.order_desc = False
+        self.limit_n = None
+        self.offset = 0
+        self.op = "select"
+        self.payload = None
+        self.on_conflict = None
+
+    # --- builders -------------------------------------------------------
+    def select(self, *args, **kwargs):
+        return self
+
+    def eq(self, col, value):
+        self.filters.append(lambda r: r.get(col) == value)
+        return self
+
+    def neq(self, col, value):
+        self.filters.append(lambda r: r.get(col) != value)
+        return self
+
+    def in_(self, col, values):
+        values = set(values)
+        self.filters.append(lambda r: r.get(col) in values)
+        return self
+
+    def is_(self, col, value):
+        expected = None if value in (None, "null") else value
+        self.filters.append(lambda r: r.get(col) is expected if expected is None else r.get(col) == expected)
+        return self
+
+    def gte(self, col, value):
+        self.filters.append(lambda r: r.get(col) is not None and r.get(col) >= value)
+        return self
+
+    def lte(self, col, value):
+        self.filters.append(lambda r: r.get(col) is not None and r.get(col) <= value)
+        return self
+
+    def order(self, col, desc=False):
+        self.order_key, self.order_desc = col, desc
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        self.offset, self.limit_n = start, end - start + 1
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.op, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    # --- execution ------------------------------------------------------
+    def _matches(self, row):
+        return all(f(row) for f in self.filters)
+
+    def execute(self):
+        self.client.calls.append((self.table_name, self.op))
+        rows = self.client.tables.setdefault(self.table_name, [])
+
+        if self.op in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            if self.on_conflict:
+                keys = [k.strip() for k in self.on_conflict.split(",")]
+            else:
+                keys = ["id"] if self.op == "upsert" else None
+            for item in payload:
+                item = dict(item)
+                if keys:
+                    existing = next((r for r in rows if all(r.get(k) == item.get(k) for k in keys)), None)
+                    if existing is not None:
+                        existing.update(item)
+                        continue
+                item.setdefault("id", f"{self.table_name}-{len(rows) + 1}")
+                rows.append(item)
+            return _Response(payload)
+
+        matched = [r for r in rows if self._matches(r)]
+        if self.op == "update":
+            for r in matched:
+                r.update(self.payload)
+            return _Response(matched)
+        if self.op == "delete":
+            self.client.tables[self.table_name] = [r for r in rows if not self._matches(r)]
+            return _Response(matched)
+
+        if self.order_key:
+            matched.sort(key=lambda r: (r.get(self.order_key) is None, r.get(self.order_key)), reverse=self.order_desc)
+        count = len(matched)
+        matched = matched[self.offset:]
+        if self.limit_n is not None:
+            matched = matched[:self.limit_n]
+        return _Response([dict(r) for r in matched], count)
+
+
+class FakeSupabase:
+    """Records every executed query in .calls as (table, operation)"""
+
+    def __init__(self, tables=None):
+        self.tables = {name: [dict(r) for r in rows] for name, rows in (tables or {}).items()}
+        self.calls = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        """SQL functions are not emulated: behave like one that isn't deployed"""
+        raise Exception(f"Could not find the function public.{name}")
+
+
+@pytest.fixture
+def fake_supabase():
+    return FakeSupabase
+
+
+class StubBotAPI:
+    """
+    Local stand-in for the Telegram Bot API (the Bot methods we call)
+
+    Records every call in .calls as (method, chat_id, text, loop time) and
+    enforces Telegram's per-chat flood limit: a chat called again within
+    `chat_interval` seconds gets a 429 (RetryAfter) instead.
+    """
+
+    def __init__(self, chat_interval=0.0, retry_after=1):
+        self.chat_interval = chat_interval
+        self.retry_after = retry_after
+        self.calls = []
+        self.rejected = []
+        self.messages = {}
+        self._last = {}
+
+    def _accept(self, method, chat_id, text):
+        now = asyncio.get_running_loop().time()
+        last = self._last.get(chat_id)
+        if last is not None and now - last < self.chat_interval:
+            self.rejected.append((method, chat_id, text, now))
+            raise RetryAfter(self.retry_after)
+        self._last[chat_id] = now
+        self.calls.append((method, chat_id, text, now))
+
+    async def send_message(self, chat_id, text, parse_mode=None, reply_markup=None):
+        self._accept('send_message', chat_id, text)
+        message_id = len(self.messages) + 1
+        self.messages[message_id] = text
+        return SimpleNamespace(message_id=message_id, chat_id=chat_id, text=text)
+
+    async def edit_message_text(self, chat_id, message_id, text, parse_mode=None, reply_markup=None):
+        if message_id not in self.messages:
+            raise BadRequest("Message to edit not found")
+        self._accept('edit_message_text', chat_id, text)
+        self.messages[message_id] = text
+        return SimpleNamespace(message_id=message_id, chat_id=chat_id, text=text)
+
+
+@pytest.fixture
+def stub_bot():
+    return StubBotAPI
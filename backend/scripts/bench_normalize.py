@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark name normalization over the product names in the Notion exports.
+
+Compares the old per-call regex pipeline with the memoized
+name_normalizer functions (cold and warm cache) and the batch API.
+
+    python scripts/bench_normalize.py [--repeat 20]
+"""
+import sys
+import os
+import re
+import csv
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.services import name_normalizer
+
+# Same folder as app.services.recipe_index.NOTION_DIR, without importing it
+# (that pulls in the settings, which need the production environment)
+NOTION_DIR = Path(__file__).resolve().parents[2] / "Datos Notion" / "Extracted" / "Private & Shared" / "Bases de datos Familiares (Maestra Suprema)"
+
+# Columns that hold product names across the exports
+NAME_COLUMNS = ["Producto", "Nombre", "Name", "Item", "Producto de despensa", "Producto de la boleta", "Producto (Maestra)"]
+
+
+def legacy_normalize_name(name: str) -> str:
+    """The pipeline previously duplicated in ProductMatcher and catalog"""
+    name = re.sub(r'(?i)\b(?:COD|SKU|PLU|INT)\b.*?(?=\s|$)', '', name or '')
+    name = re.sub(r'\(\s*\d+[\s\d]*\)', '', name)
+    name = re.sub(r'\b\d{4,}\b', '', name)
+    name = " ".join(name.split())
+    name = name.title()
+    name = re.sub(r'[^A-Za-z0-9\sáéíóúÁÉÍÓÚñÑ\%\.-]', '', name)
+    return name.strip()
+
+
+def load_names(root: Path) -> list:
+    names = []
+    for path in sorted(root.rglob("*.csv")):
+        with path.open("r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            columns = [c for c in (reader.fieldnames or []) if c in NAME_COLUMNS]
+            if not columns:
+                continue
+            for row in reader:
+                for col in columns:
+                    value = (row.get(col) or "").strip()
+                    if value:
+                        names.append(value)
+    return names
+
+
+def timed(label: str, fn, repeat: int, total: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - start
+    per_name = elapsed / (repeat * total) * 1e6
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms   {per_name:6.2f} µs/name")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark product name normalization")
+    parser.add_argument("--root", default=str(NOTION_DIR), help="Folder with Notion CSV exports")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over the name list")
+    args = parser.parse_args()
+
+    names = load_names(Path(args.root))
+    if not names:
+        print(f"No product names found under {args.root}")
+        return
+    print(f"{len(names)} names ({len(set(names))} distinct), {args.repeat} passes\n")
+
+    # Same output, or the comparison is meaningless
+    mismatches = [n for n in names if legacy_normalize_name(n) != name_normalizer.normalize_name(n)]
+    if mismatches:
+        print(f"WARNING: {len(mismatches)} names differ from the legacy pipeline, e.g. {mismatches[:3]}")
+
+    legacy = timed("legacy (re.sub per call)", lambda: [legacy_normalize_name(n) for n in names], args.repeat, len(names))
+
+    def cold():
+        name_normalizer.normalize_name.cache_clear()
+        [name_normalizer.normalize_name(n) for n in names]
+    timed("normalize_name (cold)", cold, args.repeat, len(names))
+
+    warm = timed("normalize_name (warm)", lambda: [name_normalizer.normalize_name(n) for n in names], args.repeat, len(names))
+    batch = timed("normalize_batch (list)", lambda: name_normalizer.normalize_batch(names), args.repeat, len(names))
+
+    try:
+        import pandas as pd
+        series = pd.Series(names)
+        timed("normalize_batch (Series)", lambda: name_normalizer.normalize_batch(series), args.repeat, len(names))
+    except ImportError:
+        pass
+
+    print(f"\nwarm speedup x{legacy / warm:.1f}, batch speedup x{legacy / batch:.1f}")
+
+
+if __name__ == "__main__":
+    main()
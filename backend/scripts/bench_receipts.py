@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Benchmark the receipt pipeline end to end against local stand-ins.
+
+Each receipt goes through the real code: StorageService.upload_receipt_image
+(_process_image, then the upload), GeminiVisionExtractor and the items
+write of the extraction job, and ReceiptProcessor.confirm_receipt. Gemini
+and the bucket are the local stub (scripts/stub_gemini.py), Firestore is
+in memory; nothing leaves the machine.
+
+Reports per-stage latency (p50/p99), throughput at each concurrency level
+(receipts in flight at once) and the bytes sent per receipt to storage
+and to Gemini.
+
+    python scripts/bench_receipts.py [--images "../Boletas pruebas"] [--receipts 20]
+        [--concurrency 1 4 8] [--latency 2.5] [--jitter 0.5] [--tail-rate 0.05]
+        [--responses recorded/] [--hedge]
+"""
+import sys
+import os
+import io
+import copy
+import time
+import uuid
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Settings() requires these at import time; every service here is a local
+# stand-in, so placeholders do (real values in the environment win)
+for _key, _value in {
+    "FIREBASE_PROJECT_ID": "bench-project",
+    "FIREBASE_STORAGE_BUCKET": "bench-project.appspot.com",
+    "GOOGLE_APPLICATION_CREDENTIALS": "service-account-key.json",
+    "GEMINI_API_KEY": "bench-key",
+    "TELEGRAM_BOT_TOKEN": "bench-token",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from app.services import ai_extractor
+from app.services.storage import StorageService
+from app.services.receipt_processor import ReceiptProcessor
+from app.api.routes.jobs import _create_items
+from stub_gemini import StubGemini, load_responses
+
+IMAGES_DIR = Path(__file__).resolve().parents[2] / "Boletas pruebas"
+HOUSEHOLD_ID = "bench-household"
+STAGES = ["process", "upload", "extract", "confirm", "total"]
+
+
+class _Snapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class _Query:
+    def __init__(self, db, path, filters=(), order=None, count=None):
+        self._db, self._path = db, path
+        self._filters, self._order, self._count = list(filters), order, count
+
+    def where(self, field, op, value):
+        return _Query(self._db, self._path, self._filters + [(field, op, value)], self._order, self._count)
+
+    def order_by(self, field, direction="ASCENDING"):
+        return _Query(self._db, self._path, self._filters, (field, direction), self._count)
+
+    def limit(self, count):
+        return _Query(self._db, self._path, self._filters, self._order, count)
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            have = data.get(field)
+            if op == "==" and have != value:
+                return False
+            if op == "array_contains" and value not in (have or []):
+                return False
+            if op == "in" and have not in value:
+                return False
+        return True
+
+    def stream(self):
+        rows = [(ref, data) for ref, data in self._db._children(self._path) if self._matches(data)]
+        if self._order:
+            field, direction = self._order
+            rows.sort(key=lambda row: row[1].get(field), reverse=direction == "DESCENDING")
+        rows = rows[:self._count] if self._count is not None else rows
+        self._db._count_reads(len(rows))
+        return iter([_Snapshot(ref, data) for ref, data in rows])
+
+    def get(self):
+        return list(self.stream())
+
+
+class _CollectionRef(_Query):
+    @property
+    def id(self):
+        return self._path[-1]
+
+    def document(self, doc_id=None):
+        return _DocumentRef(self._db, self._path + (doc_id or uuid.uuid4().hex[:20],))
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return datetime.now(), ref
+
+
+class _DocumentRef:
+    def __init__(self, db, path):
+        self._db, self.path = db, path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return _CollectionRef(self._db, self.path + (name,))
+
+    def get(self, transaction=None):
+        return self._db._read(self)
+
+    def set(self, data, merge=False):
+        self._db._write(self, data, merge)
+
+    def update(self, data):
+        if not self.get().exists:
+            raise ValueError(f"No document to update: {'/'.join(self.path)}")
+        self._db._write(self, data, True)
+
+    def delete(self):
+        self._db._delete(self)
+
+
+class _WriteBatch:
+    """Buffers writes until commit; also the transaction for @firestore.transactional"""
+    _read_only = False
+    _max_attempts = 1
+    _id = None
+
+    def __init__(self, db):
+        self._db, self._writes = db, []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(lambda: ref.set(data, merge))
+
+    def update(self, ref, data):
+        self._writes.append(lambda: ref.update(data))
+
+    def delete(self, ref):
+        self._writes.append(ref.delete)
+
+    def commit(self):
+        with self._db._lock:
+            for write in self._writes:
+                write()
+        self._writes = []
+
+    def _clean_up(self):
+        self._writes, self._id = [], None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _commit(self):
+        self.commit()
+
+    def _rollback(self):
+        self._clean_up()
+
+
+class MemoryFirestore:
+    """
+    The part of the Firestore client the receipt services use, in memory:
+    documents, subcollections, where/order_by/limit, batches, transactions.
+    Counts document reads and writes in ops.
+    """
+
+    def __init__(self):
+        self._docs = {}
+        self._lock = threading.RLock()
+        self.ops = {'reads': 0, 'writes': 0}
+
+    def collection(self, name):
+        return _CollectionRef(self, (name,))
+
+    def batch(self):
+        return _WriteBatch(self)
+
+    def transaction(self):
+        return _WriteBatch(self)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+    def _children(self, path):
+        with self._lock:
+            return [(_DocumentRef(self, doc_path), copy.deepcopy(data))
+                    for doc_path, data in self._docs.items() if doc_path[:-1] == path]
+
+    def _count_reads(self, n):
+        with self._lock:
+            self.ops['reads'] += n
+
+    def _read(self, ref):
+        with self._lock:
+            self.ops['reads'] += 1
+            return _Snapshot(ref, copy.deepcopy(self._docs.get(ref.path)))
+
+    def _write(self, ref, data, merge):
+        with self._lock:
+            self.ops['writes'] += 1
+            current = self._docs.get(ref.path) if merge else None
+            self._docs[ref.path] = {**(current or {}), **copy.deepcopy(data)}
+
+    def _delete(self, ref):
+        with self._lock:
+            self.ops['writes'] += 1
+            self._docs.pop(ref.path, None)
+
+
+class _StubBlob:
+    def __init__(self, base_url, path):
+        self.url = f"{base_url}/storage/{path}"
+
+    def upload_from_string(self, data, content_type=None):
+        requests.put(self.url, data=data, headers={"Content-Type": content_type}, timeout=30).raise_for_status()
+
+    def generate_signed_url(self, **kwargs):
+        return self.url
+
+
+class StubBucket:
+    """Bucket whose blobs live on the stub server"""
+    name = "bench-bucket"
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def blob(self, path):
+        return _StubBlob(self.base_url, path)
+
+
+def seed_household(db: MemoryFirestore, household_id: str = HOUSEHOLD_ID) -> None:
+    household = db.collection('households').document(household_id)
+    household.set({'name': 'Bench'})
+    household.collection('categories').document('super').set({'name': 'Súper', 'kind': 'expense'})
+    household.collection('accounts').document('cuenta').set({'name': 'Cuenta', 'is_active': True})
+
+
+def run_receipt(bucket, extractor, processor, db, image: Path, timings: dict) -> bool:
+    """One receipt through upload, extraction and confirmation; stage times in seconds"""
+    receipt_id = uuid.uuid4().hex[:20]
+    receipt_ref = db.collection('households').document(HOUSEHOLD_ID)\
+        .collection('receipts').document(receipt_id)
+    started = time.perf_counter()
+
+    # Own service per receipt: _process_image is timed on the instance
+    storage = StorageService(bucket)
+    process_image = storage._process_image
+    spent = []
+
+    def timed_process(*args):
+        t = time.perf_counter()
+        try:
+            return process_image(*args)
+        finally:
+            spent.append(time.perf_counter() - t)
+
+    storage._process_image = timed_process
+    upload = UploadFile(file=io.BytesIO(image.read_bytes()), filename=image.name,
+                        headers=Headers({'content-type': 'image/jpeg'}))
+    image_url, _ = storage.upload_receipt_image(upload, HOUSEHOLD_ID, receipt_id)
+    uploaded = time.perf_counter()
+    timings['process'].append(spent[0])
+    timings['upload'].append(uploaded - started - spent[0])
+
+    receipt_ref.set({'status': 'uploaded', 'image_url': image_url, 'created_at': datetime.now()})
+    result = extractor.extract(image_url)
+    if not result.success:
+        receipt_ref.update({'status': 'needs_review', 'extracted_json': {'error': result.error}})
+        timings['extract'].append(time.perf_counter() - uploaded)
+        return False
+    _create_items(db, HOUSEHOLD_ID, receipt_id, result.data.get('items', []))
+    receipt_ref.update({'status': 'extracted', 'extracted_json': result.data})
+    extracted = time.perf_counter()
+    timings['extract'].append(extracted - uploaded)
+
+    processor.confirm_receipt(receipt_id, HOUSEHOLD_ID, {
+        'store_name': result.data.get('store_name'),
+        'date': result.data.get('date') or datetime.now().date().isoformat(),
+        'total': result.data.get('total') or 0
+    }, 'bench-user')
+    finished = time.perf_counter()
+    timings['confirm'].append(finished - extracted)
+    timings['total'].append(finished - started)
+    return True
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def run_level(stub: StubGemini, images: list, receipts: int, concurrency: int, model: str, hedge: bool) -> dict:
+    """receipts uploads with concurrency in flight; timings, throughput and bytes"""
+    db = MemoryFirestore()
+    seed_household(db)
+    bucket = StubBucket(stub.url)
+    extractor = ai_extractor.GeminiVisionExtractor("stub-key", model, base_url=stub.url, hedge=hedge)
+    processor = ReceiptProcessor(db)
+    timings = {stage: [] for stage in STAGES}
+    stub.reset()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_receipt, bucket, extractor, processor, db, images[n % len(images)], timings)
+                   for n in range(receipts)]
+        outcomes = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'receipts': receipts,
+        'confirmed': sum(outcomes),
+        'elapsed_s': elapsed,
+        'receipts_per_min': receipts / elapsed * 60,
+        'timings': timings,
+        'bytes': stub.stats(),
+        'firestore_ops': dict(db.ops)
+    }
+
+
+def report(level: dict, original_bytes: int) -> None:
+    n = level['receipts']
+    print(f"\n== concurrency {level['concurrency']}: {level['confirmed']}/{n} confirmed in "
+          f"{level['elapsed_s']:.1f}s -> {level['receipts_per_min']:.1f} receipts/min")
+    print(f"{'stage':<10} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for stage in STAGES:
+        values = level['timings'][stage]
+        if values:
+            print(f"{stage:<10} {percentile(values, 0.5) * 1000:9.0f} {percentile(values, 0.99) * 1000:9.0f} "
+                  f"{sum(values) / len(values) * 1000:9.0f}")
+    traffic = level['bytes']
+    print(f"bytes per receipt: original {original_bytes / n / 1024:.0f} KiB")
+    for route, label in (('storage_put', 'upload to storage'), ('storage_get', 'download for Gemini'),
+                         ('generateContent', 'sent to Gemini')):
+        entry = traffic.get(route)
+        if entry:
+            moved = entry['bytes_out'] if route == 'storage_get' else entry['bytes_in']
+            print(f"  {label:<20} {moved / n / 1024:8.0f} KiB   ({entry['requests']} requests)")
+    ops = level['firestore_ops']
+    print(f"firestore per receipt: {ops['reads'] / n:.1f} reads, {ops['writes'] / n:.1f} writes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end receipt pipeline benchmark against the Gemini stub")
+    parser.add_argument("--images", default=str(IMAGES_DIR), help="Directory of receipt photos")
+    parser.add_argument("--receipts", type=int, default=20, help="Receipts per concurrency level (images repeat)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--model", default="gemini-1.5-flash")
+    parser.add_argument("--latency", type=float, default=2.5, help="Stub seconds per Gemini call")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--tail-rate", type=float, default=0.0)
+    parser.add_argument("--tail-latency", type=float, default=12.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--responses", help="Recorded responses for the stub")
+    parser.add_argument("--hedge", action="store_true", help="Extract with hedged requests")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    images = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    if not images:
+        parser.error(f"No images in {args.images}")
+
+    stub = StubGemini(
+        responses=load_responses(args.responses) if args.responses else None,
+        latency=args.latency,
+        jitter=args.jitter,
+        tail_rate=args.tail_rate,
+        tail_latency=args.tail_latency,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    print(f"{len(images)} images, {args.receipts} receipts per level, stub latency {args.latency}s ±{args.jitter}")
+    with stub:
+        for concurrency in args.concurrency:
+            level = run_level(stub, images, args.receipts, concurrency, args.model, args.hedge)
+            original = sum(images[n % len(images)].stat().st_size for n in range(args.receipts))
+            report(level, original)
+
+    stats = ai_extractor.extraction_stats()
+    print(f"\nextraction: {stats['receipts']} receipts, escalation rate {stats['escalation_rate']}")
+    if 'hedging' in stats:
+        print("hedging: " + ", ".join(f"{k}={v}" for k, v in stats['hedging'].items()))
+
+
+if __name__ == "__main__":
+    main()
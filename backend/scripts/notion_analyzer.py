@@ -1,8 +1,12 @@
 import pandas as pd
 import json
 import os
+import sys
 import argparse
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.services.name_normalizer import normalize_batch, normalize_key
+
 def analyze_notion_data(input_file="notion_gastos.csv", output_dir="output"):
     """
     Analiza datos históricos de Notion para clasificar productos (A/B/C)
@@ -33,7 +37,7 @@ def analyze_notion_data(input_file="notion_gastos.csv", output_dir="output"):
     total_col = col_map.get('monto_total', 'monto_total')
     store_col = col_map.get('tienda', 'tienda')
 
-    df["producto_norm"] = df[prod_col].str.lower().str.strip()
+    df["producto_norm"] = normalize_batch(df[prod_col], normalize_key)
 
     # 3. Agrupación por producto
     print("🧠 Calculando métricas de productos...")
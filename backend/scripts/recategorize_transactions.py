@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Re-categorize a household's transactions in batches.
+
+Descriptions the household model or the cache already know are resolved
+locally; the rest go to Gemini BATCH_SIZE at a time. Dry run by default:
+prints the proposed changes. --apply writes them.
+
+    python scripts/recategorize_transactions.py HOUSEHOLD_ID [--all] [--limit 1000] [--batch-size 40] [--apply]
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.core.supabase import get_supabase
+from app.services import expense_interpreter
+from app.services.ai_advisor import AIAdvisorService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-categorize transactions with batched interpretation")
+    parser.add_argument("household_id", help="Supabase household id")
+    parser.add_argument("--all", action="store_true", help="Include already categorized transactions")
+    parser.add_argument("--limit", type=int, default=1000, help="Latest N transactions")
+    parser.add_argument("--batch-size", type=int, default=AIAdvisorService.BATCH_SIZE, help="Descriptions per Gemini prompt")
+    parser.add_argument("--apply", action="store_true", help="Write the changes (default: dry run)")
+    args = parser.parse_args()
+
+    advisor = AIAdvisorService()
+
+    async def batch_llm(texts, categories):
+        return await advisor.categorize_batch(texts, categories, batch_size=args.batch_size)
+
+    started = time.perf_counter()
+    report = asyncio.run(expense_interpreter.recategorize(
+        get_supabase(),
+        args.household_id,
+        batch_llm,
+        only_uncategorized=not args.all,
+        limit=args.limit,
+        apply=args.apply
+    ))
+    elapsed = time.perf_counter() - started
+
+    for change in report['changes']:
+        print(f"{change['description'][:50]:<50} {change['previous_category_id'] or '-'} -> {change['category_id']} "
+              f"({change['bucket'] or '-'}, {change['source']})")
+
+    stats = expense_interpreter.stats()
+    print(f"\n{report['scanned']} scanned, {report['changed']} changed, {report['unresolved']} unresolved "
+          f"in {elapsed:.1f}s")
+    print("tiers: " + ", ".join(f"{tier}={s['count']}" for tier, s in stats['tiers'].items()))
+    if args.apply:
+        print(f"applied with {report['update_queries']} update queries")
+    else:
+        print("dry run: use --apply to write")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini REST API (and the receipt bucket).
+
+Speaks the generateContent contract the extractor uses:
+
+    POST /v1beta/models/{model}:generateContent?key=...
+
+and answers with recorded responses after a configurable latency, so the
+extraction pipeline can be measured without the live API. Also serves
+PUT/GET /storage/{path}, an in-memory bucket for the uploaded images.
+Counts requests and bytes per route.
+
+Responses (--responses): a JSON file or a directory of them; each one a
+recorded generateContent body (with "candidates") or the bare receipt
+JSON. A response named after the sha1 of the first image (as --record
+writes them) answers that image; the rest are served round-robin.
+Without --responses every receipt gets a canned one.
+
+    python scripts/stub_gemini.py [--port 8765] [--latency 2.5] [--jitter 0.5]
+        [--tail-rate 0.05 --tail-latency 12] [--error-rate 0.02]
+        [--responses recorded/] [--record recorded/]
+
+Point the backend at it with GEMINI_BASE_URL=http://127.0.0.1:8765.
+--record forwards to the real API (GEMINI_API_KEY) and saves each answer.
+"""
+import os
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+GEMINI_API = "https://generativelanguage.googleapis.com"
+
+CANNED_RECEIPT = {
+    "store": {"name": "Lider", "method": "exact", "confidence": 0.95},
+    "date": "2026-01-21",
+    "total": 12480,
+    "is_blurry": False,
+    "items": [
+        {"name": "LECHE ENTERA 1L", "qty": 2, "unit": "unit", "line_total": 2380},
+        {"name": "PAN MARRAQUETA", "qty": 0.85, "unit": "kg", "line_total": 2200},
+        {"name": "PALTA HASS", "qty": 1.2, "unit": "kg", "line_total": 4700},
+        {"name": "ARROZ GRADO 1 1KG", "qty": 1, "unit": "unit", "line_total": 1590},
+        {"name": "TOMATE", "qty": 0.9, "unit": "kg", "line_total": 1610}
+    ],
+    "confidence_overall": 0.92
+}
+
+
+def generate_content_body(receipt: dict) -> dict:
+    """A generateContent response carrying the receipt JSON as text"""
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": json.dumps(receipt, ensure_ascii=False)}], "role": "model"},
+            "finishReason": "STOP"
+        }],
+        "modelVersion": "stub"
+    }
+
+
+def load_responses(path: str) -> dict:
+    """{name: generateContent body} from a JSON file or a directory of them"""
+    root = Path(path)
+    files = sorted(root.glob("*.json")) if root.is_dir() else [root]
+    responses = {}
+    for file in files:
+        body = json.loads(file.read_text(encoding="utf-8"))
+        responses[file.stem] = body if "candidates" in body else generate_content_body(body)
+    return responses
+
+
+def image_key(payload: dict) -> str | None:
+    """sha1 of the first inline image: the name a recorded response is saved under"""
+    for content in payload.get("contents") or []:
+        for part in content.get("parts") or []:
+            data = (part.get("inline_data") or part.get("inlineData") or {}).get("data")
+            if data:
+                return hashlib.sha1(base64.b64decode(data)).hexdigest()
+    return None
+
+
+class StubGemini:
+    """
+    The server state: replies, latency model and counters.
+
+    Latency per generateContent call is latency ± jitter (uniform); with
+    probability tail_rate it is tail_latency instead, and with probability
+    error_rate the call fails with a 503 after waiting.
+    """
+
+    def __init__(
+        self,
+        responses: dict | None = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        tail_rate: float = 0.0,
+        tail_latency: float = 0.0,
+        error_rate: float = 0.0,
+        record_dir: str | None = None,
+        upstream_key: str | None = None,
+        seed: int | None = None
+    ):
+        self.responses = responses or {"canned": generate_content_body(CANNED_RECEIPT)}
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self.record_dir = Path(record_dir) if record_dir else None
+        self.upstream_key = upstream_key
+        self.blobs = {}
+        self._names = sorted(self.responses)
+        self._next = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = {}
+
+    def count(self, route: str, received: int, sent: int) -> None:
+        with self._lock:
+            entry = self.counters.setdefault(route, {'requests': 0, 'bytes_in': 0, 'bytes_out': 0})
+            entry['requests'] += 1
+            entry['bytes_in'] += received
+            entry['bytes_out'] += sent
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {route: dict(entry) for route, entry in self.counters.items()}
+
+    def delay(self) -> tuple[float, bool]:
+        """(seconds to wait, fail) for one call"""
+        with self._lock:
+            if self._random.random() < self.tail_rate:
+                seconds = self.tail_latency
+            else:
+                seconds = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            return max(0.0, seconds), self._random.random() < self.error_rate
+
+    def reply(self, model: str, payload: dict) -> tuple[int, dict]:
+        """(status, body) for a generateContent request"""
+        key = image_key(payload)
+        if self.record_dir:
+            return self._record(model, payload, key)
+        with self._lock:
+            if key in self.responses:
+                return 200, self.responses[key]
+            name = self._names[self._next % len(self._names)]
+            self._next += 1
+            return 200, self.responses[name]
+
+    def _record(self, model: str, payload: dict, key: str | None) -> tuple[int, dict]:
+        url = f"{GEMINI_API}/v1beta/models/{model}:generateContent?key={self.upstream_key}"
+        res = requests.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=120)
+        body = res.json()
+        if res.status_code == 200 and key:
+            self.record_dir.mkdir(parents=True, exist_ok=True)
+            (self.record_dir / f"{key}.json").write_text(json.dumps(body, ensure_ascii=False, indent=2), encoding="utf-8")
+        return res.status_code, body
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> "StubGemini":
+        """Serve on a background thread (port 0: any free port)"""
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self if self._server else self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, route: str, status: int, body: bytes, content_type: str, received: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stub.count(route, received, len(body))
+
+    def _send_json(self, route: str, status: int, body: dict, received: int) -> None:
+        self._send(route, status, json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json", received)
+
+    def do_POST(self):
+        stub = self.server.stub
+        raw = self._body()
+        path = self.path.split("?")[0]
+        if not (path.startswith("/v1beta/models/") and path.endswith(":generateContent")):
+            return self._send_json("other", 404, {"error": {"code": 404, "message": "Not found"}}, len(raw))
+
+        model = path[len("/v1beta/models/"):-len(":generateContent")]
+        seconds, fail = stub.delay()
+        time.sleep(seconds)
+        if fail:
+            return self._send_json("generateContent", 503, {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}}, len(raw))
+        try:
+            status, body = stub.reply(model, json.loads(raw))
+        except Exception as e:
+            status, body = 400, {"error": {"code": 400, "message": str(e), "status": "INVALID_ARGUMENT"}}
+        self._send_json("generateContent", status, body, len(raw))
+
+    def do_PUT(self):
+        raw = self._body()
+        if not self.path.startswith("/storage/"):
+            return self._send_json("other", 404, {"error": "not found"}, len(raw))
+        content_type = self.headers.get("Content-Type", "application/octet-stream")
+        self.server.stub.blobs[self.path.split("?")[0]] = (raw, content_type)
+        self._send_json("storage_put", 200, {"size": len(raw)}, len(raw))
+
+    def do_GET(self):
+        blob = self.server.stub.blobs.get(self.path.split("?")[0])
+        if blob is None:
+            return self._send_json("other", 404, {"error": "not found"}, 0)
+        self._send("storage_get", 200, blob[0], blob[1], 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini generateContent stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=2.5, help="Seconds per generateContent call")
+    parser.add_argument("--jitter", type=float, default=0.5, help="± seconds, uniform")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Share of calls that take --tail-latency")
+    parser.add_argument("--tail-latency", type=float, default=12.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with 503")
+    parser.add_argument("--responses", help="Recorded responses: JSON file or directory")
+    parser.add_argument("--record", help="Forward to the real API and save answers here")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.record and not os.environ.get("GEMINI_API_KEY"):
+        parser.error("--record needs GEMINI_API_KEY")
+
+    stub = StubGemini(
+        responses=load_responses(args.responses) if args.responses else None,
+        latency=args.latency,
+        jitter=args.jitter,
+        tail_rate=args.tail_rate,
+        tail_latency=args.tail_latency,
+        error_rate=args.error_rate,
+        record_dir=args.record,
+        upstream_key=os.environ.get("GEMINI_API_KEY"),
+        seed=args.seed
+    ).start(args.host, args.port)
+    print(f"Gemini stub on {stub.url} ({len(stub.responses)} responses, latency {args.latency}s ±{args.jitter})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(stub.stats(), indent=2))
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+-- ==============================================
+-- Schema Migration V10 - Lista de compras generada desde el plan de comidas
+-- ==============================================
+-- origin indica quién creó la fila:
+--   NULL         agregada a mano (el generador no la toca)
+--   'meal_plan'  generada desde meal_plans; se reemplaza al regenerar
+
+ALTER TABLE shopping_list ADD COLUMN IF NOT EXISTS bucket TEXT DEFAULT 'monthly';
+ALTER TABLE shopping_list ADD COLUMN IF NOT EXISTS weeks INTEGER[] DEFAULT '{}';
+ALTER TABLE shopping_list ADD COLUMN IF NOT EXISTS origin TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_meal_plans_household_date ON meal_plans(household_id, date);
@@ -0,0 +1,102 @@
+-- ==============================================
+-- Schema Migration V5 - Serie compacta de precios por producto
+-- ==============================================
+-- Una fila por producto con arreglos paralelos (mismo formato que
+-- app/domain/price_series.py):
+--   d: fecha como ordinal (date.toordinal() de Python)
+--   p: precio unitario
+--   s: índice (base 0) en stores
+--   q: cantidad
+--   u: índice (base 0) en units
+-- Un año de compras semanales = 1 fila en vez de ~50.
+
+CREATE TABLE IF NOT EXISTS product_price_series (
+    product_id UUID PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    household_id UUID REFERENCES households(id) ON DELETE CASCADE,
+    d INTEGER[] NOT NULL DEFAULT '{}',
+    p NUMERIC[] NOT NULL DEFAULT '{}',
+    s SMALLINT[] NOT NULL DEFAULT '{}',
+    q NUMERIC[] NOT NULL DEFAULT '{}',
+    u SMALLINT[] NOT NULL DEFAULT '{}',
+    stores TEXT[] NOT NULL DEFAULT '{}',
+    units TEXT[] NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_price_series_household ON product_price_series(household_id);
+
+-- 1. Mantener la serie al insertar en product_prices
+CREATE OR REPLACE FUNCTION append_product_price_series() RETURNS TRIGGER AS $$
+DECLARE
+    v_stores TEXT[];
+    v_units TEXT[];
+    v_store_idx INTEGER;
+    v_unit_idx INTEGER;
+BEGIN
+    IF NEW.product_id IS NULL THEN
+        RETURN NEW;
+    END IF;
+
+    INSERT INTO product_price_series (product_id, household_id)
+    VALUES (NEW.product_id, NEW.household_id)
+    ON CONFLICT (product_id) DO NOTHING;
+
+    SELECT stores, units INTO v_stores, v_units
+    FROM product_price_series WHERE product_id = NEW.product_id
+    FOR UPDATE;
+
+    v_store_idx := array_position(v_stores, NEW.store_id::TEXT);
+    IF v_store_idx IS NULL THEN
+        v_stores := array_append(v_stores, NEW.store_id::TEXT);
+        v_store_idx := cardinality(v_stores);
+    END IF;
+
+    v_unit_idx := array_position(v_units, COALESCE(NEW.unit, 'unit'));
+    IF v_unit_idx IS NULL THEN
+        v_units := array_append(v_units, COALESCE(NEW.unit, 'unit'));
+        v_unit_idx := cardinality(v_units);
+    END IF;
+
+    UPDATE product_price_series SET
+        d = array_append(d, (NEW.date - DATE '0001-01-01') + 1),
+        p = array_append(p, NEW.unit_price),
+        s = array_append(s, (v_store_idx - 1)::SMALLINT),
+        q = array_append(q, NEW.qty),
+        u = array_append(u, (v_unit_idx - 1)::SMALLINT),
+        stores = v_stores,
+        units = v_units,
+        updated_at = NOW()
+    WHERE product_id = NEW.product_id;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_product_prices_series ON product_prices;
+CREATE TRIGGER trg_product_prices_series
+AFTER INSERT ON product_prices
+FOR EACH ROW EXECUTE FUNCTION append_product_price_series();
+
+-- 2. Backfill del historial existente
+INSERT INTO product_price_series (product_id, household_id, d, p, s, q, u, stores, units)
+SELECT
+    pp.product_id,
+    pp.household_id,
+    array_agg((pp.date - DATE '0001-01-01') + 1 ORDER BY pp.date, pp.created_at),
+    array_agg(pp.unit_price ORDER BY pp.date, pp.created_at),
+    array_agg((array_position(k.stores, pp.store_id::TEXT) - 1)::SMALLINT ORDER BY pp.date, pp.created_at),
+    array_agg(pp.qty ORDER BY pp.date, pp.created_at),
+    array_agg((array_position(k.units, COALESCE(pp.unit, 'unit')) - 1)::SMALLINT ORDER BY pp.date, pp.created_at),
+    k.stores,
+    k.units
+FROM product_prices pp
+JOIN (
+    SELECT product_id,
+           array_agg(DISTINCT store_id::TEXT) AS stores,
+           array_agg(DISTINCT COALESCE(unit, 'unit')) AS units
+    FROM product_prices
+    GROUP BY product_id
+) k ON k.product_id = pp.product_id
+WHERE pp.product_id IS NOT NULL
+GROUP BY pp.product_id, pp.household_id, k.stores, k.units
+ON CONFLICT (product_id) DO NOTHING;
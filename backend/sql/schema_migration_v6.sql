@@ -0,0 +1,26 @@
+-- ==============================================
+-- Schema Migration V6 - Último precio por producto calculado en la base
+-- ==============================================
+
+-- 1. Índices para historial por producto y por tienda
+CREATE INDEX IF NOT EXISTS idx_product_prices_household_product_date
+    ON product_prices(household_id, product_id, date DESC);
+CREATE INDEX IF NOT EXISTS idx_product_prices_household_store_product_date
+    ON product_prices(household_id, store_id, product_id, date DESC, created_at DESC);
+
+-- 2. Último precio de cada producto en cada tienda
+-- (reemplaza traer 500 filas y elegir el último en Python)
+CREATE OR REPLACE VIEW latest_store_product_prices AS
+SELECT DISTINCT ON (household_id, store_id, product_id)
+    household_id,
+    store_id,
+    product_id,
+    unit_price,
+    unit,
+    qty,
+    total_price,
+    date,
+    created_at
+FROM product_prices
+WHERE product_id IS NOT NULL
+ORDER BY household_id, store_id, product_id, date DESC, created_at DESC;
@@ -0,0 +1,31 @@
+-- ==============================================
+-- Schema Migration V7 - Matriz de precios producto × tienda
+-- ==============================================
+-- Una sola pasada sobre product_prices: por cada (producto, tienda, unidad)
+-- devuelve el último precio unitario, la mediana y la cantidad de compras.
+-- Se llama con supabase.rpc("product_store_price_matrix", {"p_household_id": ...}).
+
+CREATE OR REPLACE FUNCTION product_store_price_matrix(p_household_id UUID)
+RETURNS TABLE (
+    product_id UUID,
+    store_id UUID,
+    unit TEXT,
+    latest_unit_price NUMERIC,
+    median_unit_price NUMERIC,
+    n INTEGER,
+    last_date DATE
+) AS $$
+    SELECT
+        pp.product_id,
+        pp.store_id,
+        pp.unit,
+        (array_agg(pp.unit_price ORDER BY pp.date DESC, pp.created_at DESC))[1] AS latest_unit_price,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY pp.unit_price)::NUMERIC AS median_unit_price,
+        COUNT(*)::INTEGER AS n,
+        MAX(pp.date) AS last_date
+    FROM product_prices pp
+    WHERE pp.household_id = p_household_id
+      AND pp.product_id IS NOT NULL
+      AND pp.store_id IS NOT NULL
+    GROUP BY pp.product_id, pp.store_id, pp.unit;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,21 @@
+-- ==============================================
+-- Schema Migration V8 - Costo estimado automático en shopping_list
+-- ==============================================
+-- estimate_source indica de dónde viene estimated_cost:
+--   'manual'               escrito por el usuario (el estimador no lo toca)
+--   'median_price'         mediana del precio unitario × cantidad
+--   'latest_price'         último precio unitario × cantidad
+--   'product_manual_price' products.manual_price × cantidad
+--   NULL                   sin estimar
+
+ALTER TABLE shopping_list ADD COLUMN IF NOT EXISTS product_id UUID REFERENCES products(id) ON DELETE SET NULL;
+ALTER TABLE shopping_list ADD COLUMN IF NOT EXISTS quantity NUMERIC;
+ALTER TABLE shopping_list ADD COLUMN IF NOT EXISTS unit TEXT;
+ALTER TABLE shopping_list ADD COLUMN IF NOT EXISTS estimate_source TEXT;
+ALTER TABLE shopping_list ADD COLUMN IF NOT EXISTS estimated_at TIMESTAMP WITH TIME ZONE;
+
+-- Los costos existentes fueron escritos a mano
+UPDATE shopping_list SET estimate_source = 'manual'
+WHERE estimate_source IS NULL AND COALESCE(estimated_cost, 0) > 0;
+
+CREATE INDEX IF NOT EXISTS idx_shopping_list_household_month ON shopping_list(household_id, month);
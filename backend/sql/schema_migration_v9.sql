@@ -0,0 +1,21 @@
+-- ==============================================
+-- Schema Migration V9 - Clave única en meal_plans
+-- ==============================================
+-- V4 declaró UNIQUE(household_id, date, type), pero en las bases donde la
+-- tabla ya existía el CREATE TABLE IF NOT EXISTS no la agregó. Sin ella el
+-- upsert con on_conflict falla (42P10) y el guardado hacía delete + insert
+-- por comida.
+
+-- 1. Eliminar duplicados, dejando la fila más reciente de cada comida
+--    (updated_at NULL cuenta como la más antigua; a igual fecha desempata el id)
+DELETE FROM meal_plans a
+USING meal_plans b
+WHERE a.household_id = b.household_id
+  AND a.date = b.date
+  AND a.type = b.type
+  AND (COALESCE(a.updated_at, '-infinity'::timestamptz), a.id)
+    < (COALESCE(b.updated_at, '-infinity'::timestamptz), b.id);
+
+-- 2. Clave única para el upsert (no falla si V4 ya la creó)
+CREATE UNIQUE INDEX IF NOT EXISTS meal_plans_household_date_type_key
+ON meal_plans(household_id, date, type);
@@ -0,0 +1,53 @@
+"""
+Receipt alias engine: compiled table, first-entry-wins semantics
+"""
+import json
+
+from app.services import alias_engine
+from app.services.alias_engine import AliasEngine, load_entries
+
+
+def _linear(entries, text):
+    text = " ".join(text.lower().split())
+    for entry in entries:
+        if any(p in text for p in entry["patterns"]):
+            return entry
+    return None
+
+
+def test_matches_linear_scan_on_shipped_table():
+    entries = load_entries(alias_engine.ALIASES_PATH)
+    engine = AliasEngine(entries)
+    lines = [
+        "COCA COLA LATA 350ML", "PILAS AAA DURACELL", "pilas  aa x4", "PILAS DURACELL TRIPLE A",
+        "PALTA COD 123", "ACO BALLERINA DP7 750", "HARINA INTEGRAL SE LECTA", "Pan amasado", "",
+    ]
+    for line in lines:
+        assert engine.match(line) == _linear(entries, line), line
+
+    assert engine.suggest("coca cola lata 350") == ("Coca-Cola lata 350 ml", "Coca-Cola")
+    # Specific alias beats the generic fallback that also matches
+    assert engine.suggest("PILAS DURACELL TRIPLE A 4U") == ("Pilas AAA", "Duracell")
+    assert engine.suggest("Pan amasado") is None
+
+
+def test_overlapping_patterns_use_table_order():
+    engine = AliasEngine([
+        {"patterns": ["leche entera"], "name": "Leche entera 1 L", "brand": ""},
+        {"patterns": ["leche"], "name": "Leche", "brand": ""},
+        {"patterns": ["he ent"], "name": "Nunca", "brand": ""},
+    ])
+    assert engine.suggest("LECHE ENTERA COLUN")[0] == "Leche entera 1 L"
+    assert engine.suggest("LECHE DESCREMADA")[0] == "Leche"
+    assert engine.suggest("XHE ENTX")[0] == "Nunca"
+
+
+def test_apply_fills_only_missing_fields(tmp_path, monkeypatch):
+    table = tmp_path / "aliases.json"
+    table.write_text(json.dumps({"aliases": [{"patterns": ["naranja sofruco"], "name": "Naranja malla", "brand": "Sofruco"}]}))
+    monkeypatch.setattr(alias_engine, "ALIASES_PATH", table)
+    assert len(alias_engine.get_engine()) == 1
+
+    assert alias_engine.apply({"name_raw": "NARANJA SOFRUCO 3KG"}) == {"name_clean": "Naranja malla", "name_brand": "Sofruco"}
+    assert alias_engine.apply({"name_raw": "NARANJA SOFRUCO", "name_clean": "Naranjas"}) == {}
+    assert alias_engine.apply({"name_raw": "NARANJA SOFRUCO", "name_brand": "Otra"}) == {"name_clean": "Naranja malla"}
@@ -0,0 +1,136 @@
+"""
+Frequency-weighted autocomplete index
+"""
+import time
+import threading
+
+from app.services import autocomplete, price_matrix
+from app.services.autocomplete import AutocompleteIndex, PRODUCT, STORE, ITEM
+from app.api.routes.shopping_list import get_shopping_suggestions
+
+HOUSEHOLD = "hh-1"
+
+
+def test_prefix_and_token_suffix_ranked_by_weight():
+    index = AutocompleteIndex()
+    index.add(PRODUCT, "p1", "Arroz Grado 2", weight=3)
+    index.add(PRODUCT, "p2", "Arroz Integral", weight=10)
+    index.add(PRODUCT, "p3", "Aceite Maravilla", weight=5)
+    index.add(STORE, "s1", "Líder", weight=40, aliases=["Hipermercado Lider"])
+
+    assert [e["id"] for e in index.suggest("arr")] == ["p2", "p1"]
+    assert [e["id"] for e in index.suggest("grado")] == ["p1"]
+    assert [e["id"] for e in index.suggest("a", kinds=[PRODUCT])] == ["p2", "p3", "p1"]
+    assert [e["id"] for e in index.suggest("hiper")] == ["s1"]
+    assert [e["id"] for e in index.suggest("lider")] == ["s1"]
+
+
+def test_bump_reorders_and_creates():
+    index = AutocompleteIndex()
+    index.add(PRODUCT, "p1", "Leche Entera", weight=1)
+    index.add(PRODUCT, "p2", "Leche Descremada", weight=2)
+    index.bump(PRODUCT, "p1", delta=5)
+    assert index.suggest("leche")[0]["id"] == "p1"
+
+    index.bump(ITEM, "velas", "Velas")
+    assert index.suggest("vel")[0]["label"] == "Velas"
+
+    # Unknown entry without a label is ignored
+    index.bump(PRODUCT, "missing")
+    assert len(index) == 3
+
+
+def test_top_k_is_sub_millisecond():
+    index = AutocompleteIndex()
+    for i in range(5000):
+        index.add(PRODUCT, f"p{i}", f"producto {i} marca {i % 37}", weight=i % 101)
+
+    start = time.perf_counter()
+    for _ in range(100):
+        index.suggest("producto 12", limit=10)
+    assert (time.perf_counter() - start) / 100 < 0.001
+
+
+def test_shopping_suggestions_route(fake_supabase):
+    autocomplete.invalidate()
+    price_matrix.invalidate()
+    supabase = fake_supabase({
+        "products": [
+            {"id": "p1", "household_id": HOUSEHOLD, "name_norm": "Pan Hallulla"},
+            {"id": "p2", "household_id": HOUSEHOLD, "name_norm": "Pan Molde"},
+        ],
+        "stores": [{"id": "s1", "household_id": HOUSEHOLD, "name": "Lider"}],
+        "product_prices": [
+            {"household_id": HOUSEHOLD, "product_id": "p2", "store_id": "s1", "unit": "unit",
+             "unit_price": 2000, "date": f"2026-03-0{d}", "created_at": f"2026-03-0{d}T10:00:00"}
+            for d in range(1, 4)
+        ],
+        "shopping_list": [{"household_id": HOUSEHOLD, "name": "Pañales", "month": "2026-03"}],
+    })
+    user = {"household_id": HOUSEHOLD}
+
+    result = get_shopping_suggestions(q="pan", limit=10, user=user, supabase=supabase)
+    assert result[0]["product_id"] == "p2"
+    assert result[0]["latest_price"] == {"unit_price": 2000.0, "unit": "unit", "store_name": "Lider", "date": "2026-03-03"}
+    assert {r["name"] for r in result} == {"Pan Molde", "Pan Hallulla", "Pañales"}
+
+    # Writes are applied to the cached index
+    autocomplete.record(HOUSEHOLD, PRODUCT, "p1", None, delta=10)
+    result = get_shopping_suggestions(q="pan", limit=1, user=user, supabase=supabase)
+    assert result[0]["product_id"] == "p1"
+
+
+def test_label_changes_while_suggesting():
+    index = AutocompleteIndex()
+    for i in range(50):
+        index.add(PRODUCT, f"p{i}", f"arroz {i}")
+    errors, stop = [], threading.Event()
+
+    def suggester():
+        while not stop.is_set():
+            try:
+                for entry in index.suggest("arroz", limit=20):
+                    assert entry["label"].startswith("arroz")
+            except Exception as e:  # KeyError on an entry being re-added would surface here
+                errors.append(e)
+
+    threads = [threading.Thread(target=suggester) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for i in range(2000):
+        index.bump(PRODUCT, f"p{i % 50}", f"arroz {i}")
+    stop.set()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(index) == 50
+
+
+def test_cold_load_blocks_only_its_household(monkeypatch):
+    monkeypatch.setattr(autocomplete, "_INDEXES", {})
+    monkeypatch.setattr(autocomplete, "_BUILD_LOCKS", {})
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_loader(household_id):
+        loading.set()
+        release.wait(5)
+        return AutocompleteIndex()
+
+    def fast_loader(household_id):
+        index = AutocompleteIndex()
+        index.add(PRODUCT, "p1", "Leche")
+        return index
+
+    slow = threading.Thread(target=autocomplete.get_index, args=("supabase", "slow", slow_loader))
+    slow.start()
+    assert loading.wait(5)
+    try:
+        start = time.perf_counter()
+        fast = autocomplete.get_index("supabase", HOUSEHOLD, fast_loader)
+        autocomplete.record(HOUSEHOLD, PRODUCT, "p1", None, delta=3)
+        assert time.perf_counter() - start < 1
+        assert fast.suggest("lec")[0]["weight"] == 4
+    finally:
+        release.set()
+        slow.join()
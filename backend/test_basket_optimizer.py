@@ -0,0 +1,88 @@
+"""
+Basket optimizer over the price matrix arrays
+"""
+import time
+
+import numpy as np
+
+from app.services.basket_optimizer import PriceArrays, optimize
+
+
+def _matrix(prices, units=None):
+    """prices: {product_id: {store_id: latest}}, units: {product_id: price unit}"""
+    stores = sorted({s for by_store in prices.values() for s in by_store})
+    return {
+        "stores": [{"id": s, "name": s.upper()} for s in stores],
+        "products": [
+            {"product_id": pid, "unit": (units or {}).get(pid),
+             "prices": {s: {"latest": v} for s, v in by_store.items()}}
+            for pid, by_store in prices.items()
+        ],
+    }
+
+
+def test_single_store_pair_and_savings():
+    arrays = PriceArrays(_matrix({
+        "arroz": {"a": 1000, "b": 1200, "c": 1500},
+        "leche": {"a": 1100, "b": 900},
+        "pan": {"a": 2000, "c": 1000},
+    }))
+    items = [
+        {"product_id": "arroz", "name": "Arroz", "quantity": 2},
+        {"product_id": "leche", "name": "Leche", "quantity": 1},
+        {"product_id": "pan", "name": "Pan", "quantity": 1},
+        {"product_id": None, "name": "Velas"},
+    ]
+    result = optimize(items, arrays)
+
+    # Only store a carries all three
+    assert result["best_store"]["store_id"] == "a"
+    assert result["best_store"]["total"] == 2000 + 1100 + 2000
+    assert result["unpriced"] == ["Velas"]
+
+    # a + c: arroz@a, leche@a, pan@c
+    pair = result["best_pair"]
+    assert set(pair["store_ids"]) == {"a", "c"}
+    assert pair["total"] == 2000 + 1100 + 1000
+    assert pair["savings_vs_best_store"] == 1000
+
+    savings = {s["product_id"]: s for s in result["item_savings"]}
+    assert savings["pan"]["cheapest_store_id"] == "c"
+    assert savings["pan"]["savings_vs_best_store"] == 1000
+    assert savings["arroz"]["savings_vs_priciest"] == 1000
+
+
+def test_quantities_converted_to_price_unit():
+    arrays = PriceArrays(_matrix(
+        {"carne": {"a": 9000, "b": 8000}, "huevos": {"a": 250, "b": 300}},
+        units={"carne": "kg", "huevos": "unit"}
+    ))
+    items = [
+        {"product_id": "carne", "name": "Carne", "quantity": 500, "unit": "g"},
+        {"product_id": "huevos", "name": "Huevos", "quantity": 12},
+        {"product_id": "huevos", "name": "Huevos a granel", "quantity": 600, "unit": "g"},
+    ]
+    result = optimize(items, arrays)
+
+    # 500 g at 9000/kg, not 500 × 9000; grams of a per-unit product aren't priced
+    assert result["unpriced"] == ["Huevos a granel"]
+    assert result["best_store"]["store_id"] == "a"
+    assert result["best_store"]["total"] == 4500 + 3000
+    savings = {s["name"]: s for s in result["item_savings"]}
+    assert savings["Carne"]["quantity"] == 0.5 and savings["Carne"]["cheapest_cost"] == 4000
+
+def test_hundred_items_optimize_fast():
+    rng = np.random.default_rng(7)
+    prices = {
+        f"p{i}": {f"s{j}": float(rng.integers(500, 5000)) for j in range(15) if rng.random() < 0.7}
+        for i in range(300)
+    }
+    arrays = PriceArrays(_matrix(prices))
+    items = [{"product_id": f"p{i}", "name": f"P{i}", "quantity": 1} for i in range(100)]
+
+    start = time.perf_counter()
+    result = optimize(items, arrays)
+    elapsed = time.perf_counter() - start
+
+    assert result["priced_items"] == 100
+    assert elapsed < 0.1
@@ -0,0 +1,42 @@
+"""
+Catalog endpoints must issue a fixed number of queries, not one per row
+"""
+from app.api.routes.catalog import get_store_products, get_product_prices
+
+HOUSEHOLD = "hh-1"
+USER = {"household_id": HOUSEHOLD}
+
+
+def _products(n):
+    return [{"id": f"p{i}", "name_norm": f"producto {i}", "name_raw": f"PRODUCTO {i}"} for i in range(n)]
+
+
+def test_store_products_uses_two_queries(fake_supabase):
+    latest = [
+        {"household_id": HOUSEHOLD, "store_id": "s1", "product_id": f"p{i}",
+         "unit_price": 1000 + i, "unit": "unit", "qty": 1, "total_price": 1000 + i,
+         "date": f"2026-01-{i % 28 + 1:02d}"}
+        for i in range(40)
+    ]
+    supabase = fake_supabase({"latest_store_product_prices": latest, "products": _products(40)})
+
+    result = get_store_products("s1", user=USER, supabase=supabase, limit=50)
+
+    assert len(result) == 40
+    assert supabase.calls == [("latest_store_product_prices", "select"), ("products", "select")]
+
+
+def test_product_prices_resolves_stores_in_one_query(fake_supabase):
+    prices = [
+        {"household_id": HOUSEHOLD, "product_id": "p1", "store_id": f"s{i % 7}",
+         "unit_price": 900 + i, "unit": "unit", "qty": 1, "date": f"2026-02-{i % 28 + 1:02d}"}
+        for i in range(30)
+    ]
+    stores = [{"id": f"s{i}", "name": f"Tienda {i}"} for i in range(7)]
+    supabase = fake_supabase({"product_prices": prices, "stores": stores})
+
+    result = get_product_prices("p1", user=USER, supabase=supabase, limit=20)
+
+    assert len(result) == 20
+    assert all(row["store_name"] == f"Tienda {row['store_id'][1:]}" for row in result)
+    assert supabase.calls == [("product_prices", "select"), ("stores", "select")]
@@ -0,0 +1,180 @@
+"""
+Quick-expense interpretation: regex amounts, household classifier, LLM cache
+"""
+import asyncio
+
+import pytest
+
+from app.services import expense_interpreter as ei
+
+
+CATEGORIES = [{'id': 'super', 'name': 'Supermercado'}, {'id': 'salidas', 'name': 'Salidas'}]
+
+HISTORY = [
+    {'household_id': 'h1', 'description': '45 lucas en el Jumbo', 'category_id': 'super', 'bucket': 'oxigeno', 'store_id': 'Supermercado Jumbo', 'occurred_on': '2026-03-01'},
+    {'household_id': 'h1', 'description': 'jumbo 32.990', 'category_id': 'super', 'bucket': 'oxigeno', 'store_id': 'Supermercado Jumbo', 'occurred_on': '2026-03-05'},
+    {'household_id': 'h1', 'description': 'lider 12 mil', 'category_id': 'super', 'bucket': 'oxigeno', 'store_id': 'k3J9aQ0pLm2Xz8Yt4Bv1', 'occurred_on': '2026-03-06'},
+    {'household_id': 'h1', 'description': 'sushi con amigos 25 lucas', 'category_id': 'salidas', 'bucket': 'vida', 'store_id': 'Sushi', 'occurred_on': '2026-03-07'},
+    {'household_id': 'h1', 'description': 'cine 9 lucas', 'category_id': 'salidas', 'bucket': 'vida', 'store_id': 'Cine', 'occurred_on': '2026-03-08'},
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(ei, "_CACHE", ei.InterpretCache())
+    monkeypatch.setattr(ei, "_STATS", {t: {'count': 0, 'ms': 0.0} for t in ('local', 'cache', 'llm', 'failed')})
+    ei.invalidate()
+
+
+@pytest.mark.parametrize("text,amount", [
+    ("45 lucas en el Jumbo", 45000),
+    ("45 mil en el jumbo", 45000),
+    ("$45.000 jumbo", 45000),
+    ("1,5 lucas pan", 1500),
+    ("2 panes 3000", 3000),
+    ("uber 12.990", 12990),
+    ("2 palos arriendo", 2000000),
+    ("almuerzo", None),
+])
+def test_parse_amount(text, amount):
+    assert ei.parse_amount(text)[0] == amount
+
+
+def test_tiers_local_then_cache_then_llm(fake_supabase):
+    calls = []
+
+    async def llm(text, categories):
+        calls.append(text)
+        return {'category_id': 'salidas', 'bucket': 'vida', 'normalized_description': 'Farmacia',
+                'amount_hint': 999, 'advice': 'Ojo'}
+
+    async def run():
+        model = ei.get_model(fake_supabase({'transactions': HISTORY}), 'h1')
+        return [
+            await ei.interpret("30 lucas en el jumbo", CATEGORIES, llm, model),
+            await ei.interpret("farmacia 8 lucas", CATEGORIES, llm, model),
+            await ei.interpret("Farmacia  5 lucas", CATEGORIES, llm, model),
+            await ei.interpret("farmacia 5 lucas", CATEGORIES[:1], llm, model),   # other category set
+        ]
+
+    local, first, cached, other = asyncio.run(run())
+    assert local['source'] == 'local' and local['category_id'] == 'super'
+    assert local['amount_hint'] == 30000 and local['bucket'] == 'oxigeno'
+    assert local['normalized_description'] == 'Supermercado Jumbo'
+
+    assert first['source'] == 'llm' and first['amount_hint'] == 8000
+    assert cached['source'] == 'cache' and cached['amount_hint'] == 5000 and cached['advice'] == 'Ojo'
+    assert other['source'] == 'llm'
+    assert calls == ["farmacia 8 lucas", "farmacia 5 lucas"]
+
+    stats = ei.stats()
+    assert stats['total'] == 4 and stats['hit_rate'] == 0.5
+    assert stats['tiers']['llm']['count'] == 2 and stats['tiers']['local']['avg_ms'] is not None
+
+
+def test_ambiguous_or_unknown_text_goes_to_llm(fake_supabase):
+    model = ei.get_model(fake_supabase({'transactions': HISTORY}), 'h1')
+    # Store ids are not used as clean names
+    assert 'lider' not in model.labels
+    assert model.classify("regalo cumpleaños", ['super', 'salidas']) is None
+
+    async def llm(text, categories):
+        return None
+
+    assert asyncio.run(ei.interpret("regalo 10 lucas", CATEGORIES, llm, model)) is None
+    assert ei.stats()['tiers']['failed']['count'] == 1
+
+
+def test_record_teaches_cached_model(fake_supabase):
+    model = ei.get_model(fake_supabase({'transactions': HISTORY}), 'h1')
+    assert model.classify("bencina copec", ['super', 'salidas']) is None
+    ei.record('h1', 'bencina copec 40 lucas', 'salidas', 'vida', 'Copec')
+    ei.record('h1', 'copec 20 lucas', 'salidas', 'vida', 'Copec')
+    guess = model.classify("copec", ['super', 'salidas'])
+    assert guess['category_id'] == 'salidas' and guess['support'] == 2
+
+
+def test_categorize_batch_packs_dedupes_and_splits(monkeypatch):
+    from app.services.ai_advisor import AIAdvisorService
+
+    prompts = []
+
+    async def fake_generate(self, prompt, timeout=30.0):
+        import json
+        items = json.loads(prompt.split("GASTOS (JSON, \"i\" es el índice):")[1].split("CATEGORÍAS")[0])
+        prompts.append([it['text'] for it in items])
+        # The model drops "raro" whenever it comes with company
+        return [{'i': it['i'], 'category_id': 'super', 'bucket': 'oxigeno'}
+                for it in items if it['text'] != 'raro' or len(items) == 1]
+
+    monkeypatch.setattr(AIAdvisorService, "_generate_json", fake_generate)
+    advisor = AIAdvisorService()
+    texts = ["pan", "leche", "pan", "raro", "huevos", "queso", ""]
+    results = asyncio.run(advisor.categorize_batch(texts, CATEGORIES, batch_size=4))
+
+    assert prompts[:2] == [["pan", "leche", "raro", "huevos"], ["queso"]]
+    assert ["raro"] in prompts                          # split down until it answers
+    assert [r and r['category_id'] for r in results] == ['super'] * 6 + [None]
+
+
+def test_categorize_batch_backs_off_on_http_errors_without_splitting(monkeypatch):
+    import httpx
+    from app.services.ai_advisor import AIAdvisorService
+
+    prompts, statuses = [], []
+    request = httpx.Request("POST", "https://gemini.test")
+
+    async def fake_generate(self, prompt, timeout=30.0):
+        import json
+        items = json.loads(prompt.split("GASTOS (JSON, \"i\" es el índice):")[1].split("CATEGORÍAS")[0])
+        prompts.append(len(items))
+        status = statuses.pop(0) if statuses else 200
+        if status != 200:
+            raise httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+        return [{'i': it['i'], 'category_id': 'super', 'bucket': 'oxigeno'} for it in items]
+
+    monkeypatch.setattr(AIAdvisorService, "_generate_json", fake_generate)
+    monkeypatch.setattr(AIAdvisorService, "BATCH_BACKOFF", 0.0)
+    advisor = AIAdvisorService()
+
+    # 429 and 503: the same batch is retried, not halved
+    statuses[:] = [429, 503]
+    results = asyncio.run(advisor.categorize_batch(["pan", "leche", "huevos"], CATEGORIES))
+    assert prompts == [3, 3, 3]
+    assert [r['category_id'] for r in results] == ['super'] * 3
+
+    # A 400 gives the batch up at once
+    prompts.clear()
+    statuses[:] = [400]
+    results = asyncio.run(advisor.categorize_batch(["pan", "leche"], CATEGORIES))
+    assert prompts == [2] and results == [None, None]
+
+    # Retries are bounded
+    prompts.clear()
+    statuses[:] = [503] * 10
+    results = asyncio.run(advisor.categorize_batch(["pan", "leche"], CATEGORIES))
+    assert prompts == [2] * (AIAdvisorService.BATCH_RETRIES + 1) and results == [None, None]
+
+
+def test_recategorize_groups_updates(fake_supabase):
+    client = fake_supabase({
+        'transactions': [
+            {'id': 't1', 'household_id': 'h1', 'description': 'farmacia 5 lucas', 'category_id': None, 'occurred_on': '2026-03-09'},
+            {'id': 't2', 'household_id': 'h1', 'description': 'farmacia 7 lucas', 'category_id': None, 'occurred_on': '2026-03-10'},
+            {'id': 't3', 'household_id': 'h1', 'description': 'panadería 2 lucas', 'category_id': None, 'occurred_on': '2026-03-11'},
+        ] + [dict(r, id=f"old-{n}") for n, r in enumerate(HISTORY)],
+        'categories': [dict(c, household_id='h1') for c in CATEGORIES]
+    })
+    batches = []
+
+    async def batch_llm(texts, categories):
+        batches.append(list(texts))
+        return [{'category_id': 'super', 'bucket': 'oxigeno'} if 'farmacia' in t else None for t in texts]
+
+    report = asyncio.run(ei.recategorize(client, 'h1', batch_llm, apply=True))
+
+    assert batches == [['panadería 2 lucas', 'farmacia 7 lucas', 'farmacia 5 lucas']]
+    assert (report['scanned'], report['changed'], report['unresolved'], report['update_queries']) == (3, 2, 1, 1)
+    rows = {r['id']: r for r in client.tables['transactions']}
+    assert rows['t1']['category_id'] == rows['t2']['category_id'] == 'super'
+    assert rows['t3']['category_id'] is None
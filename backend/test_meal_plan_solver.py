@@ -0,0 +1,105 @@
+"""
+Cost-optimal meal plan proposals
+"""
+import time
+
+from app.services.meal_plan_solver import solve, month_days
+
+RECIPES = [
+    {"id": f"r{i}", "name": f"Receta {i}", "meal_type": "Almuerzo"} for i in range(1, 9)
+] + [
+    {"id": "d1", "name": "Panqueques", "meal_type": "Desayuno"},
+    {"id": "free", "name": "Sin costo", "meal_type": "Almuerzo"},
+]
+COSTS = {**{f"r{i}": 1000.0 * i for i in range(1, 9)}, "d1": 500.0}
+DAYS = month_days("2026-03")
+
+
+def _gaps(plan):
+    last, gaps = {}, []
+    for i, meal in enumerate(plan):
+        if meal["recipe_id"] in last:
+            gaps.append(i - last[meal["recipe_id"]])
+        last[meal["recipe_id"]] = i
+    return gaps
+
+
+def test_cheapest_rotation_respects_no_repeat():
+    result = solve([r for r in RECIPES if r["meal_type"] == "Almuerzo"], COSTS, DAYS, no_repeat_days=3)
+
+    assert len(result["meals"]) == 31
+    assert min(_gaps(result["meals"])) == 4
+    # Four cheapest recipes rotate; uncosted recipes are never proposed
+    assert {m["recipe_id"] for m in result["meals"]} == {"r1", "r2", "r3", "r4"}
+    assert result["total"] == sum(m["recipe_cost"] for m in result["meals"])
+    assert not result["relaxed_days"]
+
+
+def test_pins_and_type_mix():
+    pinned = {"2026-03-10": "r1", "2026-03-20": "r8"}
+    result = solve(RECIPES, COSTS, DAYS, no_repeat_days=3, pinned=pinned,
+                   min_per_type={"Almuerzo": 25}, max_per_type={"Desayuno": 2})
+    by_day = {m["date"]: m for m in result["meals"]}
+
+    assert by_day["2026-03-10"]["recipe_id"] == "r1" and by_day["2026-03-10"]["pinned"]
+    assert by_day["2026-03-20"]["recipe_cost"] == 8000
+    # r1 stays away from its pinned day
+    assert all(by_day[f"2026-03-{d:02d}"]["recipe_id"] != "r1" for d in (7, 8, 9, 11, 12, 13))
+    assert result["type_counts"]["desayuno"] == 2
+    assert result["type_counts"]["almuerzo"] == 29
+    assert not result["unmet_minimums"]
+
+
+def test_relaxes_when_infeasible_and_is_fast():
+    few = RECIPES[:2]
+    started = time.perf_counter()
+    result = solve(few, COSTS, DAYS, no_repeat_days=5)
+    assert time.perf_counter() - started < 0.5
+
+    assert len(result["meals"]) == 31
+    assert result["relaxed_days"]
+
+
+def test_budget_overrides_type_minimums():
+    recipes = [r for r in RECIPES if r["meal_type"] == "Almuerzo"] + [
+        {"id": "p1", "name": "Salmón", "meal_type": "Pescado"},
+        {"id": "p2", "name": "Reineta", "meal_type": "Pescado"},
+    ]
+    costs = {**COSTS, "p1": 20000.0, "p2": 25000.0}
+    mix = {"min_per_type": {"Pescado": 2}, "no_repeat_days": 3}
+
+    free = solve(recipes, costs, DAYS, **mix)
+    assert free["type_counts"]["pescado"] == 2
+
+    budget = free["total"] - 10000
+    capped = solve(recipes, costs, DAYS, budget=budget, **mix)
+
+    assert capped["total"] <= budget
+    assert capped["type_counts"]["pescado"] == 1
+    assert capped["unmet_minimums"] == {"pescado": 1}
+    assert len(capped["meals"]) == 31
+
+
+
+def test_budget_that_fits_keeps_the_cheapest_plan():
+    pinned = {"2026-03-31": "r8"}
+    free = solve(RECIPES, COSTS, DAYS, no_repeat_days=3, pinned=pinned)
+    capped = solve(RECIPES, COSTS, DAYS, no_repeat_days=3, pinned=pinned, budget=free["total"])
+
+    assert capped["meals"] == free["meals"]
+
+
+def test_no_repeat_counts_calendar_days():
+    # Every other day: a recipe may come back two slots later (4 calendar days)
+    days = DAYS[::2]
+    lunches = [r for r in RECIPES if r["meal_type"] == "Almuerzo"]
+    result = solve(lunches, COSTS, days, no_repeat_days=3)
+
+    assert [m["recipe_id"] for m in result["meals"][:4]] == ["r1", "r2", "r1", "r2"]
+    assert not result["relaxed_days"]
+
+    # A pin blocks the same calendar span on both sides
+    pinned = solve(lunches, COSTS, days, no_repeat_days=3, pinned={"2026-03-15": "r1"})
+    by_day = {m["date"]: m["recipe_id"] for m in pinned["meals"]}
+    assert by_day["2026-03-13"] != "r1" and by_day["2026-03-17"] != "r1"
+    assert by_day["2026-03-09"] == "r1" and by_day["2026-03-19"] == "r1"
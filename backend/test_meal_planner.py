@@ -0,0 +1,90 @@
+"""
+Meal plan saves as a single upsert
+"""
+from app.core.config import settings
+from app.services import recipe_index, recipe_costing, price_matrix
+from app.api.routes import meal_planner
+from app.api.routes.meal_planner import MealPlanPayload, save_meal_plan
+
+HOUSEHOLD = "hh-1"
+USER = {"household_id": HOUSEHOLD}
+
+
+def test_month_save_is_one_upsert(tmp_path, monkeypatch, fake_supabase):
+    recipes_csv, ingredients_csv = tmp_path / "recetas.csv", tmp_path / "ingredientes.csv"
+    recipes_csv.write_text("Receta,Tipo de comida,Valor receta\nPorotos,Almuerzo,3000\n", encoding="utf-8")
+    ingredients_csv.write_text(
+        "RECETA,Ingredientes en receta,Producto de despensa,Cantidad necesaria en unidad base,Unidad de medida de receta,Precio gramo\n"
+        "Porotos,Porotos,Porotos,500,Gr,4\n", encoding="utf-8")
+    monkeypatch.setattr(settings, "recipe_snapshot_path", str(tmp_path / "snapshot.json"))
+    monkeypatch.setattr(recipe_index, "RECIPES_CSV", recipes_csv)
+    monkeypatch.setattr(recipe_index, "INGREDIENTS_CSV", ingredients_csv)
+    recipe_index.invalidate()
+    recipe_costing.invalidate()
+    price_matrix.invalidate()
+    supabase = fake_supabase({
+        "meal_plans": [
+            {"id": "old", "household_id": HOUSEHOLD, "date": "2026-03-01", "type": "lunch", "recipe_name": "Lentejas", "recipe_cost": 4000},
+        ],
+        "products": [{"id": "p1", "household_id": HOUSEHOLD, "name_norm": "Porotos"}],
+        "product_prices": [
+            {"household_id": HOUSEHOLD, "product_id": "p1", "store_id": "s1", "unit": "g",
+             "unit_price": 5, "date": "2026-02-01", "created_at": "2026-02-01T10:00:00"},
+        ],
+        "stores": [{"id": "s1", "household_id": HOUSEHOLD, "name": "Lider"}],
+    })
+    meals = [
+        MealPlanPayload(date=f"2026-03-{day:02d}", type=kind, recipe_name="Porotos", recipe_cost=3000)
+        for day in range(1, 31) for kind in ("lunch", "dinner")
+    ]
+    # A repeated (date, type) keeps the last entry
+    meals.append(MealPlanPayload(date="2026-03-02", type="lunch", recipe_name="Charquicán", recipe_cost=3500))
+
+    result = save_meal_plan(meals, user=USER, supabase=supabase)
+
+    assert result == {"success": True, "count": 60}
+    # Costing reads (cold caches: price version, price scan, products, stores,
+    # products for the cost model), then the meals in one upsert
+    assert supabase.calls == [
+        ("product_prices", "select"), ("product_prices", "select"), ("products", "select"),
+        ("stores", "select"), ("products", "select"), ("meal_plans", "upsert"),
+    ]
+    rows = {(r["date"], r["type"]): r for r in supabase.tables["meal_plans"]}
+    assert len(rows) == 60
+    assert rows[("2026-03-01", "lunch")]["id"] == "old"
+    assert rows[("2026-03-01", "lunch")]["recipe_name"] == "Porotos"
+    assert rows[("2026-03-01", "lunch")]["recipe_cost"] == 2500
+    assert rows[("2026-03-02", "lunch")]["recipe_name"] == "Charquicán"
+
+    # Warm caches: only the price version check besides the upsert
+    supabase.calls.clear()
+    save_meal_plan(meals, user=USER, supabase=supabase)
+    assert supabase.calls == [("product_prices", "select"), ("meal_plans", "upsert")]
+
+
+def test_live_cost_replaces_submitted_cost(fake_supabase, monkeypatch):
+    monkeypatch.setattr(meal_planner.recipe_costing, "get_costs",
+                        lambda supabase, hh: {"r1": {"cost": 4200}})
+    supabase = fake_supabase({})
+
+    save_meal_plan([MealPlanPayload(date="2026-03-03", recipe_id="r1", recipe_cost=1000)], user=USER, supabase=supabase)
+
+    assert supabase.tables["meal_plans"][0]["recipe_cost"] == 4200
+
+
+def test_accepted_proposal_is_one_upsert(fake_supabase, monkeypatch):
+    monkeypatch.setattr(meal_planner.meal_plan_solver, "recipe_cost_vector",
+                        lambda supabase, hh: {"r1": 3000.0, "r2": 4000.0, "r3": 5000.0})
+    monkeypatch.setattr(meal_planner.meal_plan_solver.recipe_index, "get_index",
+                        lambda path: meal_planner.meal_plan_solver.recipe_index.RecipeIndex([
+                            {"id": f"r{i}", "name": f"Receta {i}", "meal_type": "Almuerzo"} for i in (1, 2, 3)
+                        ]))
+    supabase = fake_supabase({"households": [{"id": HOUSEHOLD, "settings": {"food_budget": 100000}}]})
+
+    payload = meal_planner.MealPlanProposal(month="2026-02", no_repeat_days=2, save=True)
+    result = meal_planner.propose_meal_plan(payload, user=USER, supabase=supabase)
+
+    assert result["saved"] and len(result["meals"]) == 28
+    assert result["budget"] == 100000 and not result["within_budget"]
+    assert [c for c in supabase.calls if c[1] != "select"] == [("meal_plans", "upsert")]
+    assert len(supabase.tables["meal_plans"]) == 28
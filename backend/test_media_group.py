@@ -0,0 +1,81 @@
+"""
+Telegram albums: one receipt, one extraction call for all the photos
+"""
+import asyncio
+
+from app.services import ai_extractor
+from app.services.media_group_buffer import MediaGroupBuffer
+
+
+def test_album_collected_once_by_leader_in_message_order():
+    async def run():
+        buffer = MediaGroupBuffer(window=0.05)
+        assert buffer.add("g1", 10, 102, "foto-b")
+        assert not buffer.add("g1", 11, 101, "foto-a")
+
+        async def late():
+            await asyncio.sleep(0.02)
+            buffer.add("g1", 12, 103, "foto-c")
+
+        follower, leader, _ = await asyncio.gather(
+            buffer.collect("g1", 11),
+            buffer.collect("g1", 10),
+            late()
+        )
+        assert follower is None
+        # After the group is taken a stray photo opens a new group
+        assert buffer.add("g1", 13, 104, "foto-d")
+        return leader, await buffer.collect("g1", 13), len(buffer)
+
+    leader, stray, left = asyncio.run(run())
+    assert leader == ["foto-a", "foto-b", "foto-c"]
+    assert stray == ["foto-d"]
+    assert left == 0
+
+
+def test_album_stops_waiting_when_full():
+    async def run():
+        buffer = MediaGroupBuffer(window=10, max_items=2)
+        buffer.add("g", 1, 1, "a")
+        buffer.add("g", 2, 2, "b")
+        return await asyncio.wait_for(buffer.collect("g", 1), timeout=1)
+
+    assert asyncio.run(run()) == ["a", "b"]
+
+
+def test_extract_many_sends_every_image_in_one_request(monkeypatch):
+    calls = {'get': [], 'post': []}
+
+    class Resp:
+        def __init__(self, payload=None):
+            self.status_code = 200
+            self.headers = {"Content-Type": "image/png"}
+            self.content = b"img"
+            self._payload = payload
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self._payload
+
+    def fake_get(url, timeout):
+        calls['get'].append(url)
+        return Resp()
+
+    def fake_post(url, json, headers, timeout):
+        calls['post'].append(json)
+        text = '{"store": {"name": "Lider"}, "items": [], "total": 1000, "confidence_overall": 0.9}'
+        return Resp({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    monkeypatch.setattr(ai_extractor.requests, "get", fake_get)
+    monkeypatch.setattr(ai_extractor.requests, "post", fake_post)
+
+    result = ai_extractor.GeminiVisionExtractor("key").extract_many(["u1", "u2", "u3"])
+
+    assert result.success and result.data['store_name'] == "Lider"
+    assert calls['get'] == ["u1", "u2", "u3"]
+    assert len(calls['post']) == 1
+    parts = calls['post'][0]["contents"][0]["parts"]
+    assert "MULTIPLE IMAGES" in parts[0]["text"]
+    assert [p["inline_data"]["mime_type"] for p in parts[1:]] == ["image/png"] * 3
@@ -0,0 +1,27 @@
+"""
+Shared memoized name normalizers
+"""
+import pandas as pd
+
+from app.services.name_normalizer import normalize_name, normalize_term, normalize_key, dedupe_key, normalize_batch
+
+
+def test_normalize_name_strips_codes():
+    assert normalize_name("ARROZ GRADO 2 COD (12345) 1KG") == "Arroz Grado 2 1Kg"
+    assert normalize_name("PALTA HASS PLU 4046") == "Palta Hass"
+    assert normalize_name("leche (7801234) 1L*") == "Leche 1L"
+    assert dedupe_key("Arroz  grado 2") == "arrozgrado2"
+
+
+def test_term_and_key():
+    assert normalize_term("Azúcar  1KG") == "azucar 1kg"
+    assert normalize_key("  Miel De  Abeja ") == "miel de abeja"
+
+
+def test_batch_list_and_series():
+    names = ["ARROZ COD 1", "ARROZ COD 1", None, "Té verde"]
+    assert normalize_batch(names) == ["Arroz 1", "Arroz 1", "", "Té Verde"]
+
+    series = normalize_batch(pd.Series(names), normalize_key)
+    assert series.tolist()[:2] == ["arroz cod 1", "arroz cod 1"]
+    assert pd.isna(series[2])
@@ -0,0 +1,71 @@
+"""
+Product × store price matrix: one scan, cached until prices change
+"""
+from app.services import price_matrix
+
+HOUSEHOLD = "hh-1"
+
+
+def _price(pid, sid, price, day, unit="unit", created="00"):
+    return {"household_id": HOUSEHOLD, "product_id": pid, "store_id": sid, "unit": unit,
+            "unit_price": price, "date": f"2026-03-{day:02d}", "created_at": f"2026-03-{day:02d}T10:{created}:00"}
+
+
+def _tables():
+    return {
+        "product_prices": [
+            _price("p1", "s1", 1000, 1), _price("p1", "s1", 1200, 5), _price("p1", "s1", 1100, 3),
+            _price("p1", "s2", 900, 2),
+            _price("p2", "s1", 2500, 4, unit="kg"), _price("p2", "s2", 2300, 4, unit="kg"),
+            _price("p2", "s2", 400, 6, unit="unit"),
+        ],
+        "products": [
+            {"id": "p1", "household_id": HOUSEHOLD, "name_norm": "Leche", "category_tag": "lacteos", "group": "despensa"},
+            {"id": "p2", "household_id": HOUSEHOLD, "name_norm": "Pollo", "category_tag": "carnes", "group": "frescos"},
+        ],
+        "stores": [
+            {"id": "s1", "household_id": HOUSEHOLD, "name": "Lider"},
+            {"id": "s2", "household_id": HOUSEHOLD, "name": "Jumbo"},
+        ],
+    }
+
+
+def test_matrix_latest_median_and_dominant_unit(fake_supabase):
+    price_matrix.invalidate()
+    matrix = price_matrix.get_matrix(fake_supabase(_tables()), HOUSEHOLD)
+
+    by_id = {p["product_id"]: p for p in matrix["products"]}
+    leche = by_id["p1"]["prices"]
+    assert leche["s1"] == {"latest": 1200.0, "median": 1100.0, "count": 3, "last_date": "2026-03-05"}
+    assert by_id["p1"]["cheapest_store_id"] == "s2"
+
+    # Pollo is compared per kg; the lone per-unit purchase is ignored
+    assert by_id["p2"]["unit"] == "kg"
+    assert set(by_id["p2"]["prices"]) == {"s1", "s2"}
+    assert [s["name"] for s in matrix["stores"]] == ["Jumbo", "Lider"]
+
+
+def test_matrix_cached_until_new_price(fake_supabase):
+    price_matrix.invalidate()
+    supabase = fake_supabase(_tables())
+    price_matrix.get_matrix(supabase, HOUSEHOLD)
+
+    supabase.calls.clear()
+    price_matrix.get_matrix(supabase, HOUSEHOLD)
+    assert supabase.calls == [("product_prices", "select")]
+
+    supabase.tables["product_prices"].append(_price("p1", "s1", 800, 7))
+    matrix = price_matrix.get_matrix(supabase, HOUSEHOLD)
+    leche = next(p for p in matrix["products"] if p["product_id"] == "p1")
+    assert leche["prices"]["s1"]["latest"] == 800.0
+    assert leche["cheapest_store_id"] == "s1"
+
+
+def test_filter_by_category_and_group(fake_supabase):
+    price_matrix.invalidate()
+    matrix = price_matrix.get_matrix(fake_supabase(_tables()), HOUSEHOLD)
+
+    carnes = price_matrix.filter_matrix(matrix, category_tag="carnes")
+    assert [p["product_id"] for p in carnes["products"]] == ["p2"]
+    assert price_matrix.filter_matrix(matrix, group="despensa")["products"][0]["product_id"] == "p1"
+    assert price_matrix.filter_matrix(matrix, category_tag="carnes", group="despensa")["products"] == []
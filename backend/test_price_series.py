@@ -0,0 +1,83 @@
+"""
+Packed price series: LTTB downsampling, chart payload and product insight
+"""
+import random
+from datetime import date
+
+from app.domain import price_series
+from app.domain.price_series import lttb, to_payload, build_series
+from app.api.routes.products import get_product_insight
+
+HOUSEHOLD = "hh-1"
+USER = {"household_id": HOUSEHOLD}
+
+
+def _records(n, start=date(2025, 1, 1).toordinal()):
+    rng = random.Random(7)
+    return [
+        {"date": date.fromordinal(start + i).isoformat(), "unit_price": 1000 + rng.randint(-200, 200),
+         "store_id": f"s{i % 3}", "qty": 1, "unit": "unit"}
+        for i in range(n)
+    ]
+
+
+def test_lttb_keeps_ends_and_extremes():
+    xs = list(range(100))
+    ys = [10.0] * 100
+    ys[37], ys[71] = 500.0, -300.0
+
+    kept = lttb(xs, ys, 10)
+
+    assert len(kept) == 10
+    assert kept[0] == 0 and kept[-1] == 99
+    assert kept == sorted(kept)
+    assert 37 in kept and 71 in kept
+
+
+def test_lttb_short_series_untouched():
+    assert lttb([1, 2, 3], [1, 2, 3], 10) == [0, 1, 2]
+    assert lttb(list(range(5)), list(range(5)), 2) == [0, 1, 2, 3, 4]
+
+
+def test_to_payload_sorts_filters_and_downsamples():
+    series = build_series("p1", _records(50))
+    # Out of date order, as rows appended by the database trigger can be
+    price_series.append_point(series, "2024-12-01", 700, "s9", 500, "g")
+    series["d"].append(series["d"].pop(0))
+    series["p"].append(series["p"].pop(0))
+    series["s"].append(series["s"].pop(0))
+    series["q"].append(series["q"].pop(0))
+    series["u"].append(series["u"].pop(0))
+
+    full = to_payload(series)
+    assert full["dates"] == sorted(full["dates"])
+    assert full["total_points"] == 51
+
+    grams = to_payload(series, unit="g")
+    assert grams["dates"] == ["2024-12-01"] and grams["unit_prices"] == [700]
+
+    chart = to_payload(series, points=12, unit="unit")
+    assert len(chart["dates"]) == 12
+    assert chart["dates"][0] == full["dates"][1] and chart["dates"][-1] == full["dates"][-1]
+    assert chart["total_points"] == 51
+
+
+def test_insight_lists_recent_purchases_from_full_series(fake_supabase):
+    prices = [dict(r, household_id=HOUSEHOLD, product_id="p1") for r in _records(60)]
+    stores = [{"id": f"s{i}", "name": f"Tienda {i}"} for i in range(3)]
+    supabase = fake_supabase({
+        "products": [{"id": "p1", "name_norm": "leche"}],
+        "product_prices": prices,
+        "stores": stores,
+    })
+
+    insight = get_product_insight("p1", points=5, user=USER, supabase=supabase)
+
+    assert len(insight["series"]["dates"]) == 5
+    recent = insight["prices"]
+    assert len(recent) == 20
+    # The 20 newest purchases, consecutive days, not the downsampled chart points
+    assert [p["date"] for p in recent] == [r["date"] for r in reversed(prices[-20:])]
+    assert [p["unit_price"] for p in recent] == [r["unit_price"] for r in reversed(prices[-20:])]
+    assert all(p["store_name"] == f"Tienda {p['store_id'][1:]}" for p in recent)
+    assert supabase.calls.count(("product_prices", "select")) == 1
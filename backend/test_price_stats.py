@@ -0,0 +1,77 @@
+"""
+Log-bucketed price quantile sketch
+"""
+import random
+from datetime import datetime
+
+from app.domain import price_stats
+from app.domain.logic import percentile, compute_product_status, compute_product_status_from_stats
+from app.domain.models import ProductPrice
+from app.services.price_stats import PriceStatsService
+
+
+def test_quantiles_within_relative_accuracy():
+    rng = random.Random(3)
+    for _ in range(20):
+        values = [rng.lognormvariate(7, 0.6) for _ in range(rng.randint(1, 400))]
+        stats = price_stats.build_stats((v, None) for v in values)
+
+        assert stats['count'] == len(values)
+        assert stats['min'] == min(values) and stats['max'] == max(values)
+        for p in (0.0, 0.25, 0.5, 0.75, 0.95, 1.0):
+            exact = percentile(values, p)
+            assert abs(price_stats.quantile(stats, p) - exact) <= price_stats.RELATIVE_ACCURACY * exact + 1e-9
+
+
+def test_zero_prices_and_empty_stats():
+    assert price_stats.quantile(price_stats.new_stats(), 0.5) == 0.0
+
+    stats = price_stats.build_stats([(0, None), (0, None), (1000, None)])
+    assert price_stats.quantile(stats, 0.5) == 0.0
+    assert abs(price_stats.quantile(stats, 0.9) - 1000) <= 1000 * price_stats.RELATIVE_ACCURACY
+    assert price_stats.mean_price(stats) == 1000 / 3
+
+
+def test_bucket_cap_collapses_lowest_prices_first():
+    values = [1.05 ** i for i in range(300)]
+    stats = price_stats.build_stats((v, None) for v in values)
+
+    assert len(stats['sketch']) <= price_stats.MAX_BUCKETS
+    assert sum(stats['sketch'].values()) == len(values)
+    # High quantiles keep their accuracy
+    exact = percentile(values, 0.95)
+    assert abs(price_stats.quantile(stats, 0.95) - exact) <= price_stats.RELATIVE_ACCURACY * exact
+
+
+def test_latest_price_is_by_purchase_date():
+    stats = price_stats.new_stats()
+    price_stats.add_price(stats, 1200, datetime(2026, 3, 10))
+    price_stats.add_price(stats, 900, datetime(2026, 1, 5))  # old receipt confirmed late
+
+    assert stats['last_price'] == 1200
+    assert stats['last_date'] == datetime(2026, 3, 10)
+
+
+def test_status_from_stats_matches_exact_rule():
+    # Price levels further apart than a bucket, so rounding can't flip a comparison
+    levels = [round(800 * 1.1 ** k) for k in range(8)]
+    rng = random.Random(11)
+    for _ in range(200):
+        values = [rng.choice(levels) for _ in range(rng.randint(3, 30))]
+        prices = [ProductPrice(product_id="p1", unit_price=v, date=datetime(2026, 1, 1)) for v in values]
+        stats = price_stats.build_stats((v, None) for v in values)
+
+        assert compute_product_status_from_stats(stats) == compute_product_status(prices)
+
+
+def test_build_doc_slots_by_unit_and_store():
+    doc = PriceStatsService.build_doc("p1", [
+        {"store_id": "s1", "unit": "kg", "unit_price": 1500, "date": "2026-01-02"},
+        {"store_id": "s2", "unit": "kg", "unit_price": 1700, "date": "2026-01-01"},
+        {"store_id": "s1", "unit": "unit", "unit_price": 990, "date": "2026-01-03"},
+    ])
+
+    assert doc['overall']['count'] == 3 and doc['overall']['last_price'] == 990
+    assert doc['by_unit']['kg']['count'] == 2 and doc['by_unit']['kg']['last_price'] == 1500
+    assert set(doc['by_store_unit']) == {"s1__kg", "s2__kg", "s1__unit"}
+    assert doc['by_store_unit']["s2__kg"]['store_id'] == "s2"
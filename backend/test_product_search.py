@@ -0,0 +1,86 @@
+"""
+In-memory product search index
+"""
+import threading
+
+from app.services import product_search
+from app.services.product_search import ProductSearchIndex
+
+HOUSEHOLD = "hh-1"
+
+
+def _index():
+    index = ProductSearchIndex()
+    index.add("p1", {"name_norm": "arroz grado 2", "name_raw": "ARROZ GRADO 2 1KG", "aliases": ["arroz tucapel"]})
+    index.add("p2", {"name_norm": "arroz integral"})
+    index.add("p3", {"name_norm": "leche entera", "brand": "Colun"})
+    return index
+
+
+def test_exact_prefix_token_and_fuzzy():
+    index = _index()
+
+    assert [(s, p["id"]) for s, p in index.search("Arroz Grado 2")] == [(1.0, "p1")]
+    assert {p["id"] for _, p in index.search("arroz")} == {"p1", "p2"}
+    assert index.best("arroz tucapel")["id"] == "p1"
+    assert index.best("leche entera colun")["id"] == "p3"
+    # Token match away from the start of the name
+    assert index.best("integral")["id"] == "p2"
+    # Typos fall through to the fuzzy stage
+    assert index.best("lece entera")["id"] == "p3"
+    assert index.search("detergente") == []
+    assert index.search("   ") == []
+
+
+def test_short_query_does_not_prefix_match_a_longer_word():
+    index = _index()
+    index.add("p4", {"name_norm": "salchicha viena"})
+
+    assert index.best("sal") is None
+    assert index.best("salchicha")["id"] == "p4"
+
+    index.add("p5", {"name_norm": "sal"})
+    index.add("p6", {"name_norm": "sal de mar"})
+    assert [p["id"] for _, p in index.search("sal")] == ["p5", "p6"]
+
+
+def test_replace_and_remove():
+    index = _index()
+    index.add("p2", {"name_norm": "arroz largo fino"})
+
+    assert index.best("arroz integral")["id"] != "p2"
+    assert index.best("arroz largo")["id"] == "p2"
+
+    index.remove("p1")
+    index.remove("missing")
+    assert len(index) == 2
+    assert all(p["id"] != "p1" for _, p in index.search("arroz"))
+    assert index.search("tucapel") == []
+    assert "grado" not in index._tokens and "tucapel" not in index._tokens
+
+
+def test_index_product_updates_cached_index_while_searching(monkeypatch):
+    index = _index()
+    monkeypatch.setattr(product_search, "_INDEXES", {HOUSEHOLD: index})
+    errors, stop = [], threading.Event()
+
+    def searcher():
+        while not stop.is_set():
+            try:
+                index.search("arroz")
+                index.search("aros")
+            except Exception as e:  # a list mutated mid-scan would surface here
+                errors.append(e)
+
+    threads = [threading.Thread(target=searcher) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for i in range(300):
+        product_search.index_product(HOUSEHOLD, f"n{i % 20}", {"name_norm": f"arroz nuevo {i}"})
+    stop.set()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(index) == 23
+    assert index.best("arroz nuevo 299")["id"] == "n19"
@@ -0,0 +1,64 @@
+"""
+Vectorized product statuses and the strategic products listing
+"""
+import random
+from datetime import datetime
+
+from app.domain.logic import compute_product_status, compute_product_statuses
+from app.domain.models import ProductPrice, Status
+from app.api.routes.products import _dominant_unit_prices, get_strategic_products
+
+HOUSEHOLD = "hh-1"
+USER = {"household_id": HOUSEHOLD}
+
+
+def _scalar(values):
+    return compute_product_status([ProductPrice(product_id="p", unit_price=v, date=datetime(2026, 1, 1)) for v in values])
+
+
+def test_vectorized_matches_scalar():
+    rng = random.Random(5)
+    prices_by_product = {}
+    for i in range(500):
+        n = rng.choice([0, 1, 2, 3, 4, 7, 20, 60])
+        # Few distinct levels so ties with the percentiles are common
+        prices_by_product[f"p{i}"] = [rng.choice([990, 1090, 1190, 1290, 1490]) for _ in range(n)]
+
+    statuses = compute_product_statuses(prices_by_product)
+
+    assert statuses == {pid: _scalar(values) for pid, values in prices_by_product.items()}
+    assert set(statuses.values()) == {Status.GREEN, Status.YELLOW, Status.RED}
+
+
+def test_vectorized_edge_cases():
+    assert compute_product_statuses({}) == {}
+    assert compute_product_statuses({"a": [], "b": []}) == {"a": Status.GREEN, "b": Status.GREEN}
+    assert compute_product_statuses({"a": [1000, 2000], "b": [1000, 1000, 1000, 1000, 5000], "c": []}) == {
+        "a": Status.GREEN, "b": Status.RED, "c": Status.GREEN
+    }
+
+
+def test_same_day_purchases_keep_recorded_order():
+    row = {"d": [10, 12, 12, 11], "p": [1000, 1500, 900, 1200], "u": [0, 0, 0, 1], "units": ["kg", "unit"]}
+
+    prices, unit = _dominant_unit_prices(row)
+
+    # Day 12 was bought at 1500 then 900: the latest is 900, not the higher one
+    assert prices == [1000, 1500, 900] and unit == "kg"
+    assert _dominant_unit_prices({"d": [], "p": [], "u": []}) == ([], None)
+
+
+def test_strategic_products_reads_series_in_one_query(fake_supabase):
+    supabase = fake_supabase({
+        "products": [{"id": "p1", "household_id": HOUSEHOLD}, {"id": "p2", "household_id": HOUSEHOLD}],
+        "product_price_series": [
+            {"product_id": "p1", "d": [1, 2, 3, 4, 5], "p": [1000, 1000, 1000, 1000, 1400], "u": [0, 0, 0, 0, 0], "units": ["unit"]},
+        ],
+    })
+
+    products = {p["id"]: p for p in get_strategic_products(category=None, user=USER, supabase=supabase)}
+
+    assert products["p1"]["status"] == Status.RED.value
+    assert products["p1"]["latest_price"] == {"unit_price": 1400, "unit": "unit"}
+    assert products["p2"]["status"] == Status.GREEN.value and products["p2"]["latest_price"] is None
+    assert supabase.calls == [("products", "select"), ("product_price_series", "select")]
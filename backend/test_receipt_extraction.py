@@ -0,0 +1,167 @@
+"""
+Tiered receipt extraction: cheap model first, escalate only when needed
+"""
+import json as jsonlib
+import threading
+import time
+
+import pytest
+
+from app.services import ai_extractor
+
+
+GOOD = {"store": {"name": "Lider", "confidence": 0.9}, "total": 3000, "confidence_overall": 0.9,
+        "items": [{"name": "Pan", "line_total": 1000}, {"name": "Leche", "line_total": 2000}]}
+
+
+class Resp:
+    def __init__(self, payload=None, status_code=200):
+        self.status_code = status_code
+        self.headers = {"Content-Type": "image/jpeg"}
+        self.content = b"img"
+        self.text = "error"
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """answers[model] is a list of replies (dict, raw text or HTTP status) used in order"""
+    answers, calls = {}, []
+
+    def fake_post(url, json, headers, timeout):
+        model = url.split("/models/")[1].split(":")[0]
+        prompt = json["contents"][0]["parts"][0]["text"]
+        calls.append((model, "best-effort" in prompt))
+        reply = answers[model].pop(0)
+        if isinstance(reply, int):
+            return Resp(status_code=reply)
+        text = reply if isinstance(reply, str) else jsonlib.dumps(reply)
+        return Resp({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    monkeypatch.setattr(ai_extractor.requests, "get", lambda url, timeout: Resp())
+    monkeypatch.setattr(ai_extractor.requests, "post", fake_post)
+    monkeypatch.setattr(ai_extractor, "_STATS", {'receipts': 0, 'escalated': 0, 'tiers': {}})
+    return answers, calls
+
+
+def test_good_answer_stays_on_cheap_model(gemini):
+    answers, calls = gemini
+    answers["flash"] = [GOOD]
+    result = ai_extractor.GeminiVisionExtractor("key", "flash", "pro").extract("u1")
+
+    assert result.success and calls == [("flash", False)]
+    assert result.data['extraction']['tier'] == 'primary' and not result.data['extraction']['escalated']
+    stats = ai_extractor.extraction_stats()
+    assert stats['escalation_rate'] == 0 and stats['tiers']['primary']['count'] == 1
+
+
+def test_unreconciled_answer_escalates_to_strong_model(gemini):
+    answers, calls = gemini
+    answers["flash"] = [dict(GOOD, total=9000)]
+    answers["pro"] = [GOOD]
+    result = ai_extractor.GeminiVisionExtractor("key", "flash", "pro").extract("u1")
+
+    assert calls == [("flash", False), ("pro", False)]
+    assert result.data['total'] == 3000 and result.data['extraction']['model'] == "pro"
+    assert result.data['extraction']['attempts'][0]['reasons'] == ['unreconciled']
+    stats = ai_extractor.extraction_stats()
+    assert stats['escalation_rate'] == 1.0
+    assert stats['tiers']['primary']['reasons'] == {'unreconciled': 1}
+
+
+def test_best_answer_kept_when_every_tier_is_doubtful(gemini):
+    answers, calls = gemini
+    blurry = dict(GOOD, is_blurry=True, confidence_overall=0.7)
+    answers["flash"] = ["not json at all", dict(blurry, confidence_overall=0.3)]
+    result = ai_extractor.GeminiVisionExtractor("key", "flash").extract("u1")
+
+    # Same model for both tiers: straight to the best-effort prompt
+    assert calls == [("flash", False), ("flash", True)]
+    assert result.success and result.data['extraction']['tier'] == 'best_effort'
+    assert result.data['extraction']['attempts'][0]['reasons'] == ['invalid']
+
+
+def test_all_tiers_failing_is_an_error(gemini):
+    answers, calls = gemini
+    answers["flash"] = [500]
+    answers["pro"] = [500, "{}"]
+    result = ai_extractor.GeminiVisionExtractor("key", "flash", "pro").extract("u1")
+
+    assert not result.success and len(calls) == 3
+    assert ai_extractor.extraction_stats()['tiers']['best_effort']['reasons'] == {'invalid': 1}
+
+
+def test_hedge_deadline_follows_recent_latency():
+    policy = ai_extractor.HedgePolicy(percentile=0.9, default_delay=8.0, min_delay=0.5, min_samples=10)
+    assert policy.delay("flash") == 8.0
+    for n in range(1, 11):
+        policy.observe("flash", float(n))
+    assert policy.delay("flash") == 10.0
+    policy.observe("pro", 0.1)
+    assert policy.delay("pro") == 8.0
+
+
+def test_slow_call_is_hedged_and_fast_answer_wins():
+    policy = ai_extractor.HedgePolicy(default_delay=0.05, max_inflight=1)
+
+    def slow():
+        time.sleep(0.5)
+        return "lento"
+
+    started = time.perf_counter()
+    assert policy.run("flash", slow, "pro", lambda: "rápido") == "rápido"
+    assert time.perf_counter() - started < 0.4
+    assert policy.run("flash", lambda: "a tiempo", "pro", lambda: "nunca") == "a tiempo"
+    assert policy.stats == {'calls': 2, 'hedged': 1, 'hedge_wins': 1, 'capped': 0}
+
+
+def test_hedging_is_capped_and_failures_fall_through():
+    policy = ai_extractor.HedgePolicy(default_delay=0.02, max_inflight=1)
+    release = threading.Event()
+
+    def stuck():
+        release.wait(1)
+        return "tarde"
+
+    def boom():
+        raise ValueError("Missing 'items' field")
+
+    # Hedge slot taken by a hedge that never finishes first
+    first = threading.Thread(target=lambda: policy.run("flash", stuck, "pro", stuck))
+    first.start()
+    time.sleep(0.1)
+    threading.Timer(0.1, release.set).start()
+    assert policy.run("flash", lambda: (time.sleep(0.05), "sin hedge")[1], "pro", boom) == "sin hedge"
+    first.join()
+    assert policy.stats['capped'] == 1
+
+    # An invalid hedge doesn't beat a valid (slower) primary
+    assert policy.run("flash", lambda: (time.sleep(0.1), "válido")[1], "pro", boom) == "válido"
+    with pytest.raises(ValueError):
+        policy.run("flash", boom, "pro", boom)
+
+
+def test_extractor_hedges_slow_model(gemini, monkeypatch):
+    answers, calls = gemini
+    answers["flash"] = [GOOD]
+    answers["pro"] = [dict(GOOD, store={"name": "Jumbo", "confidence": 0.9})]
+    post = ai_extractor.requests.post
+
+    def slow_flash(url, json, headers, timeout):
+        if "/flash:" in url:
+            time.sleep(0.3)
+        return post(url, json=json, headers=headers, timeout=timeout)
+
+    monkeypatch.setattr(ai_extractor.requests, "post", slow_flash)
+    policy = ai_extractor.HedgePolicy(default_delay=0.05)
+    extractor = ai_extractor.GeminiVisionExtractor("key", "flash", hedge=True, hedge_model="pro", hedge_policy=policy)
+    result = extractor.extract("u1")
+
+    assert result.success and result.data['store_name'] == "Jumbo"
+    assert policy.stats['hedge_wins'] == 1
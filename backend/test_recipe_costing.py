@@ -0,0 +1,98 @@
+"""
+Live recipe costs from the price index
+"""
+from app.services.recipe_costing import RecipeCostModel
+from app.services.recipe_index import strip_link
+
+RECIPES = [
+    {"id": "r1", "name": "Arroz con carne"},
+    {"id": "r2", "name": "Pan amasado"},
+    {"id": "r3", "name": "Ensalada"},
+]
+LINES = [
+    {"recipe": "Arroz con carne", "ingredient": "Arroz", "product": "Arroz Grado 2", "qty": 200, "unit": "g", "static_unit_price": 2},
+    {"recipe": "Arroz con carne", "ingredient": "Carne", "product": "Carne Molida", "qty": 300, "unit": "g", "static_unit_price": 10},
+    {"recipe": "Pan amasado", "ingredient": "Harina", "product": "Harina", "qty": 500, "unit": "g", "static_unit_price": 1},
+    {"recipe": "Ensalada", "ingredient": "Lechuga", "product": "Lechuga Escarola", "qty": 1, "unit": "unit", "static_unit_price": 900},
+    {"recipe": "Receta borrada", "ingredient": "Sal", "product": "Sal", "qty": 5, "unit": "g", "static_unit_price": 1},
+]
+PRODUCTS = [
+    {"id": "p1", "name_norm": "Arroz Grado 2"},
+    {"id": "p2", "name_norm": "Carne Molida"},
+    {"id": "p3", "name_norm": "Harina"},
+]
+
+
+def test_strip_link():
+    assert strip_link("Pan (Recetario%20Familiar/Pan%2024388a.csv)") == "Pan"
+    assert strip_link("Harina 0000 (Despensa%20Productos%20(Maestra)/Harina%200000.csv)") == "Harina 0000"
+    assert strip_link("Harina") == "Harina"
+
+
+def test_costs_mix_live_and_static_prices():
+    # Arroz priced per kg, carne per g; harina never bought
+    unit_prices = {
+        "p1": {"unit": "kg", "latest": 1500.0},
+        "p2": {"unit": "g", "latest": 9.0},
+    }
+    costs = RecipeCostModel(RECIPES, LINES, PRODUCTS, unit_prices).as_dict()
+
+    assert costs["r1"] == {"cost": 3000, "priced_products": 2, "products": 2, "ingredients": 2, "source": "live"}
+    assert costs["r2"]["cost"] == 500 and costs["r2"]["source"] == "static"
+    assert costs["r3"]["cost"] == 900 and costs["r3"]["products"] == 0
+
+
+def test_incremental_update_matches_full_rebuild():
+    before = {"p1": {"unit": "kg", "latest": 1500.0}, "p2": {"unit": "g", "latest": 9.0}}
+    after = {"p1": {"unit": "kg", "latest": 1800.0}, "p2": {"unit": "g", "latest": 9.0}, "p3": {"unit": "g", "latest": 1.4}}
+
+    model = RecipeCostModel(RECIPES, LINES, PRODUCTS, before)
+    assert model.update_prices(after) == 2
+    assert model.update_prices(after) == 0
+    assert model.as_dict() == RecipeCostModel(RECIPES, LINES, PRODUCTS, after).as_dict()
+    assert model.as_dict()["r1"]["cost"] == 3060
+    assert model.as_dict()["r2"]["cost"] == 700
+
+    # A product losing its price falls back to the Notion cost
+    model.update_prices(before)
+    assert model.as_dict()["r2"]["cost"] == 500
+
+
+def test_grams_against_price_per_unit_keep_notion_cost():
+    # Arroz bought as a 1 kg bag: 1500 per unit, the recipe asks for 200 g
+    unit_prices = {"p1": {"unit": "unit", "latest": 1500.0}, "p2": {"unit": "g", "latest": 9.0}}
+    model = RecipeCostModel(RECIPES, LINES, PRODUCTS, unit_prices)
+    costs = model.as_dict()
+
+    assert costs["r1"]["cost"] == 200 * 2 + 300 * 9
+    assert costs["r1"]["priced_products"] == 1 and costs["r1"]["source"] == "partial"
+
+    # Later priced per kg: the line is folded into the live cost again
+    assert model.update_prices({"p1": {"unit": "kg", "latest": 1500.0}, "p2": {"unit": "g", "latest": 9.0}}) == 1
+    assert model.as_dict()["r1"]["cost"] == 3000 and model.as_dict()["r1"]["source"] == "live"
+
+
+def test_loose_matches_keep_notion_cost():
+    recipes = [{"id": "r1", "name": "Ensalada"}]
+    lines = [
+        {"recipe": "Ensalada", "ingredient": "Sal", "product": "Sal", "qty": 5, "unit": "g", "static_unit_price": 1},
+        {"recipe": "Ensalada", "ingredient": "Aceite", "product": "Aceite de oliva", "qty": 20, "unit": "ml", "static_unit_price": 10},
+        {"recipe": "Ensalada", "ingredient": "Tomate", "product": "", "qty": 300, "unit": "g", "static_unit_price": 2},
+    ]
+    products = [
+        {"id": "salchicha", "name_norm": "Salchicha Viena"},
+        {"id": "vegetal", "name_norm": "Aceite Vegetal"},
+        {"id": "tomate", "name_norm": "Tomate"},
+    ]
+    unit_prices = {
+        "salchicha": {"unit": "g", "latest": 20.0},
+        "vegetal": {"unit": "ml", "latest": 3.0},
+        "tomate": {"unit": "g", "latest": 1.5},
+    }
+
+    model = RecipeCostModel(recipes, lines, products, unit_prices)
+
+    # Sal and aceite de oliva stay at Notion prices (the linked name wins over
+    # the ingredient); tomate has no link and matches by ingredient name
+    assert model.product_ids == ["tomate"]
+    assert model.as_dict()["r1"]["cost"] == 5 + 200 + 450
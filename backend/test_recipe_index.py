@@ -0,0 +1,81 @@
+"""
+Recipe index: stable IDs, filters, mtime reload and snapshot cold start
+"""
+import os
+import subprocess
+import sys
+
+from app.core.config import settings
+from app.services import recipe_index
+
+HEADER = "Receta,Tipo de comida,Ingredientes (intermedio),Valor receta\n"
+ROWS = [
+    'Lentejas,Almuerzo,"Lentejas (Ingredientes%20de%20Recetas/Lentejas%2024688a.csv), Arroz (Ingredientes%20de%20Recetas/Arroz%2024688b.csv)",5004.3\n',
+    'Arroz con Pollo,Almuerzo,"Arroz (Ingredientes%20de%20Recetas/Arroz%2024688b.csv), Pollo (Ingredientes%20de%20Recetas/Pollo%2024688c.csv)",8000\n',
+    'Pan,Desayuno,"Harina (Ingredientes%20de%20Recetas/Harina%2024088a.csv), Sal (Ingredientes%20de%20Recetas/Sal%2024388a.csv)",1231.4\n',
+]
+
+
+def _write(path, rows, mtime=None):
+    path.write_text(HEADER + "".join(rows), encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _setup(tmp_path, monkeypatch, rows=ROWS):
+    monkeypatch.setattr(settings, "recipe_snapshot_path", str(tmp_path / "snapshot.json"))
+    recipe_index.invalidate()
+    csv_path = tmp_path / "recetas.csv"
+    _write(csv_path, rows, mtime=1_000_000)
+    return csv_path
+
+
+def test_filters_and_pagination(tmp_path, monkeypatch):
+    index = recipe_index.get_index(_setup(tmp_path, monkeypatch))
+
+    assert [r["name"] for r in index.search(ingredient="arroz")["items"]] == ["Arroz con Pollo", "Lentejas"]
+    assert [r["name"] for r in index.search(meal_type="desayuno")["items"]] == ["Pan"]
+    assert [r["name"] for r in index.search(q="pol", ingredient="Arroz")["items"]] == ["Arroz con Pollo"]
+    assert index.search(ingredient="arroz", meal_type="Desayuno")["total"] == 0
+
+    page = index.search(offset=1, limit=1)
+    assert page["total"] == 3 and [r["name"] for r in page["items"]] == ["Lentejas"]
+
+
+def test_ids_are_stable_across_processes(tmp_path, monkeypatch):
+    csv_path = _setup(tmp_path, monkeypatch)
+    ids = [r["id"] for r in recipe_index.parse_csv(csv_path)]
+
+    code = (
+        "import sys; from pathlib import Path; from app.services.recipe_index import parse_csv; "
+        "print(','.join(r['id'] for r in parse_csv(Path(sys.argv[1]))))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code, str(csv_path)],
+        capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONHASHSEED": "random"}, cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout.strip()
+    assert out.split(",") == ids
+    assert len(set(ids)) == 3
+
+
+def test_reload_on_mtime_and_snapshot_cold_start(tmp_path, monkeypatch):
+    csv_path = _setup(tmp_path, monkeypatch)
+    first = recipe_index.get_index(csv_path)
+    assert recipe_index.get_index(csv_path) is first
+
+    # Touched but identical: same recipes, no re-parse
+    os.utime(csv_path, (2_000_000, 2_000_000))
+    assert recipe_index.get_index(csv_path) is first
+
+    # Re-exported with a new recipe
+    _write(csv_path, ROWS + ["Sopaipillas,Once,Harina (Ingredientes%20de%20Recetas/Harina%2024088a.csv),900\n"], mtime=3_000_000)
+    second = recipe_index.get_index(csv_path)
+    assert len(second) == 4
+    assert second.search(ingredient="harina")["total"] == 2
+
+    # New process: served from the snapshot without parsing
+    recipe_index.invalidate()
+    monkeypatch.setattr(recipe_index, "parse_csv", lambda path: (_ for _ in ()).throw(AssertionError("parsed")))
+    cold = recipe_index.get_index(csv_path)
+    assert [r["id"] for r in cold.recipes] == [r["id"] for r in second.recipes]
@@ -0,0 +1,111 @@
+"""
+Bulk price estimation for shopping list items
+"""
+from app.services import price_matrix
+from app.services.shopping_estimator import estimate_items, estimate_month, estimate_new_item, convert_qty
+
+HOUSEHOLD = "hh-1"
+
+PRODUCTS = [
+    {"id": "p1", "household_id": HOUSEHOLD, "name_norm": "Arroz Grado 2"},
+    {"id": "p2", "household_id": HOUSEHOLD, "name_norm": "Carne Molida"},
+    {"id": "p3", "household_id": HOUSEHOLD, "name_norm": "Velas", "manual_price": 1500, "manual_unit": "unit"},
+]
+UNIT_PRICES = {
+    "p1": {"unit": "unit", "latest": 1300.0, "median": 1200.0},
+    "p2": {"unit": "g", "latest": 9.0, "median": 8.0},
+}
+
+
+def test_convert_qty():
+    assert convert_qty(1.5, "kg", "g") == 1500
+    assert convert_qty(500, "ml", "l") == 0.5
+    assert convert_qty(2, "Gr", "kg") == 0.002
+    assert convert_qty(2, "unit", "kg") is None
+    assert convert_qty(1000, "g", "unit") is None
+
+
+def test_grams_against_price_per_unit_are_not_estimated():
+    items = [
+        {"id": "a", "name": "Arroz", "product_id": "p1", "quantity": 1000, "unit": "g"},
+        {"id": "b", "name": "Arroz", "product_id": "p1", "quantity": 1000, "unit": "g",
+         "estimated_cost": 1200000, "estimate_source": "median_price"},
+        {"id": "c", "name": "Velas", "quantity": 500, "unit": "g"},
+    ]
+    changed = {row["id"]: row for row in estimate_items(items, PRODUCTS, UNIT_PRICES)}
+
+    # Left unestimated; a stale estimate from before is cleared
+    assert "a" not in changed and "c" not in changed
+    assert changed["b"]["estimated_cost"] is None and changed["b"]["estimate_source"] is None
+
+
+def test_estimate_by_id_fuzzy_name_and_manual_price():
+    items = [
+        {"id": "a", "name": "Arroz", "product_id": "p1", "quantity": 2},
+        {"id": "b", "name": "carne molida", "quantity": 1, "unit": "kg"},
+        {"id": "c", "name": "Velas", "quantity": 3},
+        {"id": "d", "name": "Regalo cumpleaños", "estimated_cost": 20000, "estimate_source": "manual"},
+        {"id": "e", "name": "Algo desconocido xyz"},
+    ]
+    changed = {row["id"]: row for row in estimate_items(items, PRODUCTS, UNIT_PRICES)}
+
+    assert changed["a"]["estimated_cost"] == 2400
+    assert changed["a"]["estimate_source"] == "median_price"
+    assert changed["b"]["product_id"] == "p2"
+    assert changed["b"]["estimated_cost"] == 8000
+    assert changed["c"]["estimated_cost"] == 4500
+    assert changed["c"]["estimate_source"] == "product_manual_price"
+    assert "d" not in changed and "e" not in changed
+
+    latest = estimate_items(items[:1], PRODUCTS, UNIT_PRICES, basis="latest")
+    assert latest[0]["estimated_cost"] == 2600
+    assert latest[0]["estimate_source"] == "latest_price"
+
+
+def test_estimate_month_writes_one_upsert(fake_supabase):
+    price_matrix.invalidate()
+    supabase = fake_supabase({
+        "shopping_list": [
+            {"id": "a", "household_id": HOUSEHOLD, "month": "2026-03", "name": "Arroz", "product_id": "p1", "quantity": 2},
+            {"id": "b", "household_id": HOUSEHOLD, "month": "2026-03", "name": "Arroz", "product_id": "p1",
+             "quantity": 1, "estimated_cost": 999, "estimate_source": "manual"},
+        ],
+        "products": PRODUCTS,
+        "product_prices": [
+            {"household_id": HOUSEHOLD, "product_id": "p1", "store_id": "s1", "unit": "unit",
+             "unit_price": 1000, "date": "2026-03-01", "created_at": "2026-03-01T10:00:00"},
+        ],
+        "stores": [{"id": "s1", "household_id": HOUSEHOLD, "name": "Lider"}],
+    })
+
+    assert estimate_month(supabase, HOUSEHOLD, "2026-03") == 1
+    assert [c for c in supabase.calls if c[0] == "shopping_list"] == [("shopping_list", "select"), ("shopping_list", "upsert")]
+    rows = {r["id"]: r for r in supabase.tables["shopping_list"]}
+    assert rows["a"]["estimated_cost"] == 2000
+    assert rows["b"]["estimated_cost"] == 999
+
+    # Nothing changed: no write
+    supabase.calls.clear()
+    assert estimate_month(supabase, HOUSEHOLD, "2026-03") == 0
+    assert ("shopping_list", "upsert") not in supabase.calls
+
+
+def test_estimate_new_item_reuses_cached_matrix(fake_supabase):
+    price_matrix.invalidate()
+    supabase = fake_supabase({
+        "products": PRODUCTS,
+        "product_prices": [
+            {"household_id": HOUSEHOLD, "product_id": "p1", "store_id": "s1", "unit": "unit",
+             "unit_price": 1000, "date": "2026-03-01", "created_at": "2026-03-01T10:00:00"},
+        ],
+        "stores": [{"id": "s1", "household_id": HOUSEHOLD, "name": "Lider"}],
+    })
+
+    assert estimate_new_item(supabase, HOUSEHOLD, {"name": "arroz", "quantity": 3})["estimated_cost"] == 3000
+    supabase.calls.clear()
+    assert estimate_new_item(supabase, HOUSEHOLD, {"name": "Arroz grado 2", "quantity": 2})["estimated_cost"] == 2000
+    assert ("products", "select") not in supabase.calls
+
+    # Priced by hand only: just that product is read
+    velas = estimate_new_item(supabase, HOUSEHOLD, {"name": "Velas", "product_id": "p3", "quantity": 2})
+    assert velas["estimated_cost"] == 3000
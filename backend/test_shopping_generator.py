@@ -0,0 +1,150 @@
+"""
+Shopping list generated from the meal plan
+"""
+import time
+
+from app.core.config import settings
+from app.services import recipe_index, recipe_costing, price_matrix, shopping_generator
+
+HOUSEHOLD = "hh-1"
+
+RECIPES = (
+    "Receta,Tipo de comida,Ingredientes (intermedio),Valor receta\n"
+    "Lentejas,Almuerzo,\"Lentejas, Arroz\",5000\n"
+    "Arroz con Pollo,Almuerzo,\"Arroz, Pollo\",8000\n"
+    "Ensalada,Almuerzo,\"Lechuga, Tomate\",3000\n"
+)
+INGREDIENTS = (
+    "RECETA,Ingredientes en receta,Producto de despensa,Cantidad necesaria en unidad base,Unidad de medida de receta,Precio gramo\n"
+    "Lentejas (Recetario%20Familiar/Lentejas%20a1.csv),Lentejas,Lentejas (Despensa/Lentejas%20b1.csv),500,Gr,\"2,5\"\n"
+    "Lentejas (Recetario%20Familiar/Lentejas%20a1.csv),Arroz,Arroz Grado 2 (Despensa/Arroz%20b2.csv),200,Gr,\"1,5\"\n"
+    "Arroz con Pollo (Recetario%20Familiar/Arroz%20a2.csv),Arroz,Arroz Grado 2 (Despensa/Arroz%20b2.csv),300,Gr,\"1,5\"\n"
+    "Arroz con Pollo (Recetario%20Familiar/Arroz%20a2.csv),Pollo,Pollo Trutro (Despensa/Pollo%20b3.csv),800,Gr,6\n"
+)
+
+
+def _setup(tmp_path, monkeypatch):
+    recipes_csv, ingredients_csv = tmp_path / "recetas.csv", tmp_path / "ingredientes.csv"
+    recipes_csv.write_text(RECIPES, encoding="utf-8")
+    ingredients_csv.write_text(INGREDIENTS, encoding="utf-8")
+    monkeypatch.setattr(settings, "recipe_snapshot_path", str(tmp_path / "snapshot.json"))
+    monkeypatch.setattr(recipe_index, "RECIPES_CSV", recipes_csv)
+    monkeypatch.setattr(recipe_index, "INGREDIENTS_CSV", ingredients_csv)
+    recipe_index.invalidate()
+    recipe_costing.invalidate()
+    price_matrix.invalidate()
+
+
+def _meal(day, name):
+    return {"household_id": HOUSEHOLD, "date": day, "type": "lunch", "recipe_name": name}
+
+
+def test_aggregate_by_product_and_week(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    meals = [
+        _meal("2026-03-02", "Lentejas"), _meal("2026-03-03", "Arroz con Pollo"),
+        _meal("2026-03-09", "Lentejas"), _meal("2026-03-10", "Arroz con Pollo"),
+        _meal("2026-03-16", "Lentejas"), _meal("2026-03-20", "Ensalada"),
+    ]
+    rows = shopping_generator.to_rows(
+        shopping_generator.aggregate(meals, recipe_costing.recipe_lines()), HOUSEHOLD)
+    by_name = {}
+    for row in rows:
+        by_name.setdefault(row["name"], []).append((row["quantity"], row["bucket"], row["weeks"]))
+
+    assert by_name["Arroz Grado 2"] == [(500, "weekly", [1, 2]), (200, "weekly", [3])]
+    assert by_name["Lentejas"] == [(500, "weekly", [1, 2, 3])]
+    assert by_name["Pollo Trutro"] == [(800, "weekly", [1, 2])]
+    # No ingredient lines: catalog names, no quantity
+    assert by_name["Lechuga"] == [(None, "monthly", [])]
+
+
+def test_generate_merges_with_one_write(tmp_path, monkeypatch, fake_supabase):
+    _setup(tmp_path, monkeypatch)
+    meals = [_meal(f"2026-03-{day:02d}", "Lentejas" if day % 2 else "Arroz con Pollo") for day in range(1, 31)]
+    supabase = fake_supabase({
+        "meal_plans": meals,
+        "products": [{"id": "p1", "household_id": HOUSEHOLD, "name_norm": "Pollo Trutro"}],
+        "shopping_list": [
+            {"id": "manual", "household_id": HOUSEHOLD, "month": "2026-03", "name": "Pollo", "product_id": "p1"},
+            {"id": "old", "household_id": HOUSEHOLD, "month": "2026-03", "name": "Tallarines", "origin": "meal_plan"},
+        ],
+    })
+
+    started = time.perf_counter()
+    result = shopping_generator.generate(supabase, HOUSEHOLD, "2026-03-01", "2026-03-30")
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 1
+    assert result["meals"] == 30 and result["removed"] == 1
+    assert result["skipped"] == ["Pollo Trutro"]
+    writes = [c for c in supabase.calls if c[0] == "shopping_list" and c[1] != "select"]
+    assert writes == [("shopping_list", "upsert"), ("shopping_list", "delete")]
+    names = {r["name"] for r in supabase.tables["shopping_list"]}
+    assert names == {"Pollo", "Lentejas", "Arroz Grado 2"}
+
+    # Regenerating keeps ids and doesn't duplicate
+    ids = {r["id"] for r in supabase.tables["shopping_list"]}
+    shopping_generator.generate(supabase, HOUSEHOLD, "2026-03-01", "2026-03-31")
+    assert {r["id"] for r in supabase.tables["shopping_list"]} == ids
+
+
+def test_regenerate_keeps_cost_typed_by_hand(tmp_path, monkeypatch, fake_supabase):
+    _setup(tmp_path, monkeypatch)
+    supabase = fake_supabase({
+        "meal_plans": [_meal("2026-03-02", "Lentejas")],
+        "products": [{"id": "p1", "household_id": HOUSEHOLD, "name_norm": "Lentejas"},
+                     {"id": "p2", "household_id": HOUSEHOLD, "name_norm": "Arroz Grado 2"}],
+        "product_prices": [
+            {"household_id": HOUSEHOLD, "product_id": pid, "store_id": "s1", "unit": "g",
+             "unit_price": price, "date": "2026-02-01", "created_at": "2026-02-01T10:00:00"}
+            for pid, price in (("p1", 3), ("p2", 2))
+        ],
+        "stores": [{"id": "s1", "household_id": HOUSEHOLD, "name": "Lider"}],
+    })
+    upserts = []
+    fake_query = type(supabase.table("shopping_list"))
+    real_upsert = fake_query.upsert
+
+    def recording_upsert(self, payload, on_conflict=None):
+        upserts.append(payload)
+        return real_upsert(self, payload, on_conflict)
+
+    monkeypatch.setattr(fake_query, "upsert", recording_upsert)
+
+    shopping_generator.generate(supabase, HOUSEHOLD, "2026-03-01", "2026-03-31")
+    rows = {r["name"]: r for r in supabase.tables["shopping_list"]}
+    assert rows["Lentejas"]["estimated_cost"] == 1500
+    # The user types their own quantity and cost
+    rows["Lentejas"].update({"quantity": 333, "estimated_cost": 999, "estimate_source": "manual"})
+
+    shopping_generator.generate(supabase, HOUSEHOLD, "2026-03-01", "2026-03-31")
+    rows = {r["name"]: r for r in supabase.tables["shopping_list"]}
+
+    assert (rows["Lentejas"]["quantity"], rows["Lentejas"]["estimated_cost"]) == (333, 999)
+    assert rows["Lentejas"]["estimate_source"] == "manual"
+    assert rows["Arroz Grado 2"]["estimated_cost"] == 400
+    # Every row of a bulk upsert carries the same columns
+    assert all(len({frozenset(r) for r in payload}) == 1 for payload in upserts)
+
+
+def test_mixed_units_are_not_summed_together(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    lentejas = recipe_costing.resolve_recipe_id(None, "Lentejas")
+    arroz = recipe_costing.resolve_recipe_id(None, "Arroz con Pollo")
+    lines = {
+        lentejas: [{"product": "Arroz Grado 2", "qty": 200, "unit": "g"},
+                   {"product": "Huevo", "qty": 2, "unit": "unit"}],
+        arroz: [{"product": "Arroz Grado 2", "qty": 1, "unit": "unit"},
+                {"product": "Arroz Grado 2", "qty": 0.5, "unit": "kg"},
+                {"product": "Huevo", "qty": 0, "unit": None}],
+    }
+    meals = [_meal("2026-03-02", "Lentejas"), _meal("2026-03-03", "Arroz con Pollo")]
+    rows = shopping_generator.to_rows(shopping_generator.aggregate(meals, lines), HOUSEHOLD)
+
+    by_name = {}
+    for row in rows:
+        by_name.setdefault(row["name"], []).append((row["quantity"], row["unit"]))
+    assert sorted(by_name["Arroz Grado 2"]) == [(1, "unit"), (700, "g")]
+    # A name without quantity doesn't add a row next to the measured one
+    assert by_name["Huevo"] == [(2, "unit")]
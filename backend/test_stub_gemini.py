@@ -0,0 +1,57 @@
+"""
+Local Gemini stub and the end-to-end receipt benchmark
+"""
+import io
+import os
+import sys
+import json
+
+from PIL import Image
+
+from app.services import ai_extractor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "scripts"))
+import bench_receipts  # noqa: E402
+from stub_gemini import StubGemini, CANNED_RECEIPT, generate_content_body, image_key  # noqa: E402
+
+
+def test_extractor_speaks_to_stub(monkeypatch):
+    monkeypatch.setattr(ai_extractor, "_STATS", {'receipts': 0, 'escalated': 0, 'tiers': {}})
+    recorded = dict(CANNED_RECEIPT, store={"name": "Jumbo", "confidence": 0.9})
+
+    with StubGemini(latency=0.01) as stub:
+        stub.blobs["/storage/a.jpg"] = (b"image-a", "image/jpeg")
+        stub.blobs["/storage/b.jpg"] = (b"image-b", "image/jpeg")
+        key = image_key({"contents": [{"parts": [{"inline_data": {"data": "aW1hZ2UtYg=="}}]}]})
+        stub.responses[key] = generate_content_body(recorded)
+
+        extractor = ai_extractor.GeminiVisionExtractor("key", "flash", base_url=stub.url)
+        canned = extractor.extract(f"{stub.url}/storage/a.jpg")
+        matched = extractor.extract(f"{stub.url}/storage/b.jpg")
+
+        assert canned.success and canned.data['store_name'] == "Lider"
+        assert matched.data['store_name'] == "Jumbo"
+        traffic = stub.stats()
+        assert traffic['generateContent']['requests'] == 2
+        assert traffic['storage_get']['bytes_out'] == len(b"image-a") + len(b"image-b")
+        assert traffic['generateContent']['bytes_in'] > len(json.dumps(extractor.EXTRACTION_PROMPT))
+
+        stub.error_rate = 1.0
+        failed = extractor.extract(f"{stub.url}/storage/a.jpg")
+        assert not failed.success and stub.stats()['generateContent']['requests'] == 4
+
+
+def test_benchmark_runs_receipts_end_to_end(tmp_path):
+    path = tmp_path / "boleta.jpg"
+    Image.new("RGB", (3000, 1200), "white").save(path, format="JPEG")
+
+    with StubGemini() as stub:
+        level = bench_receipts.run_level(stub, [path], receipts=3, concurrency=2, model="flash", hedge=False)
+
+    assert level['confirmed'] == 3
+    assert all(len(level['timings'][stage]) == 3 for stage in bench_receipts.STAGES)
+    # Resized before upload: what Gemini gets is the processed image
+    uploaded = level['bytes']['storage_put']['bytes_in']
+    assert level['bytes']['storage_get']['bytes_out'] == uploaded
+    assert Image.open(io.BytesIO(next(iter(stub.blobs.values()))[0])).width == 2048
+    assert level['firestore_ops']['writes'] > 0
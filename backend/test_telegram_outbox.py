@@ -0,0 +1,93 @@
+"""
+Outbound Telegram queue: pacing, 429 retries and progress coalescing
+"""
+import asyncio
+import time
+
+from app.services.telegram_outbox import TelegramOutbox
+from app.services.telegram_service import TelegramService
+
+
+def _send(outbox, chat_id, text, progress=False):
+    return outbox.submit(chat_id, 'send_message', {'chat_id': chat_id, 'text': text}, progress=progress)
+
+
+def test_paced_per_chat_and_globally(stub_bot):
+    async def run():
+        bot = stub_bot()
+        outbox = TelegramOutbox(bot, rate_per_second=100, chat_interval=0.05)
+        for n in range(3):
+            for chat in (1, 2):
+                _send(outbox, chat, f"m{n}")
+        await outbox.join()
+        return bot.calls
+
+    calls = asyncio.run(run())
+    assert len(calls) == 6
+    for chat in (1, 2):
+        mine = [c for c in calls if c[1] == chat]
+        assert [c[2] for c in mine] == ["m0", "m1", "m2"]
+        assert all(b[3] - a[3] >= 0.045 for a, b in zip(mine, mine[1:]))
+    times = sorted(c[3] for c in calls)
+    assert all(b - a >= 0.009 for a, b in zip(times, times[1:]))
+
+
+def test_late_wakeup_still_paces_from_send_time(stub_bot):
+    async def run():
+        bot = stub_bot()
+        outbox = TelegramOutbox(bot, rate_per_second=100, chat_interval=0.05)
+        for n in range(3):
+            for chat in (1, 2):
+                _send(outbox, chat, f"m{n}")
+        await asyncio.sleep(0.005)
+        time.sleep(0.03)        # the loop stalls while chat 2 waits for its slot
+        await outbox.join()
+        return bot.calls
+
+    calls = asyncio.run(run())
+    for chat in (1, 2):
+        mine = [c[3] for c in calls if c[1] == chat]
+        assert all(b - a >= 0.05 for a, b in zip(mine, mine[1:]))
+
+
+def test_retries_after_flood_limit(stub_bot):
+    async def run():
+        # The stub wants 0.2s between calls; the outbox only waits 0.01s
+        bot = stub_bot(chat_interval=0.2, retry_after=0.2)
+        outbox = TelegramOutbox(bot, rate_per_second=0, chat_interval=0.01, max_retries=3)
+        first = _send(outbox, 7, "uno")
+        second = _send(outbox, 7, "dos")
+        results = await asyncio.gather(first, second)
+        return bot, outbox, results
+
+    bot, outbox, (first, second) = asyncio.run(run())
+    assert [c[2] for c in bot.calls] == ["uno", "dos"]
+    assert len(bot.rejected) == 1 and outbox.stats['retried'] == 1
+    assert second.text == "dos"
+
+
+def test_progress_messages_collapse_into_one(stub_bot):
+    async def run():
+        bot = stub_bot()
+        service = TelegramService(bot=bot)
+        service.outbox = TelegramOutbox(bot, rate_per_second=0, chat_interval=0.02)
+        # Progress doesn't wait for delivery: these three are still queued
+        await service.send_message(5, "🧾 Boleta recibida. Subiendo...", progress=True)
+        await service.send_message(5, "⬆️ 1/2", progress=True)
+        await service.send_message(5, "⬆️ 2/2", progress=True)
+        await asyncio.sleep(0.03)
+        await service.send_message(5, "⏳ Procesando con IA...", progress=True)
+        card = await service.send_message(5, "🧾 Lider")
+        await service.send_message(5, "🤖 Pensando...", progress=True)
+        await service.outbox.join()
+        return bot, service.outbox, card
+
+    bot, outbox, card = asyncio.run(run())
+    assert [(c[0], c[2]) for c in bot.calls] == [
+        ("send_message", "⬆️ 2/2"),
+        ("edit_message_text", "⏳ Procesando con IA..."),
+        ("send_message", "🧾 Lider"),
+        ("send_message", "🤖 Pensando..."),
+    ]
+    assert bot.messages == {1: "⏳ Procesando con IA...", 2: "🧾 Lider", 3: "🤖 Pensando..."}
+    assert card.message_id == 2 and outbox.stats['coalesced'] == 2
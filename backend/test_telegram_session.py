@@ -0,0 +1,88 @@
+"""
+Telegram session caches: user lookup TTL and write-behind conversation state
+"""
+import asyncio
+
+from app.services import telegram_session
+from app.services.telegram_session import UserCache, ConversationStore
+
+
+class FakeUsers:
+    def __init__(self, fail=()):
+        self.writes = []
+        self.fail = set(fail)
+
+    def collection(self, name):
+        assert name == 'users'
+        return self
+
+    def document(self, user_id):
+        self._doc = user_id
+        return self
+
+    def update(self, data):
+        if self._doc in self.fail:
+            raise RuntimeError("firestore caído")
+        self.writes.append((self._doc, data))
+
+
+def test_user_cache_ttl_negative_and_invalidate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(telegram_session.time, "monotonic", lambda: now[0])
+    cache = UserCache(ttl=60, negative_ttl=5, max_size=2)
+
+    assert cache.get(1) == (False, None)
+    cache.put(1, {'id': 'u1'})
+    cache.put(2, None)
+    assert cache.get(1) == (True, {'id': 'u1'})
+    assert cache.get(2) == (True, None)
+
+    now[0] += 10
+    assert cache.get(2) == (False, None)     # unlinked entries expire first
+    assert cache.get(1)[0]
+
+    cache.put(3, {'id': 'u3'})
+    cache.put(4, {'id': 'u4'})               # over max_size: least recent goes
+    assert not cache.get(1)[0]
+
+    cache.invalidate(3)
+    assert not cache.get(3)[0] and cache.get(4)[0]
+    now[0] += 61
+    assert not cache.get(4)[0]
+
+
+def test_conversation_state_is_local_and_written_behind():
+    async def run():
+        db = FakeUsers()
+        store = ConversationStore(flush_delay=0.01)
+        store.seed('u1', {'action': 'fix_store', 'receipt_id': 'r0'})
+        store.seed('u1', None)               # Firestore doesn't override local state
+        assert store.get('u1')['receipt_id'] == 'r0'
+
+        store.set(db, 'u1', {'action': 'fix_store', 'receipt_id': 'r1'})
+        store.set(db, 'u1', {'action': 'fix_store', 'receipt_id': 'r2'})
+        store.clear(db, 'u2')                # nothing to clear, nothing written
+        assert db.writes == []               # not on the message path
+        assert store.get('u1')['receipt_id'] == 'r2'
+
+        await asyncio.sleep(0.05)
+        return db.writes
+
+    writes = asyncio.run(run())
+    assert writes == [('u1', {'waiting_for': {'action': 'fix_store', 'receipt_id': 'r2'}})]
+
+
+def test_failed_flush_is_retried():
+    async def run():
+        db = FakeUsers(fail={'u1'})
+        store = ConversationStore(flush_delay=10)
+        store.set(db, 'u1', None)
+        store.set(db, 'u2', {'action': 'fix_store'})
+        first = await store.flush()
+        db.fail.clear()
+        second = await store.flush()
+        return first, second, db.writes
+
+    first, second, writes = asyncio.run(run())
+    assert (first, second) == (1, 1)
+    assert [user for user, _ in writes] == ['u2', 'u1']
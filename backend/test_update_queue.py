@@ -0,0 +1,97 @@
+"""
+Webhook update queue: per-chat ordering, bounded workers, update_id dedupe
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.update_queue import UpdateQueue
+
+
+def test_per_chat_order_and_bounded_concurrency():
+    async def run():
+        queue = UpdateQueue(workers=2)
+        log, running, peak = [], [0], [0]
+
+        def job(chat, n):
+            async def work():
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+                await asyncio.sleep(0.01 if n % 2 else 0)
+                log.append((chat, n))
+                running[0] -= 1
+            return work
+
+        update_id = 0
+        for n in range(5):
+            for chat in ("a", "b", "c"):
+                update_id += 1
+                assert queue.submit(update_id, chat, job(chat, n))
+        await queue.join()
+        await queue.stop()
+        return log, peak[0]
+
+    log, peak = asyncio.run(run())
+    assert peak == 2
+    for chat in ("a", "b", "c"):
+        assert [n for c, n in log if c == chat] == [0, 1, 2, 3, 4]
+
+
+def test_duplicates_dropped_and_failures_isolated():
+    async def run():
+        queue = UpdateQueue(workers=1, max_pending=2)
+        calls = []
+
+        async def boom():
+            raise RuntimeError("fallo")
+
+        async def ok():
+            calls.append("ok")
+
+        assert queue.submit(1, "a", boom)
+        assert queue.submit(2, "a", ok)
+        assert not queue.submit(1, "a", ok)
+        with pytest.raises(asyncio.QueueFull):
+            queue.submit(3, "a", ok)
+        await queue.join()
+        # Redelivery after processing is still dropped
+        assert not queue.submit(2, "a", ok)
+        await queue.stop()
+        return calls, queue.stats
+
+    calls, stats = asyncio.run(run())
+    assert calls == ["ok"]
+    assert stats["duplicates"] == 2 and stats["failed"] == 1 and stats["rejected"] == 1
+
+
+def test_webhook_acks_before_processing(monkeypatch):
+    from app.api.routes import telegram
+
+    async def slow(update, db, bucket, supabase):
+        await asyncio.sleep(0.2)
+
+    class FakeRequest:
+        async def json(self):
+            return {"update_id": 777, "message": {"message_id": 1, "date": 0, "text": "hola",
+                                                  "chat": {"id": 5, "type": "private"},
+                                                  "from": {"id": 9, "is_bot": False, "first_name": "A"}}}
+
+    async def run():
+        queue = UpdateQueue(workers=1)
+        monkeypatch.setattr(telegram, "update_queue", queue)
+        monkeypatch.setattr(telegram, "_process_update", slow)
+        secret = telegram.settings.telegram_secret_token
+
+        started = time.perf_counter()
+        first = await telegram.telegram_webhook(FakeRequest(), secret, None, None, None)
+        elapsed = time.perf_counter() - started
+        again = await telegram.telegram_webhook(FakeRequest(), secret, None, None, None)
+        await queue.join()
+        await queue.stop()
+        return first, again, elapsed, queue.stats
+
+    first, again, elapsed, stats = asyncio.run(run())
+    assert first == {"status": "ok"} and again == {"status": "duplicate"}
+    assert elapsed < 0.1
+    assert stats["done"] == 1
@@ -1,51 +1,16 @@
 import argparse
 import csv
-import re
+import sys
 from pathlib import Path
 
-
-ALIASES = [
-    (["miel de abeja aysen 500"], "Miel de abeja 500 g", "Aysen"),
-    (["pilas duracell triple a"], "Pilas AAA", "Duracell"),
-    (["palta cod"], "Palta (kg)", ""),
-    (["clementina malla 1"], "Clementina malla 1 kg", ""),
-    (["pizza cong sadia"], "Pizza congelada", "Sadia"),
-    (["pizza artesanal"], "Pizza artesanal", "PF"),
-    (["ramitas s original"], "Ramitas originales (S)", "Evercrisp"),
-    (["detodoito ii", "detodoito 2"], "De Todito 2", "Evercrisp"),
-    (["crunchis mani marc"], "Crunchis mani", "Marco Polo"),
-    (["coca cola lata 350"], "Coca-Cola lata 350 ml", "Coca-Cola"),
-    (["naranja sofruco"], "Naranja malla", "Sofruco"),
-    (["aco ballerina dp 7", "aco ballerina dp7"], "Acondicionador DP7", "Ballerina"),
-    (["manzana verde expo"], "Manzana verde (kg)", ""),
-    (["molde queque red"], "Molde queque", "RED"),
-    (["harina integral se lecta", "harina integral selecta"], "Harina integral 1 kg", "Selecta"),
-    (["chancaca 2 bloques"], "Chancaca pack 2", ""),
-    (["set escritorio art"], "Set escritorio (articulos)", ""),
-]
-
-FALLBACKS = [
-    (["pilas aaa", "pilas triple a", "triple a pilas"], "Pilas AAA", ""),
-    (["pilas aa", "pilas doble a", "doble a pilas"], "Pilas AA", ""),
-]
-
-
-def normalize(text: str) -> str:
-    value = text or ""
-    value = value.lower()
-    value = re.sub(r"\s+", " ", value)
-    value = value.strip()
-    return value
+# The alias table lives in backend/app/data/receipt_aliases.json and is
+# compiled by the backend's alias engine
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+from app.services import alias_engine  # noqa: E402
 
 
 def suggest(raw: str):
-    text = normalize(raw)
-    if not text:
-        return None
-    for tokens, clean, brand in ALIASES + FALLBACKS:
-        if any(token in text for token in tokens):
-            return clean, brand
-    return None
+    return alias_engine.get_engine().suggest(raw)
 
 
 def read_lines(path: Path, column: str | None):
@@ -73,30 +38,24 @@ def main():
     parser.add_argument("--input", required=True, help="Input file (.txt/.csv/.tsv)")
     parser.add_argument("--column", default=None, help="Column name for CSV/TSV")
     parser.add_argument("--output", default="receipt_alias_suggestions.csv", help="Output CSV path")
+    parser.add_argument("--aliases", default=str(alias_engine.ALIASES_PATH), help="Alias table (JSON)")
     args = parser.parse_args()
 
     input_path = Path(args.input)
     output_path = Path(args.output)
+    engine = alias_engine.get_engine(Path(args.aliases))
 
-    rows = []
-    for raw in read_lines(input_path, args.column):
-        suggestion = suggest(raw)
-        if suggestion:
-            clean, brand = suggestion
-        else:
-            clean, brand = "", ""
-        rows.append({
-            "raw": raw,
-            "clean": clean,
-            "brand": brand
-        })
-
+    # Rows are written as they're read, so input size doesn't matter
+    count = matched = 0
     with output_path.open("w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["raw", "clean", "brand"])
-        writer.writeheader()
-        writer.writerows(rows)
-
-    print(f"Wrote {len(rows)} rows to {output_path}")
+        writer = csv.writer(f)
+        writer.writerow(["raw", "clean", "brand"])
+        for raw, clean, brand in engine.stream(read_lines(input_path, args.column)):
+            writer.writerow([raw, clean, brand])
+            count += 1
+            matched += bool(clean)
+
+    print(f"Wrote {count} rows ({matched} matched) to {output_path}")
 
 
 if __name__ == "__main__":